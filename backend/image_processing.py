@@ -0,0 +1,161 @@
+"""CPU-bound image work that runs inside the server's process pool.
+
+Kept separate from server.py so worker processes only import Pillow,
+not the FastAPI app and its database client.
+"""
+import base64
+import io
+import math
+from datetime import datetime
+
+from typing import Tuple
+
+from PIL import ExifTags, Image, ImageOps
+
+# Derivative name -> longest side in pixels
+DERIVATIVE_SIZES = {
+    "thumb": 320,
+    "display": 1280,
+}
+DERIVATIVE_CONTENT_TYPE = "image/jpeg"
+DERIVATIVE_QUALITY = 82
+# Blurhash components across and down; 4x3 is 28 characters
+BLURHASH_COMPONENTS = (4, 3)
+# Longest side the image is shrunk to before computing the blurhash
+BLURHASH_SAMPLE_SIZE = 32
+
+def decode_data_url(image_data: str) -> Tuple[bytes, str]:
+    """Decode a base64 payload (optionally a data: URL) into bytes and a content type.
+
+    Raises binascii.Error (a ValueError) when the payload is not valid base64.
+    """
+    content_type = "application/octet-stream"
+    if image_data.startswith("data:"):
+        header, _, image_data = image_data.partition(",")
+        content_type = header[5:].split(";")[0] or content_type
+    return base64.b64decode(image_data, validate=True), content_type
+
+def render_derivatives(source) -> dict:
+    """Decode an image once and encode a JPEG for every derivative size.
+
+    source is either the encoded bytes or a path to them. Returns
+    {"original": {"width", "height"}, "<name>": {"data", "width", "height"}, ...}.
+    Images smaller than a derivative size are re-encoded without upscaling.
+    """
+    with Image.open(io.BytesIO(source) if isinstance(source, bytes) else source) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+
+        result = {"original": {"width": image.width, "height": image.height}}
+        for name, max_side in DERIVATIVE_SIZES.items():
+            derivative = image.copy()
+            derivative.thumbnail((max_side, max_side), Image.LANCZOS)
+            buffer = io.BytesIO()
+            derivative.save(buffer, "JPEG", quality=DERIVATIVE_QUALITY, optimize=True, progressive=True)
+            result[name] = {
+                "data": buffer.getvalue(),
+                "width": derivative.width,
+                "height": derivative.height,
+            }
+        return result
+
+def extract_metadata(source) -> dict:
+    """Read EXIF capture details and compute a blurhash placeholder.
+
+    source is either the encoded bytes or a path to them. Returns
+    {"captured_at", "orientation", "camera", "blurhash"}; EXIF fields are None
+    when the image does not carry them. captured_at is the camera's local
+    time in ISO format, with its UTC offset when the camera recorded one.
+    """
+    with Image.open(io.BytesIO(source) if isinstance(source, bytes) else source) as image:
+        exif = image.getexif()
+        exif_ifd = exif.get_ifd(ExifTags.IFD.Exif)
+        # JPEGs decode straight at a fraction of their size
+        image.draft("RGB", (BLURHASH_SAMPLE_SIZE * 8, BLURHASH_SAMPLE_SIZE * 8))
+        preview = ImageOps.exif_transpose(image)
+        if preview.mode != "RGB":
+            preview = preview.convert("RGB")
+        preview.thumbnail((BLURHASH_SAMPLE_SIZE, BLURHASH_SAMPLE_SIZE), Image.BILINEAR)
+
+    camera = " ".join(
+        str(exif[tag]).strip("\x00 ")
+        for tag in (ExifTags.Base.Make, ExifTags.Base.Model)
+        if exif.get(tag)
+    )
+    return {
+        "captured_at": _exif_datetime(
+            exif_ifd.get(ExifTags.Base.DateTimeOriginal) or exif.get(ExifTags.Base.DateTime),
+            exif_ifd.get(ExifTags.Base.OffsetTimeOriginal)
+        ),
+        "orientation": exif.get(ExifTags.Base.Orientation),
+        "camera": camera or None,
+        "blurhash": blurhash(preview, *BLURHASH_COMPONENTS),
+    }
+
+def _exif_datetime(value, offset) -> str:
+    try:
+        captured = datetime.strptime(str(value).strip("\x00 "), "%Y:%m:%d %H:%M:%S")
+    except (TypeError, ValueError):
+        return None
+    if offset:
+        try:
+            return datetime.fromisoformat(f"{captured.isoformat()}{str(offset).strip()}").isoformat()
+        except ValueError:
+            pass
+    return captured.isoformat()
+
+_BASE83 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+_SRGB_TO_LINEAR = [
+    value / 12.92 if value <= 0.04045 else ((value + 0.055) / 1.055) ** 2.4
+    for value in (channel / 255 for channel in range(256))
+]
+
+def _base83(value: int, length: int) -> str:
+    return "".join(_BASE83[value // 83 ** (length - 1 - i) % 83] for i in range(length))
+
+def _linear_to_srgb(value: float) -> int:
+    value = max(0.0, min(1.0, value))
+    if value <= 0.0031308:
+        return round(value * 12.92 * 255)
+    return round((1.055 * value ** (1 / 2.4) - 0.055) * 255)
+
+def blurhash(image: Image.Image, x_components: int, y_components: int) -> str:
+    """Encode a small RGB image as a blurhash string (https://blurha.sh)"""
+    width, height = image.size
+    pixels = [tuple(_SRGB_TO_LINEAR[channel] for channel in pixel) for pixel in image.getdata()]
+    cos_x = [[math.cos(math.pi * i * x / width) for x in range(width)] for i in range(x_components)]
+    cos_y = [[math.cos(math.pi * j * y / height) for y in range(height)] for j in range(y_components)]
+
+    factors = []
+    for j in range(y_components):
+        for i in range(x_components):
+            r = g = b = 0.0
+            for y in range(height):
+                row = y * width
+                for x in range(width):
+                    basis = cos_x[i][x] * cos_y[j][y]
+                    pr, pg, pb = pixels[row + x]
+                    r += basis * pr
+                    g += basis * pg
+                    b += basis * pb
+            scale = (1 if i == j == 0 else 2) / (width * height)
+            factors.append((r * scale, g * scale, b * scale))
+
+    dc, ac = factors[0], factors[1:]
+    result = _base83(x_components - 1 + (y_components - 1) * 9, 1)
+    if ac:
+        quantised_max = max(0, min(82, math.floor(max(abs(v) for factor in ac for v in factor) * 166 - 0.5)))
+        maximum = (quantised_max + 1) / 166
+        result += _base83(quantised_max, 1)
+    else:
+        maximum = 1.0
+        result += _base83(0, 1)
+    result += _base83((_linear_to_srgb(dc[0]) << 16) + (_linear_to_srgb(dc[1]) << 8) + _linear_to_srgb(dc[2]), 4)
+    for factor in ac:
+        r, g, b = (
+            max(0, min(18, math.floor(math.copysign(abs(v / maximum) ** 0.5, v) * 9 + 9.5)))
+            for v in factor
+        )
+        result += _base83(r * 19 * 19 + g * 19 + b, 2)
+    return result
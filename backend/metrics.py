@@ -0,0 +1,149 @@
+"""Prometheus metrics for the API: HTTP traffic, MongoDB commands, uploads and load shedding.
+
+Everything here is a counter/histogram update per event, cheap enough to
+leave on in production. With several worker processes, point
+PROMETHEUS_MULTIPROC_DIR at an empty directory shared by the workers and
+/metrics reports the aggregate of all of them.
+"""
+import os
+import time
+from typing import Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from pymongo import monitoring
+
+SIZE_BUCKETS = tuple(4 ** exponent for exponent in range(4, 15))  # 256 B .. 256 MiB
+MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+# Any other request method is labelled "other", so clients cannot create new series at will
+HTTP_METHODS = frozenset({"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"})
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template and status",
+    ["method", "route", "status"],
+)
+REQUEST_SIZE = Histogram(
+    "http_request_size_bytes",
+    "HTTP request body size by route template",
+    ["route"],
+    buckets=SIZE_BUCKETS,
+)
+RESPONSE_SIZE = Histogram(
+    "http_response_size_bytes",
+    "HTTP response body size on the wire by route template",
+    ["route"],
+    buckets=SIZE_BUCKETS,
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "HTTP requests currently being served, including open event streams",
+    multiprocess_mode="livesum",
+)
+MONGO_COMMAND_DURATION = Histogram(
+    "mongodb_command_duration_seconds",
+    "MongoDB command round-trip time as reported by the driver",
+    ["command", "status"],
+    buckets=MONGO_BUCKETS,
+)
+UPLOAD_SIZE = Histogram(
+    "image_upload_size_bytes",
+    "Size of uploaded original images",
+    ["source"],
+    buckets=SIZE_BUCKETS,
+)
+PUBLIC_READS_IN_FLIGHT = Gauge(
+    "public_reads_in_flight",
+    "MongoDB-backed public reads holding an admission slot",
+    multiprocess_mode="livesum",
+)
+PUBLIC_READS_QUEUED = Gauge(
+    "public_reads_queued",
+    "Public reads waiting for an admission slot",
+    multiprocess_mode="livesum",
+)
+REQUESTS_SHED = Counter(
+    "http_requests_shed_total",
+    "Public requests answered 429 by route template and reason (rate_limit or overloaded)",
+    ["route", "reason"],
+)
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """pymongo command listener feeding MONGO_COMMAND_DURATION"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        MONGO_COMMAND_DURATION.labels(event.command_name, "succeeded").observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        MONGO_COMMAND_DURATION.labels(event.command_name, "failed").observe(event.duration_micros / 1e6)
+
+class MetricsMiddleware:
+    """Records latency, body sizes and in-flight count for every HTTP request.
+
+    Requests are labelled by the matched route template (e.g.
+    /api/photos/{photo_id}) so label cardinality stays bounded; requests that
+    match no route share the "unmatched" label.
+    """
+
+    def __init__(self, app, metrics_path: str = "/metrics"):
+        self.app = app
+        self.metrics_path = metrics_path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] == self.metrics_path:
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+        request_size = 0
+        response_size = 0
+
+        async def counting_receive():
+            nonlocal request_size
+            message = await receive()
+            if message["type"] == "http.request":
+                request_size += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message):
+            nonlocal status, response_size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                response_size += len(message.get("body", b""))
+            elif message["type"] == "http.response.zerocopysend":
+                response_size += message.get("count") or 0
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            route = scope.get("route")
+            route = getattr(route, "path", "unmatched")
+            method = scope["method"] if scope["method"] in HTTP_METHODS else "other"
+            REQUEST_DURATION.labels(method, route, str(status)).observe(time.perf_counter() - start)
+            REQUEST_SIZE.labels(route).observe(request_size)
+            RESPONSE_SIZE.labels(route).observe(response_size)
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Prometheus text exposition of this process, or of all workers in multiprocess mode"""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
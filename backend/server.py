@@ -1,29 +1,2383 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Header
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Header, Query, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse, Response, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
+from starlette.datastructures import Headers, MutableHeaders
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from starlette.requests import ClientDisconnect
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+from pymongo import ASCENDING, DESCENDING, IndexModel, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure, PyMongoError
 import os
+import re
+import httpx
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import AsyncIterator, Dict, List, Optional, Tuple, Union
 import uuid
 from datetime import datetime, timezone, timedelta
+import asyncio
 import base64
+import binascii
+import hashlib
+import hmac
 import json
+import math
+import multiprocessing
+import shutil
+import time
+import zipfile
+from collections import Counter, defaultdict
+from contextlib import asynccontextmanager
+from email.utils import format_datetime, parsedate_to_datetime
+from concurrent.futures import ProcessPoolExecutor
+from PIL import UnidentifiedImageError
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import MultipartParser, MultipartState, parse_options_header
+from cachetools import LRUCache, TTLCache
+import brotli
+import gzip
+import orjson
+
+from metrics import (
+    PUBLIC_READS_IN_FLIGHT,
+    PUBLIC_READS_QUEUED,
+    REQUESTS_SHED,
+    UPLOAD_SIZE,
+    MetricsMiddleware,
+    MongoCommandMetrics,
+    render_metrics,
+)
+from image_processing import (
+    DERIVATIVE_CONTENT_TYPE,
+    DERIVATIVE_SIZES,
+    decode_data_url,
+    extract_metadata,
+    render_derivatives,
+)
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Connections per MongoDB server in this worker's pool
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', 100))
+
+mongo_url = os.environ['MONGO_URL']
+client = AsyncIOMotorClient(mongo_url, maxPoolSize=MONGO_MAX_POOL_SIZE, event_listeners=[MongoCommandMetrics()])
+db = client[os.environ['DB_NAME']]
+
+BLOB_STORE_BACKEND = os.environ.get('BLOB_STORE', 'local')
+BLOB_STORE_PATH = Path(os.environ.get('BLOB_STORE_PATH', ROOT_DIR / 'blobs'))
+BLOB_CHUNK_SIZE = 256 * 1024
+BLOB_ID_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_BYTES', 50 * 1024 * 1024))
+MAX_FORM_FIELD_BYTES = 64 * 1024
+MAX_BATCH_FILES = int(os.environ.get('MAX_BATCH_FILES', 200))
+MAX_BATCH_BYTES = int(os.environ.get('MAX_BATCH_BYTES', 2 * 1024 * 1024 * 1024))
+# Resumable uploads keep their chunks here until completed; shared by every worker on the host
+UPLOAD_SESSION_PATH = Path(os.environ.get('UPLOAD_SESSION_PATH', ROOT_DIR / 'upload_sessions'))
+# Uploads with no chunk for this long are garbage-collected along with their chunks
+UPLOAD_SESSION_TTL = timedelta(hours=int(os.environ.get('UPLOAD_SESSION_TTL_HOURS', 24)))
+UPLOAD_SESSION_GC_INTERVAL = float(os.environ.get('UPLOAD_SESSION_GC_INTERVAL_SECONDS', 600))
+# A completion still unfinished this long after it started is taken to have died with its worker
+UPLOAD_COMPLETION_TIMEOUT = timedelta(seconds=int(os.environ.get('UPLOAD_COMPLETION_TIMEOUT_SECONDS', 600)))
+# Chunk size suggested to resumable upload clients
+UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', 5 * 1024 * 1024))
+IMAGE_PROCESS_WORKERS = int(os.environ.get('IMAGE_PROCESS_WORKERS', os.cpu_count() or 2))
+# Images per collection the metadata worker handles in one pass
+METADATA_BATCH_SIZE = int(os.environ.get('METADATA_BATCH_SIZE', 50))
+# How often the metadata worker looks for pending images uploaded through other workers
+METADATA_POLL_INTERVAL = float(os.environ.get('METADATA_POLL_INTERVAL_SECONDS', 30))
+IMAGE_VARIANTS = ("original", *DERIVATIVE_SIZES)
+GALLERY_TOMBSTONE_RETENTION = timedelta(days=int(os.environ.get('GALLERY_TOMBSTONE_RETENTION_DAYS', 7)))
+GALLERY_CHANGES_LIMIT = 500
+# created_at / deleted_at are stamped before the write commits, so a slow insert can land
+# behind a cursor that was already handed out; the changes feed looks this far back again
+GALLERY_CHANGES_OVERLAP = timedelta(seconds=int(os.environ.get('GALLERY_CHANGES_OVERLAP_SECONDS', 60)))
+PAGE_SIZE_DEFAULT = 100
+PAGE_SIZE_MAX = 500
+BULK_DELETE_MAX = 1000
+# Photos read per query while a ZIP archive is being streamed
+ARCHIVE_PAGE_SIZE = 100
+# How long a worker trusts its cached collection versions before re-reading them
+COLLECTION_VERSION_TTL = float(os.environ.get('COLLECTION_VERSION_TTL_SECONDS', 1))
+SETTINGS_MAX_AGE = int(os.environ.get('SETTINGS_MAX_AGE_SECONDS', 300))
+# Sessions revoked on another worker stay valid here for at most SESSION_CACHE_TTL
+SESSION_CACHE_TTL = float(os.environ.get('SESSION_CACHE_TTL_SECONDS', 60))
+SESSION_CACHE_SIZE = int(os.environ.get('SESSION_CACHE_SIZE', 4096))
+AUTH_SESSION_DATA_URL = os.environ.get(
+    'AUTH_SESSION_DATA_URL',
+    'https://demobackend.emergentagent.com/auth/v1/env/oauth/session-data'
+)
+AUTH_CONNECT_TIMEOUT = float(os.environ.get('AUTH_CONNECT_TIMEOUT_SECONDS', 5))
+AUTH_READ_TIMEOUT = float(os.environ.get('AUTH_READ_TIMEOUT_SECONDS', 10))
+# Logins beyond this many concurrent provider calls queue for up to AUTH_READ_TIMEOUT
+AUTH_MAX_CONNECTIONS = int(os.environ.get('AUTH_MAX_CONNECTIONS', 20))
+AUTH_SESSION_DATA_TTL = float(os.environ.get('AUTH_SESSION_DATA_TTL_SECONDS', 60))
+# Responses smaller than this go out uncompressed
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+COMPRESSION_CACHE_SIZE = int(os.environ.get('COMPRESSION_CACHE_SIZE', 256))
+# Pre-rendered guest gallery first pages and /api/site payloads kept, one per event
+GUEST_SNAPSHOT_EVENTS = int(os.environ.get('GUEST_SNAPSHOT_EVENTS', 4))
+# Public reads served at once per worker; the rest of the Mongo pool stays free for authenticated uploads
+PUBLIC_READ_CONCURRENCY = int(os.environ.get('PUBLIC_READ_CONCURRENCY', MONGO_MAX_POOL_SIZE * 3 // 4))
+# How long a public read waits for one of those slots before it is shed with 429
+PUBLIC_READ_QUEUE_TIMEOUT = float(os.environ.get('PUBLIC_READ_QUEUE_TIMEOUT_SECONDS', 1))
+# Token bucket per client address and public route. Guests on venue Wi-Fi often
+# share one address, so this is a budget for a whole venue, not for one phone.
+PUBLIC_RATE_LIMIT = float(os.environ.get('PUBLIC_RATE_LIMIT_PER_SECOND', 20))
+PUBLIC_RATE_BURST = int(os.environ.get('PUBLIC_RATE_BURST', 200))
+# ZIP archives per client address: ARCHIVE_RATE_BURST at once, then one every ARCHIVE_RATE_INTERVAL
+ARCHIVE_RATE_BURST = int(os.environ.get('ARCHIVE_RATE_BURST', 5))
+ARCHIVE_RATE_INTERVAL = float(os.environ.get('ARCHIVE_RATE_INTERVAL_SECONDS', 60))
+RATE_LIMIT_BUCKETS = int(os.environ.get('RATE_LIMIT_BUCKETS', 10000))
+# When set, GET /metrics requires "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+GALLERY_STREAM_HEARTBEAT = float(os.environ.get('GALLERY_STREAM_HEARTBEAT_SECONDS', 15))
+GALLERY_STREAM_QUEUE_SIZE = int(os.environ.get('GALLERY_STREAM_QUEUE_SIZE', 100))
+# With several workers, fan gallery events out through a MongoDB change stream (needs a replica set)
+GALLERY_CHANGE_STREAM = os.environ.get('GALLERY_CHANGE_STREAM', 'false').lower() in ('1', 'true', 'yes')
+
+# Collection name -> public route prefix for the three image collections
+IMAGE_COLLECTIONS = {
+    "photos": "photos",
+    "wall_photos": "wall-photos",
+    "background_images": "background-images",
+}
+
+app = FastAPI(default_response_class=ORJSONResponse)
+api_router = APIRouter(prefix="/api")
+security = HTTPBearer()
+
+class BlobNotFound(Exception):
+    pass
+
+class BlobWriter:
+    """Incremental blob upload: hashes and writes chunks as they arrive.
+
+    commit() returns the blob id once the content hash is known; abort()
+    discards everything written so far.
+    """
+
+    def __init__(self):
+        self.hasher = hashlib.sha256()
+        self.size = 0
+
+    async def write(self, chunk: bytes) -> None:
+        self.hasher.update(chunk)
+        self.size += len(chunk)
+        await self._write(chunk)
+
+    async def _write(self, chunk: bytes) -> None:
+        raise NotImplementedError
+
+    async def commit(self) -> str:
+        raise NotImplementedError
+
+    async def abort(self) -> None:
+        raise NotImplementedError
+
+class BlobStore:
+    """Content-addressed binary storage, keyed by the SHA-256 of the bytes"""
+
+    async def put(self, data: bytes) -> str:
+        raise NotImplementedError
+
+    async def open_writer(self) -> BlobWriter:
+        raise NotImplementedError
+
+    async def size(self, blob_id: str) -> int:
+        raise NotImplementedError
+
+    def stream(self, blob_id: str, start: int = 0, length: Optional[int] = None) -> AsyncIterator[bytes]:
+        raise NotImplementedError
+
+    async def delete(self, blob_id: str) -> None:
+        raise NotImplementedError
+
+    def local_path(self, blob_id: str) -> Optional[Path]:
+        """Filesystem path of the blob if it can be sent with sendfile, else None"""
+        return None
+
+class LocalBlobStore(BlobStore):
+    """Stores blobs as files under root/ab/cd/<sha256>"""
+
+    def __init__(self, root: Path):
+        self.root = root
+
+    def _path(self, blob_id: str) -> Path:
+        if not BLOB_ID_PATTERN.match(blob_id):
+            raise BlobNotFound(blob_id)
+        return self.root / blob_id[:2] / blob_id[2:4] / blob_id
+
+    def _write(self, blob_id: str, data: bytes) -> None:
+        path = self._path(blob_id)
+        if path.exists():
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{blob_id}.{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    async def put(self, data: bytes) -> str:
+        blob_id = hashlib.sha256(data).hexdigest()
+        await asyncio.to_thread(self._write, blob_id, data)
+        return blob_id
+
+    async def size(self, blob_id: str) -> int:
+        try:
+            return (await asyncio.to_thread(self._path(blob_id).stat)).st_size
+        except FileNotFoundError:
+            raise BlobNotFound(blob_id)
+
+    async def stream(self, blob_id: str, start: int = 0, length: Optional[int] = None) -> AsyncIterator[bytes]:
+        try:
+            f = await asyncio.to_thread(open, self._path(blob_id), "rb")
+        except FileNotFoundError:
+            raise BlobNotFound(blob_id)
+        try:
+            await asyncio.to_thread(f.seek, start)
+            remaining = length
+            while remaining is None or remaining > 0:
+                size = BLOB_CHUNK_SIZE if remaining is None else min(BLOB_CHUNK_SIZE, remaining)
+                chunk = await asyncio.to_thread(f.read, size)
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+        finally:
+            f.close()
+
+    async def delete(self, blob_id: str) -> None:
+        try:
+            await asyncio.to_thread(self._path(blob_id).unlink)
+        except FileNotFoundError:
+            pass
+
+    def local_path(self, blob_id: str) -> Optional[Path]:
+        return self._path(blob_id)
+
+    async def open_writer(self) -> BlobWriter:
+        tmp_dir = self.root / "tmp"
+        await asyncio.to_thread(tmp_dir.mkdir, parents=True, exist_ok=True)
+        tmp_path = tmp_dir / f"{uuid.uuid4().hex}.part"
+        return LocalBlobWriter(self, tmp_path, await asyncio.to_thread(open, tmp_path, "wb"))
+
+class LocalBlobWriter(BlobWriter):
+    def __init__(self, store: LocalBlobStore, tmp_path: Path, f):
+        super().__init__()
+        self.store = store
+        self.tmp_path = tmp_path
+        self.f = f
+
+    async def _write(self, chunk: bytes) -> None:
+        await asyncio.to_thread(self.f.write, chunk)
+
+    def _finish(self, blob_id: str) -> None:
+        self.f.close()
+        path = self.store._path(blob_id)
+        if path.exists():
+            self.tmp_path.unlink()
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(self.tmp_path, path)
+
+    async def commit(self) -> str:
+        blob_id = self.hasher.hexdigest()
+        await asyncio.to_thread(self._finish, blob_id)
+        return blob_id
+
+    def _discard(self) -> None:
+        self.f.close()
+        self.tmp_path.unlink(missing_ok=True)
+
+    async def abort(self) -> None:
+        await asyncio.to_thread(self._discard)
+
+class GridFSBlobStore(BlobStore):
+    """Stores blobs in a GridFS bucket, using the content hash as the filename"""
+
+    def __init__(self, database, bucket_name: str = "images"):
+        self.bucket = AsyncIOMotorGridFSBucket(database, bucket_name=bucket_name)
+        self.files = database[f"{bucket_name}.files"]
+
+    async def _find(self, blob_id: str) -> dict:
+        grid_file = await self.files.find_one({"filename": blob_id}, {"_id": 1, "length": 1})
+        if not grid_file:
+            raise BlobNotFound(blob_id)
+        return grid_file
+
+    async def put(self, data: bytes) -> str:
+        blob_id = hashlib.sha256(data).hexdigest()
+        if not await self.files.find_one({"filename": blob_id}, {"_id": 1}):
+            await self.bucket.upload_from_stream(blob_id, data)
+        return blob_id
+
+    async def size(self, blob_id: str) -> int:
+        return (await self._find(blob_id))["length"]
+
+    async def stream(self, blob_id: str, start: int = 0, length: Optional[int] = None) -> AsyncIterator[bytes]:
+        grid_file = await self._find(blob_id)
+        grid_out = await self.bucket.open_download_stream(grid_file["_id"])
+        grid_out.seek(start)
+        remaining = grid_file["length"] - start if length is None else length
+        while remaining > 0:
+            chunk = await grid_out.read(min(BLOB_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+    async def delete(self, blob_id: str) -> None:
+        async for grid_file in self.files.find({"filename": blob_id}, {"_id": 1}):
+            await self.bucket.delete(grid_file["_id"])
+
+    async def open_writer(self) -> BlobWriter:
+        return GridFSBlobWriter(self, self.bucket.open_upload_stream(f"upload-{uuid.uuid4().hex}"))
+
+class GridFSBlobWriter(BlobWriter):
+    """Uploads under a temporary filename and renames to the hash on commit"""
+
+    def __init__(self, store: GridFSBlobStore, grid_in):
+        super().__init__()
+        self.store = store
+        self.grid_in = grid_in
+
+    async def _write(self, chunk: bytes) -> None:
+        await self.grid_in.write(chunk)
+
+    async def commit(self) -> str:
+        blob_id = self.hasher.hexdigest()
+        await self.grid_in.close()
+        if await self.store.files.find_one({"filename": blob_id}, {"_id": 1}):
+            await self.store.bucket.delete(self.grid_in._id)
+        else:
+            await self.store.bucket.rename(self.grid_in._id, blob_id)
+        return blob_id
+
+    async def abort(self) -> None:
+        await self.grid_in.abort()
+
+def create_blob_store() -> BlobStore:
+    if BLOB_STORE_BACKEND == "gridfs":
+        return GridFSBlobStore(db)
+    if BLOB_STORE_BACKEND != "local":
+        raise RuntimeError(f"Unknown BLOB_STORE backend: {BLOB_STORE_BACKEND}")
+    return LocalBlobStore(BLOB_STORE_PATH)
+
+blob_store = create_blob_store()
+
+class BlobRangeResponse(Response):
+    """Sends a byte range of a stored blob.
+
+    Local blobs use the ASGI zero-copy send extension when the server offers it,
+    everything else is streamed from the store in chunks.
+    """
+
+    def __init__(self, blob_id: str, start: int, length: int, status_code: int = 200,
+                 headers: Optional[dict] = None, media_type: Optional[str] = None):
+        super().__init__(status_code=status_code, headers=headers, media_type=media_type)
+        self.blob_id = blob_id
+        self.start = start
+        self.length = length
+        self.headers["content-length"] = str(length)
+
+    async def __call__(self, scope, receive, send):
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": self.raw_headers,
+        })
+        if scope["method"] == "HEAD" or self.length == 0:
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        path = blob_store.local_path(self.blob_id)
+        if path is not None and "http.response.zerocopysend" in scope.get("extensions", {}):
+            with open(path, "rb") as f:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": f.fileno(),
+                    "offset": self.start,
+                    "count": self.length,
+                })
+            return
+
+        async for chunk in blob_store.stream(self.blob_id, self.start, self.length):
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+
+def decode_image_data(image_data: str) -> Tuple[bytes, str]:
+    """Decode a base64 payload (optionally a data: URL) into bytes and a content type"""
+    try:
+        return decode_data_url(image_data)
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="image_data is not valid base64")
+
+_image_pool: Optional[ProcessPoolExecutor] = None
+
+def get_image_pool() -> ProcessPoolExecutor:
+    """Process pool for Pillow work, created on first use"""
+    global _image_pool
+    if _image_pool is None:
+        # spawn keeps Motor's threads and sockets out of the workers
+        _image_pool = ProcessPoolExecutor(
+            max_workers=IMAGE_PROCESS_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _image_pool
+
+async def render_image(source) -> dict:
+    """Run render_derivatives in the process pool; source is the image bytes or a file path"""
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(get_image_pool(), render_derivatives, source)
+    except (UnidentifiedImageError, OSError, ValueError):
+        raise HTTPException(status_code=400, detail="Upload is not a supported image")
+
+async def store_image(image_data: str) -> dict:
+    """Write an uploaded image and its derivatives to the blob store.
+
+    Returns the document fields referencing the stored blobs, holding one
+    reference on them. Content that is already stored is not rendered or
+    written again.
+    """
+    data, content_type = decode_image_data(image_data)
+    UPLOAD_SIZE.labels("json").observe(len(data))
+    return await store_image_bytes(data, content_type)
+
+async def store_image_bytes(data: bytes, content_type: str) -> dict:
+    """Store decoded image bytes and their derivatives; see store_image"""
+    image_fields = await reuse_image(hashlib.sha256(data).hexdigest())
+    if image_fields is not None:
+        return image_fields
+    rendered = await render_image(data)
+    blob_id = await blob_store.put(data)
+    return await store_derivatives(blob_id, content_type, len(data), rendered)
+
+async def store_derivatives(blob_id: str, content_type: str, size: int, rendered: dict) -> dict:
+    """Write rendered derivatives of a stored original and register the image.
+
+    Returns the document fields, holding one reference on the original. If
+    that fails, the derivatives written so far are removed again.
+    """
+    derivatives = {}
+    try:
+        for name in DERIVATIVE_SIZES:
+            derivative = rendered[name]
+            derivatives[name] = {
+                "blob_id": await blob_store.put(derivative["data"]),
+                "content_type": DERIVATIVE_CONTENT_TYPE,
+                "size": len(derivative["data"]),
+                "width": derivative["width"],
+                "height": derivative["height"],
+            }
+
+        return await register_image({
+            "blob_id": blob_id,
+            "content_type": content_type,
+            "size": size,
+            "width": rendered["original"]["width"],
+            "height": rendered["original"]["height"],
+            "derivatives": derivatives,
+        })
+    except Exception:
+        await delete_unreferenced_blobs([d["blob_id"] for d in derivatives.values()])
+        raise
+
+class MultipartImageUpload:
+    """Incremental multipart/form-data parser for image uploads.
+
+    Parser callbacks only queue events; feed() applies them so every "file"
+    part is written to its own BlobWriter as it arrives. Other parts are
+    kept as small text fields.
+    """
+
+    def __init__(self, boundary: bytes, max_files: int):
+        self.max_files = max_files
+        self.fields = {}
+        self.files = []
+        self.writer: Optional[BlobWriter] = None
+        self._events = []
+        self._headers = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._part_name: Optional[str] = None
+        self._part_data = bytearray()
+        self._file: Optional[dict] = None
+        self.parser = MultipartParser(boundary, callbacks={
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": lambda: self._events.append(("headers", dict(self._headers))),
+            "on_part_data": lambda data, start, end: self._events.append(("data", bytes(data[start:end]))),
+            "on_part_end": lambda: self._events.append(("end", None)),
+        })
+
+    def _on_part_begin(self):
+        self._headers = {}
+
+    def _on_header_field(self, data, start, end):
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data, start, end):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    async def feed(self, chunk: bytes) -> None:
+        try:
+            self.parser.write(chunk)
+        except MultipartParseError:
+            raise HTTPException(status_code=400, detail="Malformed multipart body")
+        events, self._events = self._events, []
+        for kind, value in events:
+            if kind == "headers":
+                _, options = parse_options_header(value.get(b"content-disposition", b""))
+                self._part_name = options.get(b"name", b"").decode("utf-8", "replace")
+                if self._part_name == "file":
+                    if len(self.files) >= self.max_files:
+                        raise HTTPException(status_code=400, detail=f"At most {self.max_files} file(s) per upload")
+                    content_type = value.get(b"content-type", b"").decode("latin-1").strip().lower()
+                    self._file = {
+                        "filename": options.get(b"filename", b"").decode("utf-8", "replace") or None,
+                        "content_type": content_type if content_type.startswith("image/") else "application/octet-stream",
+                    }
+                    self.writer = await blob_store.open_writer()
+                self._part_data = bytearray()
+            elif kind == "data":
+                if self._part_name == "file":
+                    await self.writer.write(value)
+                    if self.writer.size > MAX_UPLOAD_BYTES:
+                        raise HTTPException(status_code=413, detail="File too large")
+                else:
+                    self._part_data += value
+                    if len(self._part_data) > MAX_FORM_FIELD_BYTES:
+                        raise HTTPException(status_code=413, detail="Form field too large")
+            elif kind == "end" and self._part_name == "file":
+                self._file["blob_id"] = await self.writer.commit()
+                self._file["size"] = self.writer.size
+                UPLOAD_SIZE.labels("multipart").observe(self.writer.size)
+                self.files.append(self._file)
+                self.writer = None
+            elif kind == "end" and self._part_name:
+                self.fields[self._part_name] = self._part_data.decode("utf-8", "replace")
+
+    def finish(self) -> None:
+        """Check the body ended with its closing boundary, not part way through a part"""
+        if self.parser.state != MultipartState.END:
+            raise HTTPException(status_code=400, detail="Incomplete multipart body")
+
+    async def discard(self) -> None:
+        """Drop everything written so far after a failed upload"""
+        if self.writer is not None:
+            await self.writer.abort()
+            self.writer = None
+        await delete_unreferenced_blobs([file["blob_id"] for file in self.files])
+
+async def receive_image_files(request: Request, max_files: int, max_bytes: int) -> Tuple[dict, List[dict]]:
+    """Stream the "file" parts of a multipart/form-data upload into the blob store.
+
+    Each file is hashed and written chunk by chunk as it arrives and rejected
+    as soon as it exceeds MAX_UPLOAD_BYTES, so memory use does not depend on
+    the file size. Returns (form fields, [{filename, content_type, blob_id, size}]).
+    """
+    media_type, options = parse_options_header(request.headers.get("content-type", ""))
+    if media_type != b"multipart/form-data" or not options.get(b"boundary"):
+        raise HTTPException(status_code=400, detail="Expected multipart/form-data")
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+        raise HTTPException(status_code=413, detail="Upload too large")
+
+    upload = MultipartImageUpload(options[b"boundary"], max_files)
+    try:
+        async for chunk in request.stream():
+            await upload.feed(chunk)
+        upload.finish()
+        if not upload.files:
+            raise HTTPException(status_code=400, detail="Missing file field")
+    except BaseException:
+        await upload.discard()
+        raise
+    return upload.fields, upload.files
+
+async def blob_source(blob_id: str):
+    """A stored blob as something the process pool can open: its file path, or its bytes"""
+    path = blob_store.local_path(blob_id)
+    if path is not None:
+        return str(path)
+    return b"".join([chunk async for chunk in blob_store.stream(blob_id)])
+
+async def process_uploaded_image(file: dict) -> dict:
+    """Render derivatives for a file streamed in by receive_image_files.
+
+    Returns the image document fields, reusing the stored derivatives when the
+    same content was uploaded before. An image that fails to process holds no
+    reference and is removed from the blob store again; an unsupported one
+    raises 400.
+    """
+    try:
+        image_fields = await reuse_image(file["blob_id"])
+        if image_fields is not None:
+            return image_fields
+        rendered = await render_image(await blob_source(file["blob_id"]))
+        return await store_derivatives(file["blob_id"], file["content_type"], file["size"], rendered)
+    except Exception:
+        await delete_unreferenced_blobs([file["blob_id"]])
+        raise
+
+async def reuse_uploaded_image(blob_id: str) -> dict:
+    """Image fields for an upload-existing request, or 404 so the client sends the file"""
+    image_fields = await reuse_image(blob_id.lower()) if BLOB_ID_PATTERN.match(blob_id.lower()) else None
+    if image_fields is None:
+        raise HTTPException(status_code=404, detail="Image not stored yet")
+    return image_fields
+
+async def receive_image_upload(request: Request) -> Tuple[dict, Optional[str], dict]:
+    """Receive a single-file image upload; returns (form fields, file name, image fields)"""
+    fields, files = await receive_image_files(request, 1, MAX_UPLOAD_BYTES + MAX_FORM_FIELD_BYTES)
+    image_fields = await process_uploaded_image(files[0])
+    return fields, files[0]["filename"], image_fields
+
+def new_image_document(user: dict, filename: str, image_fields: dict, **extra) -> dict:
+    """Build the document for a newly uploaded image
+    
+    Images whose metadata has not been extracted yet are flagged for image_metadata_worker.
+    """
+    now = datetime.now(timezone.utc)
+    doc = {
+        "photo_id": str(uuid.uuid4()),
+        "filename": filename,
+        **image_fields,
+        **extra,
+        "photographer_id": user["user_id"],
+        "photographer_name": user["name"],
+        "upload_timestamp": now.isoformat(),
+        "created_at": now
+    }
+    if "metadata" not in image_fields:
+        doc["metadata_pending"] = True
+    return doc
+
+async def insert_image_documents(collection_name: str, docs: List[dict], partial: bool = False) -> Dict[int, str]:
+    """Insert new image documents and announce the change.
+
+    Documents that fail to insert give back their blob references. Returns
+    {index in docs: error message} for those; raises if none was inserted,
+    unless partial is set.
+    """
+    failed = {}
+    try:
+        await db[collection_name].insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        failed = {error["index"]: error.get("errmsg", "Insert failed") for error in e.details.get("writeErrors", [])}
+        error = e
+    except PyMongoError as e:
+        # The insert may have stopped part way: only documents not found were not written
+        stored = {
+            doc["photo_id"]
+            async for doc in db[collection_name].find(
+                {"photo_id": {"$in": [doc["photo_id"] for doc in docs]}},
+                {"_id": 0, "photo_id": 1}
+            )
+        }
+        failed = {index: str(e) for index, doc in enumerate(docs) if doc["photo_id"] not in stored}
+        error = e
+    await release_blobs(*(docs[index] for index in failed))
+    if len(failed) == len(docs):
+        if partial:
+            return failed
+        raise error
+    inserted = [doc for index, doc in enumerate(docs) if index not in failed]
+    await collection_versions.bump(collection_name)
+    if any(doc.get("metadata_pending") for doc in inserted):
+        image_metadata_worker.notify()
+    if collection_name == "photos":
+        for doc in inserted:
+            publish_photo_added(doc)
+    return failed
+
+async def record_photo_deletions(photos: List[dict]) -> None:
+    """Write tombstones for deleted gallery photos and announce them to live clients"""
+    deleted_at = datetime.now(timezone.utc)
+    await db.photo_tombstones.insert_many(
+        [
+            {"photo_id": photo["photo_id"], "event_id": photo.get("event_id"), "deleted_at": deleted_at}
+            for photo in photos
+        ],
+        ordered=False
+    )
+    for photo in photos:
+        publish_photo_deleted(photo["photo_id"], photo.get("event_id"), deleted_at)
+
+async def delete_image_documents(collection_name: str, photo_ids: List[str], user: dict) -> dict:
+    """Delete many of a photographer's images.
+
+    IDs that do not exist or belong to someone else are reported back as
+    rejected instead of failing the whole request. Every document is removed
+    with its own find_one_and_delete, so of two overlapping requests only the
+    one that actually deleted an image releases its blobs and reports it.
+    """
+    photo_ids = list(dict.fromkeys(photo_ids))
+    found = {
+        doc["photo_id"]: doc
+        async for doc in db[collection_name].find(
+            {"photo_id": {"$in": photo_ids}},
+            {"_id": 0, "photo_id": 1, "photographer_id": 1}
+        )
+    }
+    owned = [photo_id for photo_id in photo_ids if found.get(photo_id, {}).get("photographer_id") == user["user_id"]]
+    rejected = [
+        {"photo_id": photo_id, "reason": "forbidden" if photo_id in found else "not_found"}
+        for photo_id in photo_ids if photo_id not in owned
+    ]
+    
+    removed = await asyncio.gather(*(delete_image_document(collection_name, photo_id, user) for photo_id in owned))
+    deleted = [doc for doc in removed if doc is not None]
+    rejected.extend({"photo_id": photo_id, "reason": "not_found"} for photo_id, doc in zip(owned, removed) if doc is None)
+    if deleted:
+        await collection_versions.bump(collection_name)
+        if collection_name == "photos":
+            await record_photo_deletions(deleted)
+        await release_blobs(*deleted)
+    
+    return {"deleted": [doc["photo_id"] for doc in deleted], "rejected": rejected}
+
+async def delete_image_document(collection_name: str, photo_id: str, user: dict) -> Optional[dict]:
+    """Delete one of a photographer's images; returns it, or None if it was already gone"""
+    return await db[collection_name].find_one_and_delete(
+        {"photo_id": photo_id, "photographer_id": user["user_id"]},
+        {"_id": 0, "photo_id": 1, "event_id": 1, "blob_id": 1, "derivatives": 1}
+    )
+
+def image_blob_ids(doc: dict) -> List[str]:
+    """All blob ids referenced by an image document, original first"""
+    blob_ids = [doc["blob_id"]] if doc.get("blob_id") else []
+    blob_ids.extend(d["blob_id"] for d in doc.get("derivatives", {}).values())
+    return blob_ids
+
+# Stored images are reference counted in the blobs collection, one record per
+# original: {_id: blob_id, refs, image: <document fields incl. derivatives>}.
+# refs is the number of image documents (in any collection) pointing at the
+# original; the derivatives live and die with it.
+
+async def register_image(image_fields: dict) -> dict:
+    """Take a reference on a freshly stored image, recording its fields for reuse"""
+    record = await db.blobs.find_one_and_update(
+        {"_id": image_fields["blob_id"]},
+        {
+            "$inc": {"refs": 1},
+            "$set": {"image": image_fields},
+            "$setOnInsert": {"created_at": datetime.now(timezone.utc)}
+        },
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return record["image"]
+
+async def reuse_image(blob_id: str) -> Optional[dict]:
+    """Take another reference on an already stored image.
+
+    Returns its document fields, or None if the content is not stored (or lacks
+    some derivative) and has to be processed as new.
+    """
+    record = await db.blobs.find_one_and_update(
+        {"_id": blob_id, **{f"image.derivatives.{name}": {"$exists": True} for name in DERIVATIVE_SIZES}},
+        {"$inc": {"refs": 1}},
+        projection={"image": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    return record["image"] if record else None
+
+async def release_blobs(*docs: dict) -> None:
+    """Drop the references of removed image documents.
+
+    The original and its derivatives are deleted from the blob store when the
+    last reference goes.
+    """
+    for blob_id, count in Counter(doc["blob_id"] for doc in docs if doc.get("blob_id")).items():
+        record = await db.blobs.find_one_and_update(
+            {"_id": blob_id},
+            {"$inc": {"refs": -count}},
+            return_document=ReturnDocument.AFTER
+        )
+        if record is None or record["refs"] > 0:
+            continue
+        if await db.blobs.find_one_and_delete({"_id": blob_id, "refs": {"$lte": 0}}):
+            await delete_unreferenced_blobs(image_blob_ids(record["image"]))
+
+async def delete_unreferenced_blobs(blob_ids: List[str]) -> None:
+    """Delete blobs that no image record uses as its original or a derivative"""
+    for blob_id in set(blob_ids):
+        if not await db.blobs.find_one(
+            {"$or": [
+                {"_id": blob_id},
+                *({f"image.derivatives.{name}.blob_id": blob_id} for name in DERIVATIVE_SIZES)
+            ]},
+            {"_id": 1}
+        ):
+            await blob_store.delete(blob_id)
+
+# One-time data migrations record a marker in db.migrations. Only a marker with
+# finished_at counts as done, so a migration interrupted by a crash or restart
+# runs again; each one is written to be safe to repeat.
+
+async def start_migration(name: str, **fields) -> Optional[dict]:
+    """The migration's marker, created with fields on first start; None if it already finished"""
+    marker = await db.migrations.find_one_and_update(
+        {"_id": name},
+        {"$setOnInsert": {"started_at": datetime.now(timezone.utc), **fields}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return None if marker.get("finished_at") else marker
+
+async def finish_migration(name: str) -> None:
+    await db.migrations.update_one({"_id": name}, {"$set": {"finished_at": datetime.now(timezone.utc)}})
+
+async def backfill_blob_refs() -> None:
+    """Build the blobs collection from image documents stored before it existed.
+
+    Every pass recounts the documents per blob and raises refs to that count
+    with $max: re-running it never double counts, and references taken by
+    uploads on other workers in the meantime are never lowered.
+    """
+    if not await start_migration("blob_refs"):
+        return
+    refs = Counter()
+    images = {}
+    for collection_name in IMAGE_COLLECTIONS:
+        async for group in db[collection_name].aggregate([
+            {"$match": {"blob_id": {"$exists": True}}},
+            {"$group": {"_id": "$blob_id", "refs": {"$sum": 1}, "doc": {"$first": "$$ROOT"}}},
+        ]):
+            refs[group["_id"]] += group["refs"]
+            images.setdefault(group["_id"], {
+                field: group["doc"][field]
+                for field in ("blob_id", "content_type", "size", "width", "height", "derivatives")
+                if field in group["doc"]
+            })
+    
+    updates = [
+        UpdateOne(
+            {"_id": blob_id},
+            {"$max": {"refs": count}, "$setOnInsert": {"image": images[blob_id], "created_at": datetime.now(timezone.utc)}},
+            upsert=True
+        )
+        for blob_id, count in refs.items()
+    ]
+    for start in range(0, len(updates), 1000):
+        await db.blobs.bulk_write(updates[start:start + 1000], ordered=False)
+    await finish_migration("blob_refs")
+
+async def assign_default_event() -> None:
+    """Put photos uploaded before events existed into a first event and make it current.
+
+    The event id is fixed in the migration marker when it first starts, so a
+    run repeated after an interruption (or racing another worker) fills the
+    same event instead of creating a second one.
+    """
+    marker = await start_migration("events", event_id=str(uuid.uuid4()))
+    if not marker:
+        return
+    settings = await db.settings.find_one({}, {"_id": 0}) or {}
+    event_id = settings.get("current_event_id")
+    if event_id is None:
+        couple = " & ".join(name for name in (settings.get("bride_name"), settings.get("groom_name")) if name)
+        # Markers left by an interrupted run of older code carry no event id
+        event_id = marker.get("event_id") or str(uuid.uuid4())
+        await db.events.update_one(
+            {"event_id": event_id},
+            {"$setOnInsert": {
+                "name": couple or "Wedding",
+                "wedding_date": None,
+                "archived": False,
+                "created_by": None,
+                "created_at": datetime.now(timezone.utc)
+            }},
+            upsert=True
+        )
+        await collection_versions.bump("events")
+        changes = {"current_event_id": event_id}
+        await settings_cache.update(changes if settings else {**DEFAULT_SETTINGS, **changes})
+    for collection_name in ("photos", "photo_tombstones"):
+        await db[collection_name].update_many({"event_id": {"$exists": False}}, {"$set": {"event_id": event_id}})
+    await collection_versions.bump("photos")
+    await finish_migration("events")
+
+async def flag_images_for_metadata() -> None:
+    """Queue images uploaded before metadata extraction existed for image_metadata_worker"""
+    if not await start_migration("image_metadata"):
+        return
+    for collection_name in IMAGE_COLLECTIONS:
+        await db[collection_name].update_many(
+            {"metadata": {"$exists": False}},
+            {"$set": {"metadata_pending": True}}
+        )
+    await finish_migration("image_metadata")
+
+async def image_metadata(blob_id: Optional[str]) -> dict:
+    """EXIF details and blurhash of a stored original, extracted once per image content
+    
+    The result is kept on the blobs record, so duplicate uploads reuse it. An
+    image that cannot be read gets empty metadata rather than being retried.
+    """
+    if blob_id is None:
+        return {}
+    record = await db.blobs.find_one({"_id": blob_id}, {"image.metadata": 1})
+    if record and "metadata" in record.get("image", {}):
+        return record["image"]["metadata"]
+    
+    loop = asyncio.get_running_loop()
+    try:
+        metadata = await loop.run_in_executor(get_image_pool(), extract_metadata, await blob_source(blob_id))
+    except (BlobNotFound, UnidentifiedImageError, OSError, ValueError) as e:
+        logger.warning(f"Could not extract metadata of blob {blob_id}: {e}")
+        metadata = {}
+    await db.blobs.update_one({"_id": blob_id}, {"$set": {"image.metadata": metadata}})
+    return metadata
+
+class ImageMetadataWorker:
+    """Post-upload stage filling in each image document's metadata.
+
+    Uploads only render derivatives; capture time, orientation, camera and
+    the blurhash placeholder are extracted here, in the process pool, and
+    written back to every document flagged metadata_pending. Uploads on this
+    worker wake it straight away; a poll every METADATA_POLL_INTERVAL picks
+    up images uploaded elsewhere. Workers running concurrently may extract
+    the same image twice, which is harmless.
+    """
+
+    def __init__(self):
+        self._wakeup = asyncio.Event()
+
+    def notify(self) -> None:
+        self._wakeup.set()
+
+    async def run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            try:
+                processed = await self.process_pending()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Image metadata pass failed, retrying: {e}")
+                processed = 0
+            if not processed:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=METADATA_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def process_pending(self) -> int:
+        """Handle up to METADATA_BATCH_SIZE pending images per collection; returns how many"""
+        processed = 0
+        slots = asyncio.Semaphore(IMAGE_PROCESS_WORKERS)
+        for collection_name in IMAGE_COLLECTIONS:
+            docs = await db[collection_name].find(
+                {"metadata_pending": True},
+                {"_id": 0, "photo_id": 1, "blob_id": 1}
+            ).limit(METADATA_BATCH_SIZE).to_list(METADATA_BATCH_SIZE)
+            if not docs:
+                continue
+            photo_ids = defaultdict(list)
+            for doc in docs:
+                photo_ids[doc.get("blob_id")].append(doc["photo_id"])
+            
+            async def process(blob_id: Optional[str]) -> None:
+                async with slots:
+                    metadata = await image_metadata(blob_id)
+                await db[collection_name].update_many(
+                    {"photo_id": {"$in": photo_ids[blob_id]}},
+                    {"$set": {"metadata": metadata}, "$unset": {"metadata_pending": ""}}
+                )
+            
+            await asyncio.gather(*(process(blob_id) for blob_id in photo_ids))
+            await collection_versions.bump(collection_name)
+            processed += len(docs)
+        return processed
+
+image_metadata_worker = ImageMetadataWorker()
+
+# Resumable uploads have one record each in db.upload_sessions:
+# {upload_id, user_id, collection, filename, content_type, size, sha256,
+#  fields, offset, chunks: [{offset, size, sha256, file}], state, expires_at}.
+# /complete moves state from "uploading" to "completing", recording claimed_at
+# and the photo_id it is about to insert, and then to "completed".
+# Every PATCH is written to its own file under UPLOAD_SESSION_PATH/<upload_id>/
+# and only recorded if the upload was still at the offset the chunk started
+# from, so a retry racing a stalled request never interleaves bytes.
+
+def upload_session_dir(upload_id: str) -> Path:
+    return UPLOAD_SESSION_PATH / upload_id
+
+def _remove_upload_files(upload_id: str) -> None:
+    shutil.rmtree(upload_session_dir(upload_id), ignore_errors=True)
+
+async def finish_upload_session(upload_id: str, photo_id: str) -> None:
+    """Mark an upload completed with its photo and drop its chunk files"""
+    await db.upload_sessions.update_one(
+        {"upload_id": upload_id},
+        {"$set": {"state": "completed", "photo_id": photo_id}, "$unset": {"chunks": ""}}
+    )
+    await asyncio.to_thread(_remove_upload_files, upload_id)
+
+async def remove_upload_session(upload_id: str) -> None:
+    """Delete an upload session and its chunk files"""
+    await db.upload_sessions.delete_one({"upload_id": upload_id})
+    await asyncio.to_thread(_remove_upload_files, upload_id)
+
+def completion_stalled(session: dict) -> bool:
+    """Whether a "completing" upload was claimed longer than UPLOAD_COMPLETION_TIMEOUT ago"""
+    claimed_at = session.get("claimed_at")
+    if claimed_at is None:
+        return True
+    return datetime.now(timezone.utc) - claimed_at.replace(tzinfo=timezone.utc) > UPLOAD_COMPLETION_TIMEOUT
+
+async def find_upload_session(upload_id: str, user: dict) -> dict:
+    """The caller's unexpired upload session, or 404"""
+    session = await db.upload_sessions.find_one(
+        {"upload_id": upload_id, "user_id": user["user_id"], "expires_at": {"$gt": datetime.now(timezone.utc)}},
+        {"_id": 0}
+    )
+    if not session:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return session
+
+def parse_upload_checksum(header: Optional[str]) -> Optional[bytes]:
+    """The digest from a tus-style "Upload-Checksum: sha256 <base64>" header"""
+    if header is None:
+        return None
+    algorithm, _, value = header.strip().partition(" ")
+    if algorithm.lower() != "sha256":
+        raise HTTPException(status_code=400, detail="Upload-Checksum must use sha256")
+    try:
+        digest = base64.b64decode(value.strip(), validate=True)
+    except binascii.Error:
+        digest = b""
+    if len(digest) != hashlib.sha256().digest_size:
+        raise HTTPException(status_code=400, detail="Invalid Upload-Checksum")
+    return digest
+
+async def receive_upload_chunk(request: Request, session: dict, offset: int) -> Optional[dict]:
+    """Stream a PATCH body into a new chunk file; returns its chunk record, or None if nothing was kept
+    
+    With an Upload-Checksum the chunk is kept only if it arrived whole and
+    matches (460 otherwise). Without one, the bytes that arrived before a
+    dropped connection are kept, so the retry only sends the rest.
+    """
+    expected = parse_upload_checksum(request.headers.get("upload-checksum"))
+    remaining = session["size"] - offset
+    directory = upload_session_dir(session["upload_id"])
+    await asyncio.to_thread(directory.mkdir, parents=True, exist_ok=True)
+    path = directory / f"{offset:012d}-{uuid.uuid4().hex}.chunk"
+    hasher = hashlib.sha256()
+    size = 0
+    disconnected = False
+    
+    f = await asyncio.to_thread(open, path, "wb")
+    try:
+        try:
+            async for data in request.stream():
+                size += len(data)
+                if size > remaining:
+                    raise HTTPException(status_code=413, detail="Chunk goes past the end of the upload")
+                hasher.update(data)
+                await asyncio.to_thread(f.write, data)
+        except ClientDisconnect:
+            disconnected = True
+        finally:
+            await asyncio.to_thread(f.close)
+        if expected is not None and not disconnected and hasher.digest() != expected:
+            raise HTTPException(status_code=460, detail="Checksum mismatch")
+    except BaseException:
+        await asyncio.to_thread(path.unlink, missing_ok=True)
+        raise
+    
+    if not size or (expected is not None and disconnected):
+        await asyncio.to_thread(path.unlink, missing_ok=True)
+        return None
+    return {"offset": offset, "size": size, "sha256": hasher.hexdigest(), "file": path.name}
+
+async def copy_upload_chunk(path: Path, sha256: str, writer: BlobWriter) -> bool:
+    """Append a chunk file to a blob writer; False if it is missing or no longer matches its checksum"""
+    try:
+        f = await asyncio.to_thread(open, path, "rb")
+    except FileNotFoundError:
+        return False
+    hasher = hashlib.sha256()
+    try:
+        while True:
+            data = await asyncio.to_thread(f.read, BLOB_CHUNK_SIZE)
+            if not data:
+                break
+            hasher.update(data)
+            await writer.write(data)
+    finally:
+        f.close()
+    return hasher.hexdigest() == sha256
+
+async def assemble_upload(session: dict) -> dict:
+    """Copy a finished upload's chunks, in order, into the blob store
+    
+    Returns the file for process_uploaded_image. A chunk that went missing or
+    was damaged on disk is dropped along with everything after it, and 409
+    tells the client to resume from its offset.
+    """
+    directory = upload_session_dir(session["upload_id"])
+    chunks = session["chunks"]
+    lost = None
+    writer = await blob_store.open_writer()
+    try:
+        for index, chunk in enumerate(chunks):
+            if not await copy_upload_chunk(directory / chunk["file"], chunk["sha256"], writer):
+                lost = index
+                break
+    except BaseException:
+        await writer.abort()
+        raise
+    
+    if lost is not None:
+        await writer.abort()
+        offset = chunks[lost]["offset"]
+        await db.upload_sessions.update_one(
+            {"upload_id": session["upload_id"]},
+            {"$set": {"state": "uploading", "offset": offset, "chunks": chunks[:lost]}}
+        )
+        for chunk in chunks[lost:]:
+            await asyncio.to_thread((directory / chunk["file"]).unlink, missing_ok=True)
+        raise HTTPException(
+            status_code=409,
+            detail="Part of the upload was lost; resend from Upload-Offset",
+            headers={"Upload-Offset": str(offset)}
+        )
+    
+    blob_id = await writer.commit()
+    UPLOAD_SIZE.labels("resumable").observe(writer.size)
+    return {"blob_id": blob_id, "content_type": session["content_type"], "size": writer.size}
+
+async def upload_image_fields(session: dict) -> dict:
+    """Image document fields for a completed upload
+    
+    Content the client declared by SHA-256 and that is already stored is
+    reused without copying the chunks; otherwise they are assembled, checked
+    against that SHA-256 (460 on mismatch) and processed like a multipart upload.
+    """
+    if session.get("sha256"):
+        image_fields = await reuse_image(session["sha256"])
+        if image_fields is not None:
+            return image_fields
+    file = await assemble_upload(session)
+    if session.get("sha256") and file["blob_id"] != session["sha256"]:
+        await delete_unreferenced_blobs([file["blob_id"]])
+        raise HTTPException(status_code=460, detail="Checksum mismatch")
+    return await process_uploaded_image(file)
+
+async def collect_upload_sessions() -> int:
+    """Delete expired upload sessions, and chunk directories no session owns any more; returns how many"""
+    removed = 0
+    async for session in db.upload_sessions.find(
+        {"expires_at": {"$lt": datetime.now(timezone.utc)}},
+        {"_id": 0, "upload_id": 1}
+    ):
+        await remove_upload_session(session["upload_id"])
+        removed += 1
+    
+    def stale_directories() -> List[str]:
+        if not UPLOAD_SESSION_PATH.is_dir():
+            return []
+        cutoff = time.time() - UPLOAD_SESSION_TTL.total_seconds()
+        return [path.name for path in UPLOAD_SESSION_PATH.iterdir() if path.is_dir() and path.stat().st_mtime < cutoff]
+    
+    for upload_id in await asyncio.to_thread(stale_directories):
+        if not await db.upload_sessions.find_one({"upload_id": upload_id}, {"_id": 1}):
+            await asyncio.to_thread(_remove_upload_files, upload_id)
+            removed += 1
+    return removed
+
+async def run_upload_session_gc() -> None:
+    """Garbage-collect abandoned resumable uploads every UPLOAD_SESSION_GC_INTERVAL"""
+    while True:
+        try:
+            removed = await collect_upload_sessions()
+            if removed:
+                logger.info(f"Removed {removed} abandoned upload(s)")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Upload session cleanup failed: {e}")
+        await asyncio.sleep(UPLOAD_SESSION_GC_INTERVAL)
+
+def with_image_urls(doc: dict, collection_name: str) -> dict:
+    """Replace stored blob references with raw route URLs and dimensions.
+
+    image_url always points at the original; images holds one entry per variant
+    and falls back to the original for documents without derivatives.
+    """
+    base_url = f"/api/{IMAGE_COLLECTIONS[collection_name]}/{doc['photo_id']}/raw"
+    derivatives = doc.pop("derivatives", {})
+    doc.pop("metadata_pending", None)
+    doc["image_url"] = base_url
+    doc["images"] = {
+        "original": {"url": base_url, "width": doc.get("width"), "height": doc.get("height")}
+    }
+    for name in DERIVATIVE_SIZES:
+        derivative = derivatives.get(name)
+        if derivative:
+            doc["images"][name] = {
+                "url": f"{base_url}?variant={name}",
+                "width": derivative["width"],
+                "height": derivative["height"],
+            }
+        else:
+            doc["images"][name] = doc["images"]["original"]
+    return doc
+
+def parse_range_header(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single "bytes=" range into (start, length); None means the whole body"""
+    if not range_header or not range_header.startswith("bytes="):
+        return None
+    spec = range_header[len("bytes="):].strip()
+    if "," in spec:
+        # Multipart ranges are not worth supporting for images, send the full body
+        return None
+    first, _, last = spec.partition("-")
+    try:
+        if first == "":
+            suffix = int(last)
+            if suffix <= 0:
+                raise ValueError
+            start, end = max(size - suffix, 0), size - 1
+        else:
+            start = int(first)
+            end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    end = min(end, size - 1)
+    return start, end - start + 1
+
+async def serve_image(collection_name: str, photo_id: str, request: Request,
+                      variant: str = "original", download: bool = False) -> Response:
+    """Stream the stored bytes of an image document, supporting Range requests"""
+    if variant not in IMAGE_VARIANTS:
+        raise HTTPException(status_code=400, detail=f"variant must be one of {', '.join(IMAGE_VARIANTS)}")
+
+    doc = await db[collection_name].find_one(
+        {"photo_id": photo_id},
+        {"_id": 0, "blob_id": 1, "content_type": 1, "filename": 1, "image_data": 1, "derivatives": 1}
+    )
+
+    if not doc:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    derivative = doc.get("derivatives", {}).get(variant)
+    if derivative:
+        doc.update(blob_id=derivative["blob_id"], content_type=derivative["content_type"])
+
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "public, max-age=31536000, immutable",
+    }
+    if download:
+        filename = doc.get("filename", photo_id).replace('"', "")
+        headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+
+    # Documents written before the blob store existed still carry inline base64
+    if not doc.get("blob_id"):
+        if not doc.get("image_data"):
+            raise HTTPException(status_code=404, detail="Image not found")
+        data, content_type = decode_image_data(doc["image_data"])
+        return Response(content=data, media_type=content_type, headers=headers)
+
+    blob_id = doc["blob_id"]
+    etag = f'"{blob_id}"'
+    headers["ETag"] = etag
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    try:
+        size = await blob_store.size(blob_id)
+    except BlobNotFound:
+        raise HTTPException(status_code=404, detail="Image data missing")
+
+    content_type = doc.get("content_type") or "application/octet-stream"
+    byte_range = parse_range_header(request.headers.get("range"), size)
+    if byte_range is None:
+        return BlobRangeResponse(blob_id, 0, size, headers=headers, media_type=content_type)
+
+    start, length = byte_range
+    headers["Content-Range"] = f"bytes {start}-{start + length - 1}/{size}"
+    return BlobRangeResponse(blob_id, start, length, status_code=206, headers=headers, media_type=content_type)
+
+class ZipStreamSink:
+    """Write-only file for zipfile that holds what was written until the response sends it"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def archive_name(doc: dict, taken: set) -> str:
+    """A file name for a photo inside a ZIP archive, unique within it"""
+    name = re.sub(r'[\\/:*?"<>|\x00-\x1f]', "_", doc.get("filename") or "").strip(" .") or doc["photo_id"]
+    stem, dot, suffix = name.rpartition(".")
+    if not dot:
+        stem, suffix = name, ""
+    candidate, copy = name, 1
+    while candidate.lower() in taken:
+        copy += 1
+        candidate = f"{stem} ({copy}).{suffix}" if dot else f"{stem} ({copy})"
+    taken.add(candidate.lower())
+    return candidate
+
+async def stream_photo_archive(query: dict) -> AsyncIterator[bytes]:
+    """ZIP of the originals of the photos matching query, oldest first, built while it is sent
+
+    Entries use the STORE method since the images are already compressed.
+    Photos are read ARCHIVE_PAGE_SIZE at a time and each original is copied
+    one blob chunk at a time, so memory stays flat however large the gallery
+    is; only the central directory grows, by about a hundred bytes a photo.
+    Photos whose stored bytes have gone missing are left out.
+    """
+    sink = ZipStreamSink()
+    taken = set()
+    key = None
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_STORED) as archive:
+        while True:
+            page_query = query if key is None else {"$and": [query, keyset_after("created_at", key)]}
+            docs = await db.photos.find(
+                page_query,
+                {"_id": 0, "photo_id": 1, "filename": 1, "blob_id": 1, "created_at": 1}
+            ).sort([("created_at", 1), ("photo_id", 1)]).limit(ARCHIVE_PAGE_SIZE).to_list(ARCHIVE_PAGE_SIZE)
+            
+            for doc in docs:
+                info = zipfile.ZipInfo(archive_name(doc, taken), date_time=doc["created_at"].timetuple()[:6])
+                info.compress_type = zipfile.ZIP_STORED
+                if not doc.get("blob_id"):
+                    # Documents written before the blob store existed still carry inline base64
+                    legacy = await db.photos.find_one({"photo_id": doc["photo_id"]}, {"_id": 0, "image_data": 1})
+                    if not (legacy or {}).get("image_data"):
+                        continue
+                    archive.writestr(info, decode_image_data(legacy["image_data"])[0])
+                    yield sink.drain()
+                    continue
+                try:
+                    info.file_size = await blob_store.size(doc["blob_id"])
+                except BlobNotFound:
+                    logger.warning(f"Leaving photo {doc['photo_id']} out of an archive: blob {doc['blob_id']} is missing")
+                    continue
+                with archive.open(info, "w") as entry:
+                    async for chunk in blob_store.stream(doc["blob_id"]):
+                        entry.write(chunk)
+                        yield sink.drain()
+            
+            if len(docs) < ARCHIVE_PAGE_SIZE:
+                break
+            key = (docs[-1]["created_at"], docs[-1]["photo_id"])
+    yield sink.drain()
+
+def _datetime_to_ms(value: datetime) -> int:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp() * 1000)
+
+def _ms_to_datetime(value: int) -> datetime:
+    return datetime(1970, 1, 1, tzinfo=timezone.utc) + timedelta(milliseconds=value)
+
+def _encode_token(state) -> str:
+    return base64.urlsafe_b64encode(json.dumps(state, separators=(",", ":")).encode()).decode().rstrip("=")
+
+def _decode_token(token: str):
+    return json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+
+def encode_gallery_cursor(added: Optional[Tuple[datetime, str]], deleted: Optional[Tuple[datetime, str]]) -> str:
+    """Encode the gallery position as an opaque, URL-safe cursor.
+
+    added/deleted are the (timestamp, photo_id) keys of the newest photo and
+    tombstone the client has seen.
+    """
+    state = {
+        "a": [_datetime_to_ms(added[0]), added[1]] if added else None,
+        "d": [_datetime_to_ms(deleted[0]), deleted[1]] if deleted else None,
+        "i": _datetime_to_ms(datetime.now(timezone.utc)),
+    }
+    return _encode_token(state)
+
+def decode_gallery_cursor(cursor: str) -> Optional[dict]:
+    """Decode a gallery cursor; None if it is malformed or older than the tombstone log"""
+    try:
+        state = _decode_token(cursor)
+        issued_at = _ms_to_datetime(state["i"])
+        added = (_ms_to_datetime(state["a"][0]), str(state["a"][1])) if state["a"] else None
+        deleted = (_ms_to_datetime(state["d"][0]), str(state["d"][1])) if state["d"] else None
+        # The changes feed looks back from these positions, so they must leave room before them
+        if any(key[0] < datetime(1970, 1, 1, tzinfo=timezone.utc) for key in (added, deleted) if key):
+            return None
+    except (ValueError, TypeError, KeyError, IndexError, OverflowError):
+        return None
+    if datetime.now(timezone.utc) - issued_at > GALLERY_TOMBSTONE_RETENTION:
+        return None
+    return {"added": added, "deleted": deleted}
+
+def keyset_after(field: str, key: Tuple[datetime, str]) -> dict:
+    """Filter for documents sorted after key on (field, photo_id)"""
+    return {"$or": [
+        {field: {"$gt": key[0]}},
+        {field: key[0], "photo_id": {"$gt": key[1]}},
+    ]}
+
+def keyset_before(field: str, key: Tuple[datetime, str]) -> dict:
+    """Filter for documents sorted before key on (field, photo_id)"""
+    return {"$or": [
+        {field: {"$lt": key[0]}},
+        {field: key[0], "photo_id": {"$lt": key[1]}},
+    ]}
+
+def decode_page_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        created_at_ms, photo_id = _decode_token(cursor)
+        return _ms_to_datetime(created_at_ms), str(photo_id)
+    except (ValueError, TypeError, OverflowError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+async def paginate_images(collection_name: str, query: dict, cursor: Optional[str], limit: int) -> dict:
+    """One newest-first page of image documents, keyset-paginated on (created_at, photo_id)
+
+    next_cursor is None on the last page.
+    """
+    if cursor:
+        query = {"$and": [query, keyset_before("created_at", decode_page_cursor(cursor))]}
+    
+    # One extra document tells whether another page follows
+    docs = await db[collection_name].find(
+        query,
+        {"_id": 0, "image_data": 0}
+    ).sort([("created_at", -1), ("photo_id", -1)]).limit(limit + 1).to_list(limit + 1)
+    
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = _encode_token([_datetime_to_ms(docs[-1]["created_at"]), docs[-1]["photo_id"]])
+    
+    return {
+        "items": [with_image_urls(doc, collection_name) for doc in docs],
+        "next_cursor": next_cursor
+    }
+
+async def gallery_watermark_keys() -> Tuple[Optional[Tuple[datetime, str]], Optional[Tuple[datetime, str]]]:
+    """Keyset positions of the newest photo and the newest tombstone"""
+    latest_photo = await db.photos.find_one(
+        {}, {"_id": 0, "created_at": 1, "photo_id": 1},
+        sort=[("created_at", -1), ("photo_id", -1)]
+    )
+    latest_tombstone = await db.photo_tombstones.find_one(
+        {}, {"_id": 0, "deleted_at": 1, "photo_id": 1},
+        sort=[("deleted_at", -1), ("photo_id", -1)]
+    )
+    return (
+        (latest_photo["created_at"], latest_photo["photo_id"]) if latest_photo else None,
+        (latest_tombstone["deleted_at"], latest_tombstone["photo_id"]) if latest_tombstone else None,
+    )
+
+async def gallery_watermark() -> str:
+    """Cursor pointing at the newest photo and the newest tombstone"""
+    return encode_gallery_cursor(*await gallery_watermark_keys())
+
+async def gallery_feed_page(collection_name: str, field: str, key, event_id: Optional[str], projection: dict):
+    """One oldest-first page of an event's documents after key on (field, photo_id)
+
+    Documents in the GALLERY_CHANGES_OVERLAP window behind key are sent again in
+    front of the page, so ones whose insert committed late are not skipped;
+    clients apply changes by photo_id, which makes the repeats harmless.
+    Returns (docs, key of the last new document, has_more).
+    """
+    collection = db[collection_name]
+    sort = [(field, 1), ("photo_id", 1)]
+    query = {"event_id": event_id}
+    late = []
+    if key is not None:
+        late = await collection.find(
+            {**query, field: {"$gte": key[0] - GALLERY_CHANGES_OVERLAP, "$lte": key[0]}}, projection
+        ).sort(sort).to_list(GALLERY_CHANGES_LIMIT)
+        query.update(keyset_after(field, key))
+    
+    docs = await collection.find(query, projection).sort(sort).to_list(GALLERY_CHANGES_LIMIT)
+    if docs:
+        key = (docs[-1][field], docs[-1]["photo_id"])
+    seen = {doc["photo_id"] for doc in docs}
+    return [doc for doc in late if doc["photo_id"] not in seen] + docs, key, len(docs) == GALLERY_CHANGES_LIMIT
+
+async def gallery_changes(position: dict, event_id: Optional[str]) -> dict:
+    """Photos added to and tombstones written for an event after a decoded gallery cursor
+    
+    Cursors are positions in the whole gallery, so one cursor serves every event.
+    """
+    added, added_key, more_added = await gallery_feed_page(
+        "photos", "created_at", position["added"], event_id, {"_id": 0, "image_data": 0}
+    )
+    tombstones, deleted_key, more_deleted = await gallery_feed_page(
+        "photo_tombstones", "deleted_at", position["deleted"], event_id, {"_id": 0}
+    )
+    
+    return {
+        "added": [with_image_urls(photo, "photos") for photo in added],
+        "deleted": [tombstone["photo_id"] for tombstone in tombstones],
+        "cursor": encode_gallery_cursor(added_key, deleted_key),
+        "has_more": more_added or more_deleted,
+        "reset": False
+    }
+
+class GalleryEventBus:
+    """In-process fan-out of live gallery events to stream subscribers.
+
+    Each subscriber gets a bounded queue. A subscriber that falls behind is
+    disconnected instead of buffering without limit; it reconnects with its
+    Last-Event-ID and catches up from the changes feed. Event ids are gallery
+    cursors, so they stay meaningful across reconnects and workers.
+    """
+
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self.subscribers = set()
+        self.added_key = None
+        self.deleted_key = None
+        self._watermark_loaded = False
+
+    async def load_watermark(self) -> None:
+        if not self._watermark_loaded:
+            added_key, deleted_key = await gallery_watermark_keys()
+            self._advance(added_key, deleted_key)
+            self._watermark_loaded = True
+
+    @staticmethod
+    def _is_newer(key, current) -> bool:
+        if key is None:
+            return False
+        return current is None or (_datetime_to_ms(key[0]), key[1]) > (_datetime_to_ms(current[0]), current[1])
+
+    def _advance(self, added_key, deleted_key) -> None:
+        if self._is_newer(added_key, self.added_key):
+            self.added_key = added_key
+        if self._is_newer(deleted_key, self.deleted_key):
+            self.deleted_key = deleted_key
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self.subscribers.discard(queue)
+
+    def publish(self, event: str, data: dict, event_id: Optional[str], added_key=None, deleted_key=None) -> None:
+        """Queue an event for every subscriber; streams drop those of other wedding events"""
+        self._advance(added_key, deleted_key)
+        message = (
+            encode_gallery_cursor(self.added_key, self.deleted_key),
+            event,
+            json.dumps(jsonable_encoder(data)),
+            event_id
+        )
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # Drop the backlog and tell the stream to close
+                self.subscribers.discard(queue)
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+
+gallery_events = GalleryEventBus(GALLERY_STREAM_QUEUE_SIZE)
+
+def publish_photo_added(photo_doc: dict) -> None:
+    """Announce a new guest gallery photo, unless the change stream does it for every worker"""
+    if GALLERY_CHANGE_STREAM:
+        return
+    photo = {k: v for k, v in photo_doc.items() if k not in ("_id", "image_data")}
+    gallery_events.publish(
+        "photo_added",
+        with_image_urls(photo, "photos"),
+        photo.get("event_id"),
+        added_key=(photo["created_at"], photo["photo_id"])
+    )
+
+def publish_photo_deleted(photo_id: str, event_id: Optional[str], deleted_at: datetime) -> None:
+    """Announce a removed guest gallery photo, unless the change stream does it for every worker"""
+    if GALLERY_CHANGE_STREAM:
+        return
+    gallery_events.publish(
+        "photo_deleted", {"photo_id": photo_id}, event_id, deleted_key=(deleted_at, photo_id)
+    )
+
+async def watch_gallery_changes() -> None:
+    """Feed the event bus from a MongoDB change stream so every worker sees every upload"""
+    pipeline = [{"$match": {
+        "operationType": "insert",
+        "ns.coll": {"$in": ["photos", "photo_tombstones"]},
+    }}]
+    resume_token = None
+    while True:
+        try:
+            async with db.watch(pipeline, resume_after=resume_token) as stream:
+                async for change in stream:
+                    resume_token = stream.resume_token
+                    doc = change["fullDocument"]
+                    if change["ns"]["coll"] == "photos":
+                        doc = {k: v for k, v in doc.items() if k not in ("_id", "image_data")}
+                        gallery_events.publish(
+                            "photo_added",
+                            with_image_urls(doc, "photos"),
+                            doc.get("event_id"),
+                            added_key=(doc["created_at"], doc["photo_id"])
+                        )
+                    else:
+                        gallery_events.publish(
+                            "photo_deleted",
+                            {"photo_id": doc["photo_id"]},
+                            doc.get("event_id"),
+                            deleted_key=(doc["deleted_at"], doc["photo_id"])
+                        )
+        except asyncio.CancelledError:
+            raise
+        except PyMongoError as e:
+            logger.warning(f"Gallery change stream interrupted, retrying: {e}")
+            await asyncio.sleep(5)
+
+def format_sse(data: str, event: Optional[str] = None, event_id: Optional[str] = None) -> str:
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event is not None:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {data}")
+    return "\n".join(lines) + "\n\n"
+
+class CollectionVersions:
+    """Per-collection change counters backing the ETags of public endpoints.
+
+    Writers bump the counter in MongoDB; readers trust their in-process copy for
+    COLLECTION_VERSION_TTL seconds, so conditional requests inside that window
+    are answered without a database round trip and other workers' writes are
+    picked up within it.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._cache = {}
+
+    async def get(self, name: str) -> Tuple[int, Optional[datetime]]:
+        cached = self._cache.get(name)
+        if cached and time.monotonic() - cached[2] < self.ttl:
+            return cached[0], cached[1]
+        doc = await db.collection_versions.find_one({"_id": name})
+        return self._remember(name, doc)
+
+    async def bump(self, name: str) -> int:
+        doc = await db.collection_versions.find_one_and_update(
+            {"_id": name},
+            {"$inc": {"version": 1}, "$set": {"updated_at": datetime.now(timezone.utc)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return self._remember(name, doc)[0]
+
+    def _remember(self, name: str, doc: Optional[dict]) -> Tuple[int, Optional[datetime]]:
+        version = doc["version"] if doc else 0
+        updated_at = doc["updated_at"] if doc else None
+        if updated_at is not None and updated_at.tzinfo is None:
+            updated_at = updated_at.replace(tzinfo=timezone.utc)
+        self._cache[name] = (version, updated_at, time.monotonic())
+        return version, updated_at
+
+collection_versions = CollectionVersions(COLLECTION_VERSION_TTL)
+
+DEFAULT_SETTINGS = {
+    "photography_name": "Wedding Clickz Photography",
+    "email": "info@weddingclickz.com",
+    "instagram_link": "https://instagram.com/weddingclickz",
+    "youtube_link": "https://youtube.com/@weddingclickz",
+    "whatsapp_number": "1234567890",
+    "location_link": "https://maps.google.com/?q=Bangalore",
+    "bride_name": "",
+    "groom_name": ""
+}
+
+class SettingsCache:
+    """Read-through cache of the site settings document.
+
+    The cached copy is tagged with the "settings" collection version and
+    reloaded once collection_versions reports a newer one, so a write on any
+    worker is picked up within COLLECTION_VERSION_TTL. Writers replace the
+    cached copy with the document they just stored.
+    """
+
+    def __init__(self):
+        self._entry: Tuple[int, Optional[dict]] = (-1, None)
+
+    async def get(self) -> dict:
+        version, _ = await collection_versions.get("settings")
+        cached_version, settings = self._entry
+        if settings is None or cached_version < version:
+            settings = await db.settings.find_one({}, {"_id": 0}) or DEFAULT_SETTINGS
+            self._store(version, settings)
+        return settings
+
+    async def update(self, changes: dict) -> dict:
+        settings = await db.settings.find_one_and_update(
+            {},
+            {"$set": changes},
+            projection={"_id": 0},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        self._store(await collection_versions.bump("settings"), settings)
+        return settings
+
+    def _store(self, version: int, settings: dict) -> None:
+        if version >= self._entry[0]:
+            self._entry = (version, settings)
+
+settings_cache = SettingsCache()
+
+class EventDirectory:
+    """In-process copy of the events collection.
+
+    There are only ever a handful of events, so the whole collection is
+    loaded at once and tagged with the "events" collection version, like
+    SettingsCache; writers bump the version after changing an event.
+    """
+
+    def __init__(self):
+        self._entry: Tuple[int, Optional[dict]] = (-1, None)
+
+    async def all(self) -> dict:
+        version, _ = await collection_versions.get("events")
+        cached_version, events = self._entry
+        if events is None or cached_version < version:
+            events = {
+                event["event_id"]: event
+                async for event in db.events.find({}, {"_id": 0}).sort("created_at", DESCENDING)
+            }
+            if version >= self._entry[0]:
+                self._entry = (version, events)
+        return events
+
+    async def get(self, event_id: str) -> Optional[dict]:
+        return (await self.all()).get(event_id)
+
+event_directory = EventDirectory()
+
+async def resolve_public_event(event_id: Optional[str]) -> Optional[str]:
+    """The event a public gallery request is scoped to: ?event_id= if given, else the current event"""
+    if event_id is None:
+        return (await settings_cache.get()).get("current_event_id")
+    event = await event_directory.get(event_id)
+    if event is None or event["archived"]:
+        raise HTTPException(status_code=404, detail="Event not found")
+    return event_id
+
+async def resolve_upload_event(event_id: Optional[str]) -> str:
+    """The event new photos go into: ?event_id= if given, else the current event"""
+    if event_id is None:
+        event_id = (await settings_cache.get()).get("current_event_id")
+        if event_id is None:
+            raise HTTPException(status_code=400, detail="No current event; create one in settings first")
+    event = await event_directory.get(event_id)
+    if event is None:
+        raise HTTPException(status_code=404, detail="Event not found")
+    if event["archived"]:
+        raise HTTPException(status_code=400, detail="Event is archived")
+    return event_id
+
+async def check_not_modified(
+    request: Request,
+    response: Response,
+    collection_name: Union[str, Tuple[str, ...]],
+    cache_control: str = "no-cache"
+) -> Optional[Response]:
+    """Attach ETag/Last-Modified for a response built from one or more collections.
+
+    Returns a 304 response when the client's copy is still current, otherwise
+    sets the validators on response and returns None. The ETag is weak: the
+    same content goes out identity, gzip or br encoded.
+    """
+    names = (collection_name,) if isinstance(collection_name, str) else collection_name
+    stamps = [await collection_versions.get(name) for name in names]
+    version = ".".join(str(stamp[0]) for stamp in stamps)
+    updated_at = max((stamp[1] for stamp in stamps if stamp[1]), default=None)
+    query = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+    stamp = _datetime_to_ms(updated_at) if updated_at else 0
+    tag = f'"{"+".join(names)}-{version}.{stamp}-{hashlib.sha1(query.encode()).hexdigest()[:12]}"'
+    etag = f"W/{tag}"
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if updated_at:
+        headers["Last-Modified"] = format_datetime(updated_at, usegmt=True)
+    
+    if_none_match = request.headers.get("if-none-match")
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_none_match:
+        candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        not_modified = tag in candidates or "*" in candidates
+    elif if_modified_since and updated_at:
+        try:
+            not_modified = updated_at.replace(microsecond=0) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            not_modified = False
+    else:
+        not_modified = False
+    
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
+
+class SessionCache:
+    """Bounded TTL cache of resolved sessions, keyed by the SHA-256 of the token"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> Optional[Tuple[dict, datetime]]:
+        entry = self._entries.get(self._key(token))
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def put(self, token: str, user: dict, expires_at: datetime) -> None:
+        self._entries[self._key(token)] = (user, expires_at)
+
+    def invalidate_user(self, user_id: str) -> None:
+        for key, (user, _) in list(self._entries.items()):
+            if user["user_id"] == user_id:
+                self._entries.pop(key, None)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "max_size": self._entries.maxsize,
+            "ttl_seconds": self._entries.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+session_cache = SessionCache(SESSION_CACHE_SIZE, SESSION_CACHE_TTL)
+
+class RateLimiter:
+    """Token buckets keyed by (client address, route), kept in a bounded LRU.
+
+    A bucket holds up to burst tokens and refills at rate tokens a second. An
+    evicted bucket comes back full, which only ever lets a request through.
+    """
+
+    def __init__(self, maxsize: int):
+        self._buckets = LRUCache(maxsize=maxsize)
+        self.limited = 0
+
+    def acquire(self, key: Tuple[str, str], rate: float, burst: int) -> float:
+        """Take a token; returns 0, or how many seconds until one is available"""
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        if tokens < 1:
+            self._buckets[key] = (tokens, now)
+            self.limited += 1
+            return (1 - tokens) / rate
+        self._buckets[key] = (tokens - 1, now)
+        return 0.0
+
+    def stats(self) -> dict:
+        return {"buckets": len(self._buckets), "max_buckets": self._buckets.maxsize, "limited": self.limited}
+
+rate_limiter = RateLimiter(RATE_LIMIT_BUCKETS)
+
+class PublicReadGate:
+    """Admission control for MongoDB-backed public reads on this worker.
+
+    At most `limit` run at once; the others queue for up to `timeout` seconds
+    and are then shed with 429. Authenticated routes never pass through here,
+    so however many guests pile in, uploads keep the rest of the pool.
+    """
+
+    def __init__(self, limit: int, timeout: float):
+        self.limit = limit
+        self.timeout = timeout
+        self._slots = asyncio.Semaphore(limit)
+        self.in_flight = 0
+        self.queued = 0
+        self.shed = 0
+
+    @asynccontextmanager
+    async def slot(self, route: str):
+        await self.acquire(route)
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def acquire(self, route: str) -> None:
+        self.queued += 1
+        PUBLIC_READS_QUEUED.inc()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self.shed += 1
+            REQUESTS_SHED.labels(route, "overloaded").inc()
+            raise HTTPException(
+                status_code=429,
+                detail="Server busy, try again shortly",
+                headers={"Retry-After": str(max(1, math.ceil(self.timeout)))}
+            )
+        finally:
+            self.queued -= 1
+            PUBLIC_READS_QUEUED.dec()
+        
+        self.in_flight += 1
+        PUBLIC_READS_IN_FLIGHT.inc()
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        PUBLIC_READS_IN_FLIGHT.dec()
+        self._slots.release()
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "shed": self.shed,
+        }
+
+public_read_gate = PublicReadGate(PUBLIC_READ_CONCURRENCY, PUBLIC_READ_QUEUE_TIMEOUT)
+
+class PublicReadGateMiddleware:
+    """Gives back the public_read_gate slot of a gated request once its response is sent.
+
+    Dependencies with yield exit before a streamed body is produced, so a slot
+    released there would leave the reads of blob streams and archives outside
+    the gate; public_read_limit marks the scope and the slot is released here.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if scope.pop("public_read_slot", False):
+                public_read_gate.release()
+
+def public_read_limit(rate: Optional[float] = PUBLIC_RATE_LIMIT, burst: int = PUBLIC_RATE_BURST, gated: bool = True):
+    """Route dependency rate limiting a public endpoint per client address
+    
+    rate=None skips the token bucket; gated routes also wait for a
+    public_read_gate slot, held until the response body has been sent (see
+    PublicReadGateMiddleware). Both answer 429 with Retry-After.
+    """
+    async def admit(request: Request):
+        route = request.scope["route"].path
+        if rate is not None:
+            client_host = request.client.host if request.client else "unknown"
+            retry_after = rate_limiter.acquire((client_host, route), rate, burst)
+            if retry_after:
+                REQUESTS_SHED.labels(route, "rate_limit").inc()
+                raise HTTPException(
+                    status_code=429,
+                    detail="Too many requests",
+                    headers={"Retry-After": str(math.ceil(retry_after))}
+                )
+        if gated:
+            await public_read_gate.acquire(route)
+            request.scope["public_read_slot"] = True
+    
+    return admit
+
+def json_response(content, response: Optional[Response] = None) -> ORJSONResponse:
+    """Serialize a listing straight to JSON with orjson.
+
+    Returning the response skips FastAPI's jsonable_encoder pass, which
+    dominates the cost of large pages; orjson handles the datetimes itself.
+    Headers already set on the injected response are carried over.
+    """
+    headers = {k: v for k, v in response.headers.items() if k != "content-length"} if response else None
+    return ORJSONResponse(content, headers=headers)
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick br or gzip from an Accept-Encoding header, preferring br"""
+    accepted = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for encoding in ("br", "gzip"):
+        if accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return None
+
+def compress_body(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6)
+
+class CompressionMiddleware:
+    """Negotiated brotli/gzip compression of JSON and text responses.
+
+    Bodies under COMPRESSION_MIN_SIZE, event streams, images and responses
+    that are already encoded pass through untouched. Compressed bodies of
+    responses carrying an ETag are cached by (path, ETag, encoding): the ETag
+    changes with the collection version, so an unchanged listing is
+    compressed once per worker. A strong ETag on a compressed body is made
+    weak, since it no longer names the exact bytes sent.
+    """
+
+    def __init__(self, app, minimum_size: int, cache_size: int):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.cache = LRUCache(maxsize=cache_size)
+
+    @staticmethod
+    def _compressible(message: dict) -> bool:
+        headers = Headers(raw=message["headers"])
+        content_type = headers.get("content-type", "")
+        return (
+            message["status"] == 200
+            and "content-encoding" not in headers
+            and (content_type.startswith("application/json") or content_type.startswith("text/"))
+            and not content_type.startswith("text/event-stream")
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            async def send_identity(message):
+                if message["type"] == "http.response.start" and self._compressible(message):
+                    self._add_vary(MutableHeaders(raw=message["headers"]))
+                await send(message)
+            
+            await self.app(scope, receive, send_identity)
+            return
+        
+        start = None
+        chunks = []
+        passthrough = False
+        
+        async def send_compressed(message):
+            nonlocal start, passthrough
+            if passthrough:
+                await send(message)
+            elif message["type"] == "http.response.start":
+                if self._compressible(message):
+                    start = message
+                else:
+                    passthrough = True
+                    await send(message)
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+                if not message.get("more_body", False):
+                    await self._send_body(scope, start, b"".join(chunks), encoding, send)
+            else:
+                await send(message)
+        
+        await self.app(scope, receive, send_compressed)
+
+    @staticmethod
+    def _add_vary(headers: MutableHeaders) -> None:
+        if "accept-encoding" not in headers.get("vary", "").lower():
+            headers.add_vary_header("Accept-Encoding")
+
+    async def _send_body(self, scope, start: dict, body: bytes, encoding: str, send) -> None:
+        headers = MutableHeaders(raw=start["headers"])
+        self._add_vary(headers)
+        if len(body) >= self.minimum_size:
+            etag = headers.get("etag")
+            key = (scope["path"], etag, encoding) if etag else None
+            compressed = self.cache.get(key) if key else None
+            if compressed is None:
+                if len(body) > 64 * 1024:
+                    compressed = await asyncio.to_thread(compress_body, body, encoding)
+                else:
+                    compressed = compress_body(body, encoding)
+                if key:
+                    self.cache[key] = compressed
+            body = compressed
+            if etag and not etag.startswith("W/"):
+                headers["ETag"] = f"W/{etag}"
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(body))
+        await send(start)
+        await send({"type": "http.response.body", "body": body})
+
+class PrerenderedJSON:
+    """JSON response bodies rendered once and served as raw bytes.
+
+    Each entry is encoded with orjson and compressed with brotli and gzip,
+    and tagged with the versions of the collections listed in collections,
+    read before rendering. A request finding any of them moved rebuilds the
+    entry; concurrent requests for a stale entry wait for that single
+    rebuild. Subclasses implement render(key) -> (extra, content), where
+    extra is handed back alongside the bodies.
+    """
+
+    collections: Tuple[str, ...] = ()
+
+    def __init__(self, maxsize: int):
+        # key -> (versions, extra, {encoding or None: body})
+        self._entries = LRUCache(maxsize=maxsize)
+        self._builds = {}
+
+    async def get(self, key) -> Tuple[object, dict]:
+        versions = tuple([(await collection_versions.get(name))[0] for name in self.collections])
+        while True:
+            entry = self._entries.get(key)
+            if entry is not None and all(have >= want for have, want in zip(entry[0], versions)):
+                return entry[1], entry[2]
+            build = self._builds.get(key)
+            if build is None or build.done():
+                build = asyncio.ensure_future(self._build(key, versions))
+                self._builds[key] = build
+            # A rebuild started for older versions loops round for another
+            await asyncio.shield(build)
+
+    async def _build(self, key, versions: Tuple[int, ...]) -> None:
+        extra, content = await self.render(key)
+        body = orjson.dumps(content)
+        bodies = {None: body}
+        if len(body) >= COMPRESSION_MIN_SIZE:
+            for encoding in ("br", "gzip"):
+                bodies[encoding] = await asyncio.to_thread(compress_body, body, encoding)
+        # Versions only grow within a worker, so entries are always comparable
+        entry = self._entries.get(key)
+        if entry is None or all(have <= new for have, new in zip(entry[0], versions)):
+            self._entries[key] = (versions, extra, bodies)
+
+    async def render(self, key) -> Tuple[object, object]:
+        raise NotImplementedError
+
+def prerendered_response(request: Request, response: Response, bodies: dict, headers: dict = None) -> Response:
+    """Send the body from PrerenderedJSON.get() matching the request's Accept-Encoding"""
+    encoding = negotiate_encoding(request.headers.get("accept-encoding", ""))
+    if encoding not in bodies:
+        encoding = None
+    headers = {**{k: v for k, v in response.headers.items() if k != "content-length"}, **(headers or {})}
+    headers["Vary"] = "Accept-Encoding"
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(bodies[encoding], media_type="application/json", headers=headers)
+
+class GuestGallerySnapshot(PrerenderedJSON):
+    """Pre-rendered first page of an event's public photo gallery.
+
+    Every guest opening the gallery gets the same newest-first page of
+    PAGE_SIZE_DEFAULT photos, so it is queried and encoded once per "photos"
+    collection version; uploads and deletes bump the version. Keyed by
+    event_id, for up to GUEST_SNAPSHOT_EVENTS events. The extra is the
+    gallery watermark keys: cursors expire, so each response encodes its own.
+    """
+
+    collections = ("photos",)
+
+    async def render(self, event_id: Optional[str]) -> Tuple[tuple, dict]:
+        # Taken before the query so nothing added meanwhile is missed by the changes feed
+        keys = await gallery_watermark_keys()
+        return keys, await paginate_images("photos", {"event_id": event_id}, None, PAGE_SIZE_DEFAULT)
+
+guest_gallery_snapshot = GuestGallerySnapshot(GUEST_SNAPSHOT_EVENTS)
+
+class SiteBootstrap(PrerenderedJSON):
+    """Pre-rendered GET /api/site payload: everything the guest page shows first.
+
+    Settings, the first pages of background images and wall photos and the
+    guest gallery snapshot of an event (the key) are gathered concurrently
+    and rebuilt when any of their collections changes. The extra is the
+    snapshot's gallery watermark keys.
+    """
+
+    collections = ("settings", "background_images", "wall_photos", "photos")
+
+    async def render(self, event_id: Optional[str]) -> Tuple[tuple, dict]:
+        settings, background_images, wall_photos, (keys, gallery) = await asyncio.gather(
+            settings_cache.get(),
+            paginate_images("background_images", {}, None, PAGE_SIZE_DEFAULT),
+            paginate_images("wall_photos", {}, None, PAGE_SIZE_DEFAULT),
+            guest_gallery_snapshot.get(event_id),
+        )
+        return keys, {
+            "settings": settings,
+            "background_images": background_images,
+            "wall_photos": wall_photos,
+            # Already encoded by the snapshot; embedded as is
+            "gallery": orjson.Fragment(gallery[None]),
+        }
+
+site_bootstrap = SiteBootstrap(GUEST_SNAPSHOT_EVENTS)
+
+class AuthProviderClient:
+    """Shared keep-alive client for the OAuth session-data exchange.
+
+    The underlying httpx.AsyncClient is created on first use and closed on
+    shutdown. Its connection pool bounds concurrent provider calls. Successful
+    lookups are cached per session id for AUTH_SESSION_DATA_TTL, and concurrent
+    lookups of the same id share one request, so a retried login does not hit
+    the provider twice. A transport, if given, replaces the network
+    (httpx.MockTransport in tests).
+    """
+
+    def __init__(self, url: str, ttl: float, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.url = url
+        self.transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._session_data = TTLCache(maxsize=1024, ttl=ttl)
+        self._in_flight = {}
+
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(AUTH_READ_TIMEOUT, connect=AUTH_CONNECT_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=AUTH_MAX_CONNECTIONS,
+                    max_keepalive_connections=AUTH_MAX_CONNECTIONS
+                ),
+                transport=self.transport
+            )
+        return self._client
+
+    async def session_data(self, session_id: str) -> dict:
+        """Resolve an OAuth session id; raises 401 if the provider rejects it"""
+        data = self._session_data.get(session_id)
+        if data is not None:
+            return data
+        
+        in_flight = self._in_flight.get(session_id)
+        if in_flight is None:
+            in_flight = asyncio.ensure_future(self._fetch(session_id))
+            self._in_flight[session_id] = in_flight
+            in_flight.add_done_callback(lambda _: self._in_flight.pop(session_id, None))
+        return await asyncio.shield(in_flight)
+
+    async def _fetch(self, session_id: str) -> dict:
+        try:
+            response = await self.client().get(self.url, headers={"X-Session-ID": session_id})
+        except httpx.RequestError as e:
+            raise HTTPException(status_code=500, detail=f"Failed to verify session: {str(e)}")
+        
+        if response.status_code != 200:
+            raise HTTPException(status_code=401, detail="Invalid session_id")
+        
+        data = response.json()
+        self._session_data[session_id] = data
+        return data
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
 
-app = FastAPI()
-api_router = APIRouter(prefix="/api")
-security = HTTPBearer()
+auth_provider = AuthProviderClient(AUTH_SESSION_DATA_URL, AUTH_SESSION_DATA_TTL)
+
+def _newest_first(*prefix) -> IndexModel:
+    return IndexModel([*prefix, ("created_at", DESCENDING), ("photo_id", DESCENDING)])
+
+def _image_collection_indexes(*extra: IndexModel) -> List[IndexModel]:
+    return [
+        IndexModel([("photo_id", ASCENDING)], unique=True),
+        _newest_first(),
+        # Only documents still waiting for image_metadata_worker carry the flag
+        IndexModel([("metadata_pending", ASCENDING)], sparse=True),
+        *extra,
+    ]
+
+# Every index the API relies on, created at startup
+INDEXES = {
+    "events": [
+        IndexModel([("event_id", ASCENDING)], unique=True),
+    ],
+    "users": [
+        IndexModel([("user_id", ASCENDING)], unique=True),
+        IndexModel([("email", ASCENDING)], unique=True),
+    ],
+    "user_sessions": [
+        IndexModel([("session_token", ASCENDING)], unique=True),
+        IndexModel([("user_id", ASCENDING)]),
+        # MongoDB purges sessions once expires_at has passed
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+    ],
+    "photos": _image_collection_indexes(
+        _newest_first(("photographer_id", ASCENDING)),
+        # Public gallery pages and the changes feed of one event
+        _newest_first(("event_id", ASCENDING)),
+    ),
+    "wall_photos": _image_collection_indexes(),
+    "background_images": _image_collection_indexes(),
+    "blobs": [
+        IndexModel([(f"image.derivatives.{name}.blob_id", ASCENDING)], sparse=True)
+        for name in DERIVATIVE_SIZES
+    ],
+    "upload_sessions": [
+        IndexModel([("upload_id", ASCENDING)], unique=True),
+        # Not a TTL index: run_upload_session_gc also has to remove the chunk files
+        IndexModel([("expires_at", ASCENDING)]),
+    ],
+    "photo_tombstones": [
+        IndexModel([("deleted_at", ASCENDING), ("photo_id", ASCENDING)]),
+        IndexModel([("event_id", ASCENDING), ("deleted_at", ASCENDING), ("photo_id", ASCENDING)]),
+        IndexModel(
+            [("deleted_at", ASCENDING)],
+            name="deleted_at_ttl",
+            expireAfterSeconds=int(GALLERY_TOMBSTONE_RETENTION.total_seconds())
+        ),
+    ],
+}
+
+async def ensure_indexes() -> None:
+    """Create the indexes in INDEXES, logging (not failing on) any that conflict with existing data"""
+    for collection_name, indexes in INDEXES.items():
+        for index in indexes:
+            try:
+                await db[collection_name].create_indexes([index])
+            except OperationFailure as e:
+                logger.warning(f"Could not create index {index.document['name']} on {collection_name}: {e}")
 
 class User(BaseModel):
     user_id: str
@@ -50,6 +2404,29 @@ class BackgroundImageUploadRequest(BaseModel):
     filename: str
     image_data: str
 
+class ExistingImageUploadRequest(BaseModel):
+    blob_id: str
+    filename: str
+    wedding_date: Optional[str] = None
+    photographer_notes: Optional[str] = None
+
+class UploadSessionRequest(BaseModel):
+    collection: str
+    filename: str
+    size: int = Field(..., gt=0)
+    content_type: Optional[str] = None
+    sha256: Optional[str] = None
+    wedding_date: Optional[str] = None
+    photographer_notes: Optional[str] = None
+
+class EventCreateRequest(BaseModel):
+    name: str = Field(..., min_length=1, max_length=200)
+    wedding_date: Optional[str] = None
+    make_current: bool = True
+
+class BulkDeleteRequest(BaseModel):
+    photo_ids: List[str] = Field(..., min_length=1, max_length=BULK_DELETE_MAX)
+
 class PhotoMetadata(BaseModel):
     photo_id: str
     filename: str
@@ -66,13 +2443,29 @@ async def get_current_user_from_header(authorization: Optional[str] = Header(Non
     
     token = authorization.replace("Bearer ", "")
     
-    session = await db.user_sessions.find_one(
-        {"session_token": token},
-        {"_id": 0}
-    )
+    cached = session_cache.get(token)
+    if cached:
+        user, expires_at = cached
+        if expires_at < datetime.now(timezone.utc):
+            raise HTTPException(status_code=401, detail="Session expired")
+        return dict(user)
     
-    if not session:
+    # Session and user in one round trip
+    sessions = await db.user_sessions.aggregate([
+        {"$match": {"session_token": token}},
+        {"$limit": 1},
+        {"$lookup": {
+            "from": "users",
+            "localField": "user_id",
+            "foreignField": "user_id",
+            "as": "user"
+        }},
+        {"$project": {"_id": 0, "expires_at": 1, "user": 1}}
+    ]).to_list(1)
+    
+    if not sessions:
         raise HTTPException(status_code=401, detail="Invalid session")
+    session = sessions[0]
     
     expires_at = session["expires_at"]
     if isinstance(expires_at, str):
@@ -83,62 +2476,170 @@ async def get_current_user_from_header(authorization: Optional[str] = Header(Non
     if expires_at < datetime.now(timezone.utc):
         raise HTTPException(status_code=401, detail="Session expired")
     
-    user = await db.users.find_one(
-        {"user_id": session["user_id"]},
-        {"_id": 0}
-    )
-    
-    if not user:
+    if not session["user"]:
         raise HTTPException(status_code=404, detail="User not found")
     
-    return user
+    user = session["user"][0]
+    user.pop("_id", None)
+    session_cache.put(token, user, expires_at)
+    
+    return dict(user)
 
-@api_router.get("/settings")
-async def get_settings():
+@api_router.get("/settings", dependencies=[Depends(public_read_limit(gated=False))])
+async def get_settings(request: Request, response: Response):
     """Get photographer settings (public endpoint)"""
-    settings = await db.settings.find_one({}, {"_id": 0})
-    
-    if not settings:
-        return {
-            "photography_name": "Wedding Clickz Photography",
-            "email": "info@weddingclickz.com",
-            "instagram_link": "https://instagram.com/weddingclickz",
-            "youtube_link": "https://youtube.com/@weddingclickz",
-            "whatsapp_number": "1234567890",
-            "location_link": "https://maps.google.com/?q=Bangalore",
-            "bride_name": "",
-            "groom_name": ""
-        }
+    not_modified = await check_not_modified(
+        request, response, "settings",
+        cache_control=f"public, max-age={SETTINGS_MAX_AGE}, stale-while-revalidate={SETTINGS_MAX_AGE * 12}"
+    )
+    if not_modified:
+        return not_modified
     
-    return settings
+    return await settings_cache.get()
 
 @api_router.post("/settings")
 async def update_settings(
     settings: dict,
     user: dict = Depends(get_current_user_from_header)
 ):
-    """Update photographer settings"""
-    await db.settings.update_one(
-        {},
-        {"$set": {
-            **settings,
+    """Update photographer settings
+    
+    current_event_id chooses the event the public gallery shows.
+    """
+    event_changed = False
+    if "current_event_id" in settings:
+        event_id = settings["current_event_id"]
+        if event_id is not None:
+            event = await event_directory.get(event_id)
+            if event is None or event["archived"]:
+                raise HTTPException(status_code=400, detail="Unknown or archived event")
+        event_changed = event_id != (await settings_cache.get()).get("current_event_id")
+    
+    stored = await settings_cache.update({
+        **settings,
+        "updated_at": datetime.now(timezone.utc),
+        "updated_by": user["user_id"]
+    })
+    if event_changed:
+        # The guest gallery's default scope moved, so its ETags and snapshots must too
+        await collection_versions.bump("photos")
+    
+    return {"message": "Settings updated successfully", "settings": stored}
+
+@api_router.get("/events")
+async def list_events(user: dict = Depends(get_current_user_from_header)):
+    """List wedding events, newest first, with the current one"""
+    settings = await settings_cache.get()
+    return {
+        "events": list((await event_directory.all()).values()),
+        "current_event_id": settings.get("current_event_id")
+    }
+
+@api_router.post("/events")
+async def create_event(
+    request: EventCreateRequest,
+    user: dict = Depends(get_current_user_from_header)
+):
+    """Create a wedding event, by default making it the one guests see"""
+    event = {
+        "event_id": str(uuid.uuid4()),
+        "name": request.name,
+        "wedding_date": request.wedding_date,
+        "archived": False,
+        "created_by": user["user_id"],
+        "created_at": datetime.now(timezone.utc)
+    }
+    await db.events.insert_one(event)
+    event.pop("_id", None)
+    await collection_versions.bump("events")
+    
+    if request.make_current:
+        await settings_cache.update({
+            "current_event_id": event["event_id"],
             "updated_at": datetime.now(timezone.utc),
             "updated_by": user["user_id"]
-        }},
-        upsert=True
+        })
+        await collection_versions.bump("photos")
+    
+    return {"message": "Event created successfully", "event": event}
+
+@api_router.post("/events/{event_id}/archive")
+async def archive_event(
+    event_id: str,
+    user: dict = Depends(get_current_user_from_header)
+):
+    """Archive a past event: its photos leave the public gallery but stay in the dashboard
+    
+    The current event cannot be archived, since uploads without ?event_id= go
+    there; another event has to be made current first.
+    """
+    if (await settings_cache.get()).get("current_event_id") == event_id:
+        raise HTTPException(status_code=409, detail="Make another event current before archiving this one")
+    result = await db.events.update_one(
+        {"event_id": event_id},
+        {"$set": {"archived": True, "archived_at": datetime.now(timezone.utc)}}
     )
+    if not result.matched_count:
+        raise HTTPException(status_code=404, detail="Event not found")
+    await collection_versions.bump("events")
+    await collection_versions.bump("photos")
     
-    return {"message": "Settings updated successfully"}
+    return {"message": "Event archived successfully"}
 
-@api_router.get("/wall-photos")
-async def get_wall_photos():
-    """Get wall/portfolio photos (public endpoint)"""
-    photos = await db.wall_photos.find(
-        {},
-        {"_id": 0}
-    ).sort("created_at", -1).to_list(100)
+@api_router.post("/events/{event_id}/restore")
+async def restore_event(
+    event_id: str,
+    user: dict = Depends(get_current_user_from_header)
+):
+    """Bring an archived event back to the public gallery"""
+    result = await db.events.update_one(
+        {"event_id": event_id},
+        {"$set": {"archived": False}, "$unset": {"archived_at": ""}}
+    )
+    if not result.matched_count:
+        raise HTTPException(status_code=404, detail="Event not found")
+    await collection_versions.bump("events")
+    await collection_versions.bump("photos")
+    
+    return {"message": "Event restored successfully"}
+
+@api_router.get("/site", dependencies=[Depends(public_read_limit())])
+async def get_site(request: Request, response: Response, event_id: Optional[str] = None):
+    """Everything the guest page needs to render, in one request (public endpoint)
+    
+    Returns settings and the first pages of background images, wall photos
+    and the guest gallery (of event_id, default the current event). The
+    gallery cursor for the changes feed comes in X-Gallery-Cursor, like on
+    /photos/guest, so the cached body never holds an expiring cursor.
+    """
+    event_id = await resolve_public_event(event_id)
+    not_modified = await check_not_modified(
+        request, response, ("settings", "background_images", "wall_photos", "photos")
+    )
+    keys, bodies = await site_bootstrap.get(event_id)
+    (not_modified or response).headers["X-Gallery-Cursor"] = encode_gallery_cursor(*keys)
+    if not_modified:
+        return not_modified
+    return prerendered_response(request, response, bodies)
+
+@api_router.get("/wall-photos", dependencies=[Depends(public_read_limit())])
+async def get_wall_photos(
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX)
+):
+    """Get wall/portfolio photos, newest first (public endpoint)"""
+    not_modified = await check_not_modified(request, response, "wall_photos")
+    if not_modified:
+        return not_modified
     
-    return photos
+    return json_response(await paginate_images("wall_photos", {}, cursor, limit), response)
+
+@api_router.get("/wall-photos/{photo_id}/raw", dependencies=[Depends(public_read_limit(rate=None))])
+async def get_wall_photo_raw(photo_id: str, request: Request, variant: str = "original", download: bool = False):
+    """Stream the image bytes of a wall photo (public endpoint)"""
+    return await serve_image("wall_photos", photo_id, request, variant, download)
 
 @api_router.post("/wall-photos/upload")
 async def upload_wall_photo(
@@ -146,23 +2647,54 @@ async def upload_wall_photo(
     user: dict = Depends(get_current_user_from_header)
 ):
     """Upload a photo to the wall/portfolio"""
+    image_fields = await store_image(request.image_data)
+    
     try:
-        photo_id = str(uuid.uuid4())
+        photo_doc = new_image_document(user, request.filename, image_fields)
+        await insert_image_documents("wall_photos", [photo_doc])
         
-        photo_doc = {
-            "photo_id": photo_id,
-            "filename": request.filename,
-            "image_data": request.image_data,
-            "photographer_id": user["user_id"],
-            "photographer_name": user["name"],
-            "upload_timestamp": datetime.now(timezone.utc).isoformat(),
-            "created_at": datetime.now(timezone.utc)
+        return {
+            "photo_id": photo_doc["photo_id"],
+            "message": "Wall photo uploaded successfully"
         }
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+
+@api_router.post("/wall-photos/upload-existing")
+async def upload_wall_photo_existing(
+    request: ExistingImageUploadRequest,
+    user: dict = Depends(get_current_user_from_header)
+):
+    """Add an already stored image by its SHA-256, without sending the bytes again"""
+    image_fields = await reuse_uploaded_image(request.blob_id)
+    
+    try:
+        photo_doc = new_image_document(user, request.filename, image_fields)
+        await insert_image_documents("wall_photos", [photo_doc])
         
-        await db.wall_photos.insert_one(photo_doc)
+        return {
+            "photo_id": photo_doc["photo_id"],
+            "message": "Wall photo uploaded successfully"
+        }
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+
+@api_router.post("/wall-photos/upload-file")
+async def upload_wall_photo_file(
+    request: Request,
+    user: dict = Depends(get_current_user_from_header)
+):
+    """Upload a photo to the wall/portfolio as multipart/form-data (file, filename)"""
+    fields, file_name, image_fields = await receive_image_upload(request)
+    
+    try:
+        photo_doc = new_image_document(user, fields.get("filename") or file_name or "upload", image_fields)
+        await insert_image_documents("wall_photos", [photo_doc])
         
         return {
-            "photo_id": photo_id,
+            "photo_id": photo_doc["photo_id"],
             "message": "Wall photo uploaded successfully"
         }
     
@@ -183,19 +2715,41 @@ async def delete_wall_photo(
     if photo["photographer_id"] != user["user_id"]:
         raise HTTPException(status_code=403, detail="Not authorized to delete this photo")
     
-    await db.wall_photos.delete_one({"photo_id": photo_id})
+    # A concurrent DELETE may have removed it since; only the one that did releases the blobs
+    photo = await delete_image_document("wall_photos", photo_id, user)
+    if not photo:
+        raise HTTPException(status_code=404, detail="Photo not found")
+    await collection_versions.bump("wall_photos")
+    await release_blobs(photo)
     
     return {"message": "Wall photo deleted successfully"}
 
-@api_router.get("/background-images")
-async def get_background_images():
-    """Get background slideshow images (public endpoint)"""
-    images = await db.background_images.find(
-        {},
-        {"_id": 0}
-    ).sort("created_at", -1).to_list(100)
+@api_router.post("/wall-photos/bulk-delete")
+async def bulk_delete_wall_photos(
+    request: BulkDeleteRequest,
+    user: dict = Depends(get_current_user_from_header)
+):
+    """Delete several of your wall photos at once"""
+    return await delete_image_documents("wall_photos", request.photo_ids, user)
+
+@api_router.get("/background-images", dependencies=[Depends(public_read_limit())])
+async def get_background_images(
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX)
+):
+    """Get background slideshow images, newest first (public endpoint)"""
+    not_modified = await check_not_modified(request, response, "background_images")
+    if not_modified:
+        return not_modified
     
-    return images
+    return json_response(await paginate_images("background_images", {}, cursor, limit), response)
+
+@api_router.get("/background-images/{photo_id}/raw", dependencies=[Depends(public_read_limit(rate=None))])
+async def get_background_image_raw(photo_id: str, request: Request, variant: str = "original", download: bool = False):
+    """Stream the image bytes of a background image (public endpoint)"""
+    return await serve_image("background_images", photo_id, request, variant, download)
 
 @api_router.post("/background-images/upload")
 async def upload_background_image(
@@ -203,23 +2757,54 @@ async def upload_background_image(
     user: dict = Depends(get_current_user_from_header)
 ):
     """Upload a background slideshow image"""
+    image_fields = await store_image(request.image_data)
+    
     try:
-        photo_id = str(uuid.uuid4())
+        image_doc = new_image_document(user, request.filename, image_fields)
+        await insert_image_documents("background_images", [image_doc])
         
-        image_doc = {
-            "photo_id": photo_id,
-            "filename": request.filename,
-            "image_data": request.image_data,
-            "photographer_id": user["user_id"],
-            "photographer_name": user["name"],
-            "upload_timestamp": datetime.now(timezone.utc).isoformat(),
-            "created_at": datetime.now(timezone.utc)
+        return {
+            "photo_id": image_doc["photo_id"],
+            "message": "Background image uploaded successfully"
         }
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+
+@api_router.post("/background-images/upload-existing")
+async def upload_background_image_existing(
+    request: ExistingImageUploadRequest,
+    user: dict = Depends(get_current_user_from_header)
+):
+    """Add an already stored image by its SHA-256, without sending the bytes again"""
+    image_fields = await reuse_uploaded_image(request.blob_id)
+    
+    try:
+        image_doc = new_image_document(user, request.filename, image_fields)
+        await insert_image_documents("background_images", [image_doc])
         
-        await db.background_images.insert_one(image_doc)
+        return {
+            "photo_id": image_doc["photo_id"],
+            "message": "Background image uploaded successfully"
+        }
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+
+@api_router.post("/background-images/upload-file")
+async def upload_background_image_file(
+    request: Request,
+    user: dict = Depends(get_current_user_from_header)
+):
+    """Upload a background slideshow image as multipart/form-data (file, filename)"""
+    fields, file_name, image_fields = await receive_image_upload(request)
+    
+    try:
+        image_doc = new_image_document(user, fields.get("filename") or file_name or "upload", image_fields)
+        await insert_image_documents("background_images", [image_doc])
         
         return {
-            "photo_id": photo_id,
+            "photo_id": image_doc["photo_id"],
             "message": "Background image uploaded successfully"
         }
     
@@ -240,10 +2825,22 @@ async def delete_background_image(
     if image["photographer_id"] != user["user_id"]:
         raise HTTPException(status_code=403, detail="Not authorized to delete this image")
     
-    await db.background_images.delete_one({"photo_id": photo_id})
+    image = await delete_image_document("background_images", photo_id, user)
+    if not image:
+        raise HTTPException(status_code=404, detail="Image not found")
+    await collection_versions.bump("background_images")
+    await release_blobs(image)
     
     return {"message": "Background image deleted successfully"}
 
+@api_router.post("/background-images/bulk-delete")
+async def bulk_delete_background_images(
+    request: BulkDeleteRequest,
+    user: dict = Depends(get_current_user_from_header)
+):
+    """Delete several of your background images at once"""
+    return await delete_image_documents("background_images", request.photo_ids, user)
+
 @api_router.get("/")
 async def root():
     return {"message": "Wedding Clickz Photography API"}
@@ -251,67 +2848,54 @@ async def root():
 @api_router.post("/auth/session")
 async def create_session(session_id: str = Header(..., alias="X-Session-ID")):
     """Exchange session_id for user data and session_token"""
-    import httpx
+    data = await auth_provider.session_data(session_id)
     
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                "https://demobackend.emergentagent.com/auth/v1/env/oauth/session-data",
-                headers={"X-Session-ID": session_id}
-            )
-            
-            if response.status_code != 200:
-                raise HTTPException(status_code=401, detail="Invalid session_id")
-            
-            data = response.json()
-            
-            user_id = f"user_{uuid.uuid4().hex[:12]}"
-            existing_user = await db.users.find_one({"email": data["email"]}, {"_id": 0})
-            
-            if existing_user:
-                user_id = existing_user["user_id"]
-                await db.users.update_one(
-                    {"user_id": user_id},
-                    {"$set": {
-                        "name": data["name"],
-                        "picture": data["picture"],
-                        "updated_at": datetime.now(timezone.utc)
-                    }}
-                )
-            else:
-                await db.users.insert_one({
-                    "user_id": user_id,
-                    "email": data["email"],
-                    "name": data["name"],
-                    "picture": data["picture"],
-                    "created_at": datetime.now(timezone.utc)
-                })
-            
-            session_token = data["session_token"]
-            expires_at = datetime.now(timezone.utc) + timedelta(days=7)
-            
-            await db.user_sessions.update_one(
-                {"user_id": user_id},
-                {"$set": {
-                    "session_token": session_token,
-                    "expires_at": expires_at,
-                    "created_at": datetime.now(timezone.utc)
-                }},
-                upsert=True
-            )
-            
-            return {
-                "user": {
-                    "user_id": user_id,
-                    "email": data["email"],
-                    "name": data["name"],
-                    "picture": data["picture"]
-                },
-                "session_token": session_token
-            }
+    user_id = f"user_{uuid.uuid4().hex[:12]}"
+    existing_user = await db.users.find_one({"email": data["email"]}, {"_id": 0})
+    
+    if existing_user:
+        user_id = existing_user["user_id"]
+        await db.users.update_one(
+            {"user_id": user_id},
+            {"$set": {
+                "name": data["name"],
+                "picture": data["picture"],
+                "updated_at": datetime.now(timezone.utc)
+            }}
+        )
+    else:
+        await db.users.insert_one({
+            "user_id": user_id,
+            "email": data["email"],
+            "name": data["name"],
+            "picture": data["picture"],
+            "created_at": datetime.now(timezone.utc)
+        })
+    
+    session_token = data["session_token"]
+    expires_at = datetime.now(timezone.utc) + timedelta(days=7)
+    
+    await db.user_sessions.update_one(
+        {"user_id": user_id},
+        {"$set": {
+            "session_token": session_token,
+            "expires_at": expires_at,
+            "created_at": datetime.now(timezone.utc)
+        }},
+        upsert=True
+    )
+    # The profile may have changed and the previous session token was replaced
+    session_cache.invalidate_user(user_id)
     
-    except httpx.RequestError as e:
-        raise HTTPException(status_code=500, detail=f"Failed to verify session: {str(e)}")
+    return {
+        "user": {
+            "user_id": user_id,
+            "email": data["email"],
+            "name": data["name"],
+            "picture": data["picture"]
+        },
+        "session_token": session_token
+    }
 
 @api_router.get("/auth/me")
 async def get_current_user(user: dict = Depends(get_current_user_from_header)):
@@ -322,68 +2906,357 @@ async def get_current_user(user: dict = Depends(get_current_user_from_header)):
 async def logout(user: dict = Depends(get_current_user_from_header)):
     """Logout user by deleting session"""
     await db.user_sessions.delete_many({"user_id": user["user_id"]})
+    session_cache.invalidate_user(user["user_id"])
     return {"message": "Logged out successfully"}
 
+@api_router.get("/admin/stats")
+async def get_admin_stats(user: dict = Depends(get_current_user_from_header)):
+    """In-process cache and load-shedding statistics for this worker"""
+    return {
+        "session_cache": session_cache.stats(),
+        "rate_limiter": rate_limiter.stats(),
+        "public_reads": public_read_gate.stats()
+    }
+
+@api_router.get("/admin/indexes")
+async def get_admin_indexes(user: dict = Depends(get_current_user_from_header)):
+    """Index definitions and usage counters ($indexStats) for the API's collections"""
+    report = {}
+    for collection_name in INDEXES:
+        stats = await db[collection_name].aggregate([{"$indexStats": {}}]).to_list(None)
+        report[collection_name] = [
+            {
+                "name": stat["name"],
+                "key": stat["key"],
+                "ops": stat["accesses"]["ops"],
+                "since": stat["accesses"]["since"],
+            }
+            for stat in sorted(stats, key=lambda stat: stat["name"])
+        ]
+    return report
+
 @api_router.post("/photos/upload")
 async def upload_photo(
     request: PhotoUploadRequest,
+    event_id: Optional[str] = None,
     user: dict = Depends(get_current_user_from_header)
 ):
-    """Upload a wedding photo (MOCK: stores base64 in MongoDB)"""
+    """Upload a wedding photo into the blob store
+    
+    The photo goes into ?event_id=, or the current event.
+    """
+    event_id = await resolve_upload_event(event_id)
+    image_fields = await store_image(request.image_data)
+    
     try:
-        photo_id = str(uuid.uuid4())
+        photo_doc = new_image_document(
+            user, request.filename, image_fields,
+            event_id=event_id,
+            wedding_date=request.wedding_date,
+            photographer_notes=request.photographer_notes
+        )
+        await insert_image_documents("photos", [photo_doc])
         
-        photo_doc = {
-            "photo_id": photo_id,
-            "filename": request.filename,
-            "image_data": request.image_data,
-            "wedding_date": request.wedding_date,
-            "photographer_notes": request.photographer_notes,
-            "photographer_id": user["user_id"],
-            "photographer_name": user["name"],
-            "upload_timestamp": datetime.now(timezone.utc).isoformat(),
-            "created_at": datetime.now(timezone.utc)
+        return {
+            "photo_id": photo_doc["photo_id"],
+            "message": "Photo uploaded successfully"
         }
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+
+@api_router.post("/photos/upload-existing")
+async def upload_photo_existing(
+    request: ExistingImageUploadRequest,
+    event_id: Optional[str] = None,
+    user: dict = Depends(get_current_user_from_header)
+):
+    """Add an already stored photo by its SHA-256, without sending the bytes again"""
+    event_id = await resolve_upload_event(event_id)
+    image_fields = await reuse_uploaded_image(request.blob_id)
+    
+    try:
+        photo_doc = new_image_document(
+            user, request.filename, image_fields,
+            event_id=event_id,
+            wedding_date=request.wedding_date or datetime.now(timezone.utc).date().isoformat(),
+            photographer_notes=request.photographer_notes
+        )
+        await insert_image_documents("photos", [photo_doc])
         
-        await db.photos.insert_one(photo_doc)
+        return {
+            "photo_id": photo_doc["photo_id"],
+            "message": "Photo uploaded successfully"
+        }
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+
+@api_router.post("/photos/upload-file")
+async def upload_photo_file(
+    request: Request,
+    event_id: Optional[str] = None,
+    user: dict = Depends(get_current_user_from_header)
+):
+    """Upload a wedding photo as multipart/form-data
+    
+    Form fields: file, plus optional filename, wedding_date (defaults to
+    today) and photographer_notes. The photo goes into ?event_id=, or the
+    current event.
+    """
+    event_id = await resolve_upload_event(event_id)
+    fields, file_name, image_fields = await receive_image_upload(request)
+    
+    try:
+        photo_doc = new_image_document(
+            user, fields.get("filename") or file_name or "upload", image_fields,
+            event_id=event_id,
+            wedding_date=fields.get("wedding_date") or datetime.now(timezone.utc).date().isoformat(),
+            photographer_notes=fields.get("photographer_notes")
+        )
+        await insert_image_documents("photos", [photo_doc])
         
         return {
-            "photo_id": photo_id,
+            "photo_id": photo_doc["photo_id"],
             "message": "Photo uploaded successfully"
         }
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
+@api_router.post("/photos/upload-batch")
+async def upload_photo_batch(
+    request: Request,
+    event_id: Optional[str] = None,
+    user: dict = Depends(get_current_user_from_header)
+):
+    """Upload many wedding photos in one multipart/form-data request
+    
+    Every "file" part is one photo; wedding_date and photographer_notes apply
+    to all of them, and they all go into ?event_id=, or the current event.
+    Derivatives are rendered with up to IMAGE_PROCESS_WORKERS images in
+    flight and the documents are written with a single insert_many.
+    Returns one result per file, in upload order.
+    """
+    event_id = await resolve_upload_event(event_id)
+    fields, files = await receive_image_files(request, MAX_BATCH_FILES, MAX_BATCH_BYTES)
+    wedding_date = fields.get("wedding_date") or datetime.now(timezone.utc).date().isoformat()
+    slots = asyncio.Semaphore(IMAGE_PROCESS_WORKERS)
+    
+    async def process(file: dict):
+        async with slots:
+            try:
+                return await process_uploaded_image(file)
+            except HTTPException as e:
+                return e
+            except Exception as e:
+                logger.warning(f"Batch upload of {file['filename']} failed: {e}")
+                return HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+    
+    processed = await asyncio.gather(*(process(file) for file in files))
+    
+    results = []
+    photo_docs = []
+    saved = []
+    for file, image_fields in zip(files, processed):
+        filename = file["filename"] or "upload"
+        if isinstance(image_fields, HTTPException):
+            results.append({"filename": filename, "success": False, "detail": image_fields.detail})
+            continue
+        photo_doc = new_image_document(
+            user, filename, image_fields,
+            event_id=event_id,
+            wedding_date=wedding_date,
+            photographer_notes=fields.get("photographer_notes")
+        )
+        photo_docs.append(photo_doc)
+        results.append({"filename": filename, "success": True, "photo_id": photo_doc["photo_id"]})
+        saved.append(results[-1])
+    
+    failed = await insert_image_documents("photos", photo_docs, partial=True) if photo_docs else {}
+    
+    # Documents the insert rejected are reported per item; the rest are saved
+    for index, detail in failed.items():
+        saved[index].update(success=False, detail=f"Upload failed: {detail}")
+        del saved[index]["photo_id"]
+    
+    return {
+        "uploaded": len(photo_docs) - len(failed),
+        "failed": len(results) - len(photo_docs) + len(failed),
+        "results": results
+    }
+
 @api_router.get("/photos/list")
-async def list_photos(user: dict = Depends(get_current_user_from_header)):
-    """List all photos uploaded by the photographer"""
-    photos = await db.photos.find(
-        {"photographer_id": user["user_id"]},
-        {"_id": 0, "image_data": 0}
-    ).sort("created_at", -1).to_list(1000)
+async def list_photos(
+    cursor: Optional[str] = None,
+    limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX),
+    event_id: Optional[str] = None,
+    user: dict = Depends(get_current_user_from_header)
+):
+    """List photos uploaded by the photographer, newest first, optionally of one event"""
+    query = {"photographer_id": user["user_id"]}
+    if event_id:
+        query["event_id"] = event_id
+    return json_response(await paginate_images("photos", query, cursor, limit))
+
+@api_router.get("/photos/guest", dependencies=[Depends(public_read_limit())])
+async def list_guest_photos(
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX),
+    event_id: Optional[str] = None
+):
+    """List an event's wedding photos for guests, newest first (public endpoint)
+    
+    event_id defaults to the current event. A first page of the default size
+    is served from guest_gallery_snapshot; other pages are queried. First
+    pages carry a fresh X-Gallery-Cursor, on 304 responses too, so a client
+    revalidating its cached copy never keeps an expired cursor.
+    """
+    # An archived or unknown event is a 404 even for clients holding an old ETag
+    event_id = await resolve_public_event(event_id)
+    not_modified = await check_not_modified(request, response, "photos")
+    if cursor:
+        if not_modified:
+            return not_modified
+        return json_response(await paginate_images("photos", {"event_id": event_id}, cursor, limit), response)
     
-    return photos
+    # Only the default page size is pre-rendered, so ?limit= cannot push snapshots out of the cache
+    bodies = None
+    if limit == PAGE_SIZE_DEFAULT:
+        keys, bodies = await guest_gallery_snapshot.get(event_id)
+    else:
+        keys = await gallery_watermark_keys()
+    (not_modified or response).headers["X-Gallery-Cursor"] = encode_gallery_cursor(*keys)
+    if not_modified:
+        return not_modified
+    if bodies is None:
+        return json_response(await paginate_images("photos", {"event_id": event_id}, None, limit), response)
+    return prerendered_response(request, response, bodies)
 
-@api_router.get("/photos/guest")
-async def list_guest_photos():
-    """List all wedding photos for guests (public endpoint)"""
-    photos = await db.photos.find(
-        {},
-        {"_id": 0}
-    ).sort("created_at", -1).to_list(1000)
+@api_router.get("/photos/guest/changes", dependencies=[Depends(public_read_limit())])
+async def list_guest_photo_changes(since: Optional[str] = None, event_id: Optional[str] = None):
+    """Photos added to and deleted from an event since a gallery cursor (public endpoint)
+    
+    event_id defaults to the current event. A missing, malformed or expired
+    cursor answers with reset=true and a fresh cursor; the client should then
+    reload /photos/guest.
+    """
+    event_id = await resolve_public_event(event_id)
+    position = decode_gallery_cursor(since) if since else None
+    if position is None:
+        return {"added": [], "deleted": [], "cursor": await gallery_watermark(), "has_more": False, "reset": True}
+    
+    return json_response(await gallery_changes(position, event_id))
+
+@api_router.get("/photos/stream", dependencies=[Depends(public_read_limit(gated=False))])
+async def stream_guest_photos(
+    request: Request,
+    since: Optional[str] = None,
+    event_id: Optional[str] = None,
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID")
+):
+    """Server-Sent Events feed of an event's photo_added / photo_deleted events (public endpoint)
+    
+    event_id defaults to the current event. Clients pass the cursor from
+    /photos/guest as ?since= on the first connect; reconnects send
+    Last-Event-ID and first receive what they missed. The live feed holds no
+    public_read_gate slot, but every catch-up query waits for one; if that
+    sheds, the stream ends and the client catches up when it reconnects.
+    """
+    event_id = await resolve_public_event(event_id)
+    route = request.scope["route"].path
+    resume_from = last_event_id or since
+    await gallery_events.load_watermark()
+    
+    async def events():
+        # Subscribe before catching up so nothing published in between is lost
+        queue = gallery_events.subscribe()
+        try:
+            yield "retry: 5000\n\n"
+            if resume_from:
+                position = decode_gallery_cursor(resume_from)
+                if position is None:
+                    yield format_sse("{}", "reset", await gallery_watermark())
+                while position is not None:
+                    try:
+                        async with public_read_gate.slot(route):
+                            changes = await gallery_changes(position, event_id)
+                    except HTTPException:
+                        return
+                    for photo in changes["added"]:
+                        yield format_sse(json.dumps(jsonable_encoder(photo)), "photo_added")
+                    for photo_id in changes["deleted"]:
+                        yield format_sse(json.dumps({"photo_id": photo_id}), "photo_deleted")
+                    yield format_sse("{}", "sync", changes["cursor"])
+                    position = decode_gallery_cursor(changes["cursor"]) if changes["has_more"] else None
+            
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=GALLERY_STREAM_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ": heartbeat\n\n"
+                    continue
+                if message is None:
+                    # Fell too far behind; the client reconnects with its Last-Event-ID
+                    return
+                cursor, event, data, scope = message
+                if scope == event_id:
+                    yield format_sse(data, event, cursor)
+        finally:
+            gallery_events.unsubscribe(queue)
     
-    return photos
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@api_router.get(
+    "/photos/archive",
+    dependencies=[Depends(public_read_limit(rate=1 / ARCHIVE_RATE_INTERVAL, burst=ARCHIVE_RATE_BURST))]
+)
+async def download_photo_archive(event_id: Optional[str] = None, wedding_date: Optional[str] = None):
+    """Download an event's photos as one ZIP, streamed while it is built (public endpoint)
+    
+    event_id defaults to the current event; wedding_date (YYYY-MM-DD) keeps
+    only the photos of that day.
+    """
+    event_id = await resolve_public_event(event_id)
+    query = {"event_id": event_id}
+    name = "wedding-photos"
+    if event_id:
+        event = await event_directory.get(event_id)
+        name = re.sub(r"[^A-Za-z0-9]+", "-", event["name"]).strip("-").lower() or name
+    if wedding_date:
+        try:
+            datetime.strptime(wedding_date, "%Y-%m-%d")
+        except ValueError:
+            raise HTTPException(status_code=400, detail="wedding_date must be YYYY-MM-DD")
+        query["wedding_date"] = wedding_date
+        name = f"{name}-{wedding_date}"
+    
+    return StreamingResponse(
+        stream_photo_archive(query),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{name}.zip"', "Cache-Control": "no-store"}
+    )
 
-@api_router.get("/photos/{photo_id}")
+@api_router.get("/photos/{photo_id}", dependencies=[Depends(public_read_limit())])
 async def get_photo(photo_id: str):
     """Get a specific photo by ID (public endpoint)"""
-    photo = await db.photos.find_one({"photo_id": photo_id}, {"_id": 0})
+    photo = await db.photos.find_one({"photo_id": photo_id}, {"_id": 0, "image_data": 0})
     
     if not photo:
         raise HTTPException(status_code=404, detail="Photo not found")
     
-    return photo
+    return with_image_urls(photo, "photos")
+
+@api_router.get("/photos/{photo_id}/raw", dependencies=[Depends(public_read_limit(rate=None))])
+async def get_photo_raw(photo_id: str, request: Request, variant: str = "original", download: bool = False):
+    """Stream the image bytes of a photo (public endpoint)"""
+    return await serve_image("photos", photo_id, request, variant, download)
 
 @api_router.delete("/photos/{photo_id}")
 async def delete_photo(
@@ -399,26 +3272,292 @@ async def delete_photo(
     if photo["photographer_id"] != user["user_id"]:
         raise HTTPException(status_code=403, detail="Not authorized to delete this photo")
     
-    await db.photos.delete_one({"photo_id": photo_id})
+    photo = await delete_image_document("photos", photo_id, user)
+    if not photo:
+        raise HTTPException(status_code=404, detail="Photo not found")
+    await collection_versions.bump("photos")
+    await record_photo_deletions([photo])
+    await release_blobs(photo)
     
     return {"message": "Photo deleted successfully"}
 
+@api_router.post("/photos/bulk-delete")
+async def bulk_delete_photos(
+    request: BulkDeleteRequest,
+    user: dict = Depends(get_current_user_from_header)
+):
+    """Delete several of your photos at once"""
+    return await delete_image_documents("photos", request.photo_ids, user)
+
+@api_router.post("/uploads", status_code=201)
+async def create_upload(
+    request: UploadSessionRequest,
+    response: Response,
+    event_id: Optional[str] = None,
+    user: dict = Depends(get_current_user_from_header)
+):
+    """Start a resumable upload into photos, wall-photos or background-images
+    
+    Send the file with PATCH /api/uploads/{upload_id}, in as many chunks as
+    needed, then POST /api/uploads/{upload_id}/complete. Photos go into
+    ?event_id=, or the current event.
+    """
+    collection_name = next((name for name, prefix in IMAGE_COLLECTIONS.items() if prefix == request.collection), None)
+    if collection_name is None:
+        raise HTTPException(status_code=400, detail="collection must be photos, wall-photos or background-images")
+    if request.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="File too large")
+    sha256 = request.sha256.lower() if request.sha256 else None
+    if sha256 and not BLOB_ID_PATTERN.match(sha256):
+        raise HTTPException(status_code=400, detail="sha256 must be 64 hex digits")
+    
+    fields = {}
+    if collection_name == "photos":
+        fields = {
+            "event_id": await resolve_upload_event(event_id),
+            "wedding_date": request.wedding_date or datetime.now(timezone.utc).date().isoformat(),
+            "photographer_notes": request.photographer_notes
+        }
+    content_type = (request.content_type or "").strip().lower()
+    now = datetime.now(timezone.utc)
+    session = {
+        "upload_id": str(uuid.uuid4()),
+        "user_id": user["user_id"],
+        "collection": collection_name,
+        "filename": request.filename,
+        "content_type": content_type if content_type.startswith("image/") else "application/octet-stream",
+        "size": request.size,
+        "sha256": sha256,
+        "fields": fields,
+        "offset": 0,
+        "chunks": [],
+        "state": "uploading",
+        "created_at": now,
+        "expires_at": now + UPLOAD_SESSION_TTL
+    }
+    await db.upload_sessions.insert_one(session)
+    
+    response.headers["Location"] = f"/api/uploads/{session['upload_id']}"
+    response.headers["Upload-Expires"] = format_datetime(session["expires_at"], usegmt=True)
+    return {
+        "upload_id": session["upload_id"],
+        "offset": 0,
+        "size": request.size,
+        "chunk_size": UPLOAD_CHUNK_SIZE,
+        "expires_at": session["expires_at"]
+    }
+
+@api_router.api_route("/uploads/{upload_id}", methods=["GET", "HEAD"])
+async def get_upload(
+    upload_id: str,
+    response: Response,
+    user: dict = Depends(get_current_user_from_header)
+):
+    """Where to resume an upload: its offset (also sent as Upload-Offset) and size"""
+    session = await find_upload_session(upload_id, user)
+    response.headers["Upload-Offset"] = str(session["offset"])
+    response.headers["Upload-Length"] = str(session["size"])
+    response.headers["Cache-Control"] = "no-store"
+    return {
+        "upload_id": upload_id,
+        "offset": session["offset"],
+        "size": session["size"],
+        "state": session["state"],
+        "photo_id": session.get("photo_id")
+    }
+
+@api_router.patch("/uploads/{upload_id}", status_code=204)
+async def upload_chunk(
+    upload_id: str,
+    request: Request,
+    upload_offset: int = Header(...),
+    user: dict = Depends(get_current_user_from_header)
+):
+    """Append the request body to an upload at Upload-Offset
+    
+    The offset must be the upload's current one, else 409 and the client asks
+    GET/HEAD /api/uploads/{upload_id} where to resume. An optional
+    "Upload-Checksum: sha256 <base64>" header is verified for the chunk.
+    """
+    session = await find_upload_session(upload_id, user)
+    if session["state"] != "uploading":
+        raise HTTPException(status_code=409, detail="Upload is already complete")
+    if upload_offset != session["offset"]:
+        raise HTTPException(
+            status_code=409,
+            detail="Upload-Offset does not match the upload",
+            headers={"Upload-Offset": str(session["offset"])}
+        )
+    
+    chunk = await receive_upload_chunk(request, session, upload_offset)
+    offset = upload_offset
+    expires_at = session["expires_at"]
+    if chunk is not None:
+        expires_at = datetime.now(timezone.utc) + UPLOAD_SESSION_TTL
+        result = await db.upload_sessions.update_one(
+            {"upload_id": upload_id, "state": "uploading", "offset": upload_offset},
+            {"$set": {"offset": upload_offset + chunk["size"], "expires_at": expires_at}, "$push": {"chunks": chunk}}
+        )
+        if not result.modified_count:
+            await asyncio.to_thread((upload_session_dir(upload_id) / chunk["file"]).unlink, missing_ok=True)
+            raise HTTPException(status_code=409, detail="Upload moved on; ask for the current offset")
+        offset += chunk["size"]
+    
+    return Response(status_code=204, headers={
+        "Upload-Offset": str(offset),
+        "Upload-Expires": format_datetime(expires_at.replace(tzinfo=timezone.utc), usegmt=True)
+    })
+
+@api_router.post("/uploads/{upload_id}/complete")
+async def complete_upload(
+    upload_id: str,
+    user: dict = Depends(get_current_user_from_header)
+):
+    """Add a fully received upload to its collection
+    
+    Safe to retry: an upload that already completed returns the same photo_id
+    until it expires. A completion that stalled for UPLOAD_COMPLETION_TIMEOUT
+    (its worker died) is taken over by the next retry.
+    """
+    session = await find_upload_session(upload_id, user)
+    if session["state"] == "completed":
+        return {"photo_id": session["photo_id"], "message": "Upload completed successfully"}
+    if session["offset"] != session["size"]:
+        raise HTTPException(
+            status_code=409,
+            detail="Upload is not finished",
+            headers={"Upload-Offset": str(session["offset"])}
+        )
+    if session["collection"] == "photos":
+        await resolve_upload_event(session["fields"]["event_id"])
+    now = datetime.now(timezone.utc)
+    photo_id = session.get("photo_id") or str(uuid.uuid4())
+    claimed = await db.upload_sessions.update_one(
+        {"upload_id": upload_id, "$or": [
+            {"state": "uploading"},
+            {"state": "completing", "claimed_at": {"$not": {"$gte": now - UPLOAD_COMPLETION_TIMEOUT}}},
+        ]},
+        {"$set": {"state": "completing", "claimed_at": now, "photo_id": photo_id}}
+    )
+    if not claimed.modified_count:
+        raise HTTPException(status_code=409, detail="Upload is already being completed")
+    if session.get("photo_id") and await db[session["collection"]].find_one({"photo_id": photo_id}, {"_id": 1}):
+        # An earlier attempt got as far as inserting the photo
+        await finish_upload_session(upload_id, photo_id)
+        return {"photo_id": photo_id, "message": "Upload completed successfully"}
+    
+    try:
+        image_fields = await upload_image_fields(session)
+    except HTTPException as e:
+        # Unusable content will not get better by retrying; a lost chunk (409) is resent
+        if e.status_code != 409:
+            await remove_upload_session(upload_id)
+        raise
+    except BaseException:
+        await db.upload_sessions.update_one({"upload_id": upload_id}, {"$set": {"state": "uploading"}})
+        raise
+    
+    try:
+        photo_doc = new_image_document(user, session["filename"], image_fields, **session["fields"], photo_id=photo_id)
+        await insert_image_documents(session["collection"], [photo_doc])
+    except Exception as e:
+        await db.upload_sessions.update_one({"upload_id": upload_id}, {"$set": {"state": "uploading"}})
+        raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+    
+    await finish_upload_session(upload_id, photo_id)
+    return {"photo_id": photo_id, "message": "Upload completed successfully"}
+
+@api_router.delete("/uploads/{upload_id}", status_code=204)
+async def cancel_upload(
+    upload_id: str,
+    user: dict = Depends(get_current_user_from_header)
+):
+    """Abandon an upload and delete the chunks received so far"""
+    session = await find_upload_session(upload_id, user)
+    if session["state"] == "completing" and not completion_stalled(session):
+        raise HTTPException(status_code=409, detail="Upload is being completed")
+    await remove_upload_session(upload_id)
+    return Response(status_code=204)
+
 app.include_router(api_router)
 
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics(authorization: Optional[str] = Header(None)):
+    """Prometheus metrics (request latency, MongoDB commands, upload sizes)"""
+    if METRICS_TOKEN and not hmac.compare_digest(authorization or "", f"Bearer {METRICS_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    body, content_type = render_metrics()
+    return Response(body, media_type=content_type)
+
+app.add_middleware(PublicReadGateMiddleware)
+
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=COMPRESSION_MIN_SIZE,
+    cache_size=COMPRESSION_CACHE_SIZE,
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Gallery-Cursor", "ETag", "Last-Modified", "Location", "Upload-Offset", "Upload-Expires", "Retry-After"],
 )
 
+# Outermost, so latency and response sizes include compression and CORS
+app.add_middleware(MetricsMiddleware)
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
 
+_background_tasks: List[asyncio.Task] = []
+
+@app.on_event("startup")
+async def create_indexes():
+    await ensure_indexes()
+
+@app.on_event("startup")
+async def migrate_blob_refs():
+    await backfill_blob_refs()
+
+@app.on_event("startup")
+async def migrate_events():
+    await assign_default_event()
+
+@app.on_event("startup")
+async def start_image_metadata_worker():
+    await flag_images_for_metadata()
+    _background_tasks.append(asyncio.create_task(image_metadata_worker.run()))
+
+@app.on_event("startup")
+async def start_upload_session_gc():
+    _background_tasks.append(asyncio.create_task(run_upload_session_gc()))
+
+@app.on_event("startup")
+async def start_gallery_change_stream():
+    if GALLERY_CHANGE_STREAM:
+        _background_tasks.append(asyncio.create_task(watch_gallery_changes()))
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    for task in _background_tasks:
+        task.cancel()
+    await asyncio.gather(*_background_tasks, return_exceptions=True)
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    client.close()
+
+@app.on_event("shutdown")
+async def shutdown_auth_provider():
+    await auth_provider.aclose()
+
+@app.on_event("shutdown")
+async def shutdown_image_pool():
+    if _image_pool is not None:
+        _image_pool.shutdown(wait=False, cancel_futures=True)
\ No newline at end of file
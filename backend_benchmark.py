@@ -0,0 +1,341 @@
+"""Offline load test for the API.
+
+Runs the FastAPI app in-process (httpx ASGI transport, no network) against
+mongomock-motor, or a local mongod when --mongo-url is given, and simulates
+a wedding in progress:
+
+  * N guests open the live gallery (GET /api/photos/guest) and then poll it at
+    the LiveGallery.jsx cadence, either through the changes feed the component
+    uses when its event stream is down (--guest-mode changes) or by
+    revalidating the full listing with If-None-Match (--guest-mode listing);
+  * a photographer uploads a new photo every --upload-interval seconds.
+
+Reports p50/p95/p99 latency and requests/second per endpoint plus process
+memory, saves the run as JSON under test_reports/benchmarks/ and compares it
+with the previous run of the same configuration.
+
+    python backend_benchmark.py --guests 200 --duration 60
+    python backend_benchmark.py --poll-interval 1 --fail-on-regression
+"""
+import argparse
+import asyncio
+import base64
+import io
+import json
+import logging
+import os
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent
+RESULTS_DIR = ROOT_DIR / "test_reports" / "benchmarks"
+# LiveGallery.jsx checks for changes every 15 seconds
+LIVE_GALLERY_POLL_INTERVAL = 15.0
+SESSION_TOKEN = "benchmark-session"
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--guests", type=int, default=100, help="concurrent guests (default 100)")
+    parser.add_argument("--duration", type=float, default=60, help="seconds to run (default 60)")
+    parser.add_argument("--poll-interval", type=float, default=LIVE_GALLERY_POLL_INTERVAL,
+                        help="seconds between a guest's polls (default: LiveGallery's 15)")
+    parser.add_argument("--guest-mode", choices=("changes", "listing"), default="changes",
+                        help="poll /api/photos/guest/changes or revalidate /api/photos/guest")
+    parser.add_argument("--upload-interval", type=float, default=2.0,
+                        help="seconds between photographer uploads, 0 disables (default 2)")
+    parser.add_argument("--seed-photos", type=int, default=300, help="photos in the gallery at start (default 300)")
+    parser.add_argument("--image-size", type=int, nargs=2, default=(2400, 1600), metavar=("W", "H"),
+                        help="uploaded image dimensions (default 2400 1600)")
+    parser.add_argument("--mongo-url", help="use this MongoDB (a throwaway database is created) instead of mongomock")
+    parser.add_argument("--no-save", action="store_true", help="do not write the result file")
+    parser.add_argument("--regression-threshold", type=float, default=0.2,
+                        help="relative p95/RPS change counted as a regression (default 0.2)")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit 1 when a regression is found")
+    return parser.parse_args()
+
+def load_server(args, blob_dir: str):
+    """Import backend/server.py configured for an isolated benchmark database"""
+    db_name = f"benchmark_{os.getpid()}"
+    os.environ.update({
+        "MONGO_URL": args.mongo_url or "mongodb://localhost:27017",
+        "DB_NAME": db_name,
+        "BLOB_STORE": "local",
+        "BLOB_STORE_PATH": blob_dir,
+        "GALLERY_CHANGE_STREAM": "false",
+    })
+    # Every simulated guest shares the ASGI client address; measure the server, not the per-address budget
+    os.environ.setdefault("PUBLIC_RATE_LIMIT_PER_SECOND", "1000000")
+    sys.path.insert(0, str(ROOT_DIR / "backend"))
+    import server
+
+    # httpx logs every request at INFO, which would drown the report
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    if not args.mongo_url:
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            sys.exit("mongomock-motor is not installed; pip install mongomock-motor or pass --mongo-url")
+        server.client = AsyncMongoMockClient()
+        server.db = server.client[db_name]
+    return server
+
+def make_jpeg(size, seed: int) -> bytes:
+    from PIL import Image, ImageDraw
+
+    rng = random.Random(seed)
+    image = Image.new("RGB", size, tuple(rng.randrange(256) for _ in range(3)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(40):
+        x, y = rng.randrange(size[0]), rng.randrange(size[1])
+        draw.ellipse((x, y, x + size[0] // 8, y + size[1] // 8), fill=tuple(rng.randrange(256) for _ in range(3)))
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
+
+async def seed_database(server, photo_count: int) -> None:
+    now = datetime.now(timezone.utc)
+    await server.db.users.insert_one({
+        "user_id": "user_benchmark",
+        "email": "benchmark@example.com",
+        "name": "Benchmark Photographer",
+        "picture": None,
+    })
+    await server.db.user_sessions.insert_one({
+        "user_id": "user_benchmark",
+        "session_token": SESSION_TOKEN,
+        "expires_at": now + timedelta(days=1),
+    })
+    if not photo_count:
+        return
+    event_id = (await server.settings_cache.get())["current_event_id"]
+    # Listing cost does not depend on the bytes, so seeded photos share one stored image
+    image_fields = await server.store_image(
+        "data:image/jpeg;base64," + base64.b64encode(make_jpeg((1200, 800), 0)).decode()
+    )
+    docs = [
+        server.new_image_document(
+            {"user_id": "user_benchmark", "name": "Benchmark Photographer"},
+            f"IMG_{index:05d}.jpg", image_fields,
+            event_id=event_id,
+            wedding_date=now.date().isoformat(), photographer_notes=None
+        )
+        for index in range(photo_count)
+    ]
+    for offset, doc in enumerate(docs):
+        doc["created_at"] = now - timedelta(seconds=photo_count - offset)
+    await server.db.photos.insert_many(docs)
+    await server.db.blobs.update_one({"_id": image_fields["blob_id"]}, {"$inc": {"refs": photo_count - 1}})
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.bytes = defaultdict(int)
+
+    async def request(self, client, name: str, method: str, url: str, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except Exception:
+            self.errors[name] += 1
+            return None
+        self.latencies[name].append((time.perf_counter() - start) * 1000)
+        self.bytes[name] += response.num_bytes_downloaded
+        if response.status_code >= 400:
+            self.errors[name] += 1
+        return response
+
+async def guest(client, recorder: Recorder, args, deadline: float) -> None:
+    await asyncio.sleep(random.uniform(0, args.poll_interval))
+    response = await recorder.request(client, "GET /api/photos/guest", "GET", "/api/photos/guest")
+    cursor = response.headers.get("x-gallery-cursor") if response is not None else None
+    etag = response.headers.get("etag") if response is not None else None
+    while True:
+        await asyncio.sleep(args.poll_interval)
+        if time.perf_counter() >= deadline:
+            return
+        if args.guest_mode == "listing":
+            headers = {"If-None-Match": etag} if etag else {}
+            response = await recorder.request(
+                client, "GET /api/photos/guest (revalidate)", "GET", "/api/photos/guest", headers=headers
+            )
+            if response is not None and response.status_code == 200:
+                etag = response.headers.get("etag")
+            continue
+        response = await recorder.request(
+            client, "GET /api/photos/guest/changes", "GET", "/api/photos/guest/changes", params={"since": cursor}
+        )
+        if response is not None and response.status_code == 200:
+            cursor = response.json()["cursor"]
+
+async def photographer(client, recorder: Recorder, args, images, deadline: float) -> None:
+    headers = {"Authorization": f"Bearer {SESSION_TOKEN}"}
+    index = 0
+    while time.perf_counter() < deadline:
+        files = {"file": (f"upload_{index}.jpg", images[index % len(images)], "image/jpeg")}
+        await recorder.request(client, "POST /api/photos/upload-file", "POST", "/api/photos/upload-file",
+                               headers=headers, files=files)
+        index += 1
+        await asyncio.sleep(args.upload_interval)
+
+def current_rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        return 0.0
+
+def summarize(recorder: Recorder, elapsed: float) -> dict:
+    endpoints = {}
+    for name, samples in sorted(recorder.latencies.items()):
+        quantiles = statistics.quantiles(samples, n=100, method="inclusive") if len(samples) > 1 else samples * 99
+        endpoints[name] = {
+            "requests": len(samples),
+            "errors": recorder.errors[name],
+            "rps": round(len(samples) / elapsed, 2),
+            "mean_ms": round(statistics.fmean(samples), 2),
+            "p50_ms": round(quantiles[49], 2),
+            "p95_ms": round(quantiles[94], 2),
+            "p99_ms": round(quantiles[98], 2),
+            "bytes_per_request": round(recorder.bytes[name] / len(samples)),
+        }
+    return endpoints
+
+async def run(args) -> dict:
+    with tempfile.TemporaryDirectory(prefix="benchmark-blobs-") as blob_dir:
+        server = load_server(args, blob_dir)
+        import httpx
+
+        await server.app.router.startup()
+        await seed_database(server, args.seed_photos)
+        images = [make_jpeg(tuple(args.image_size), seed) for seed in range(1, 9)]
+
+        recorder = Recorder()
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(
+            transport=transport,
+            base_url="http://benchmark",
+            headers={"Accept-Encoding": "br, gzip"},
+            timeout=None,
+        ) as client:
+            tracemalloc.start()
+            start = time.perf_counter()
+            deadline = start + args.duration
+            tasks = [guest(client, recorder, args, deadline) for _ in range(args.guests)]
+            if args.upload_interval > 0:
+                tasks.append(photographer(client, recorder, args, images, deadline))
+            await asyncio.gather(*tasks)
+            elapsed = time.perf_counter() - start
+            _, traced_peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        if args.mongo_url:
+            await server.client.drop_database(server.db.name)
+        await server.app.router.shutdown()
+
+    endpoints = summarize(recorder, elapsed)
+    return {
+        "endpoints": endpoints,
+        "total_requests": sum(e["requests"] for e in endpoints.values()),
+        "total_errors": sum(e["errors"] for e in endpoints.values()),
+        "total_rps": round(sum(e["requests"] for e in endpoints.values()) / elapsed, 2),
+        "elapsed_seconds": round(elapsed, 2),
+        "memory": {
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            "end_rss_mb": round(current_rss_mb(), 1),
+            "python_heap_peak_mb": round(traced_peak / 2 ** 20, 1),
+        },
+    }
+
+def git_revision() -> dict:
+    def git(*command):
+        try:
+            return subprocess.run(["git", *command], cwd=ROOT_DIR, capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return ""
+    return {"commit": git("rev-parse", "--short", "HEAD"), "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+
+def run_config(args) -> dict:
+    return {
+        "guests": args.guests,
+        "duration": args.duration,
+        "poll_interval": args.poll_interval,
+        "guest_mode": args.guest_mode,
+        "upload_interval": args.upload_interval,
+        "seed_photos": args.seed_photos,
+        "image_size": list(args.image_size),
+        "mongo": "mongod" if args.mongo_url else "mongomock",
+    }
+
+def previous_result(config: dict):
+    for path in sorted(RESULTS_DIR.glob("*.json"), reverse=True):
+        try:
+            result = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        if result.get("config") == config:
+            return path, result
+    return None, None
+
+def compare(result: dict, previous: dict, threshold: float) -> list:
+    regressions = []
+    for name, current in result["endpoints"].items():
+        before = previous["endpoints"].get(name)
+        if not before:
+            continue
+        p95_change = (current["p95_ms"] - before["p95_ms"]) / before["p95_ms"] if before["p95_ms"] else 0
+        rps_change = (current["rps"] - before["rps"]) / before["rps"] if before["rps"] else 0
+        print(f"  {name:40s} p95 {before['p95_ms']:>9.2f} -> {current['p95_ms']:>9.2f} ms ({p95_change:+.0%})"
+              f"   rps {before['rps']:>8.2f} -> {current['rps']:>8.2f} ({rps_change:+.0%})")
+        if p95_change > threshold or rps_change < -threshold:
+            regressions.append(name)
+    return regressions
+
+def main():
+    args = parse_args()
+    config = run_config(args)
+    print(f"Benchmark: {config}")
+    result = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git": git_revision(),
+        "python": sys.version.split()[0],
+        "config": config,
+        **asyncio.run(run(args)),
+    }
+
+    print(f"\n{'endpoint':40s} {'requests':>9s} {'errors':>7s} {'rps':>8s} {'p50':>9s} {'p95':>9s} {'p99':>9s}")
+    for name, stats in result["endpoints"].items():
+        print(f"{name:40s} {stats['requests']:>9d} {stats['errors']:>7d} {stats['rps']:>8.2f} "
+              f"{stats['p50_ms']:>7.2f}ms {stats['p95_ms']:>7.2f}ms {stats['p99_ms']:>7.2f}ms")
+    print(f"\ntotal: {result['total_requests']} requests, {result['total_rps']} rps, "
+          f"{result['total_errors']} errors; memory: {result['memory']}")
+
+    previous_path, previous = previous_result(config)
+    regressions = []
+    if previous:
+        print(f"\nCompared with {previous_path.name} ({previous['git']['commit']}):")
+        regressions = compare(result, previous, args.regression_threshold)
+        if regressions:
+            print(f"Regressions beyond {args.regression_threshold:.0%}: {', '.join(regressions)}")
+
+    if not args.no_save:
+        RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        path = RESULTS_DIR / f"{stamp}_{result['git']['commit'] or 'nogit'}.json"
+        path.write_text(json.dumps(result, indent=2) + "\n")
+        print(f"\nSaved {path.relative_to(ROOT_DIR)}")
+
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""Move inline base64 images into the blob store.
+
+Documents written before the blob store existed keep the whole image in
+image_data, so every raw request decodes it again and the gallery has no
+thumbnails for them. This walks photos, wall_photos and background_images in
+_id order, --batch-size documents at a time:
+
+  * the base64 payloads are decoded in the server's image process pool;
+  * the bytes go to the blob store and derivatives are rendered, reusing
+    content that is already stored, with the same reference counting as
+    uploads;
+  * each batch is written back with one bulk_write that swaps image_data for
+    the blob reference, and the collection version is bumped so cached
+    listings pick the change up.
+
+It is safe to run while the API is serving: a document is only updated while
+it still holds image_data, and references taken for documents deleted in the
+meantime are released again. Progress is checkpointed in db.migrations
+("inline_images") after every batch, so an interrupted run resumes where it
+stopped; --restart starts over. The images of the batch being written are
+recorded there too, and a run interrupted before swapping them in gives their
+references back when it resumes. Run one instance at a time. Documents that
+cannot be decoded stay inline and are counted as failed.
+
+Uses the backend's configuration (backend/.env, MONGO_URL, DB_NAME, BLOB_STORE...).
+
+    python backend_migrate_images.py
+    python backend_migrate_images.py --collection photos --batch-size 50 --workers 8
+"""
+import argparse
+import asyncio
+import binascii
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from pymongo import UpdateOne
+
+ROOT_DIR = Path(__file__).parent
+sys.path.insert(0, str(ROOT_DIR / "backend"))
+
+import server  # noqa: E402
+from fastapi import HTTPException  # noqa: E402
+from image_processing import decode_data_url  # noqa: E402
+
+CHECKPOINT_ID = "inline_images"
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--collection", action="append", choices=list(server.IMAGE_COLLECTIONS),
+                        help="collection to migrate, repeatable (default: all three)")
+    parser.add_argument("--batch-size", type=int, default=20,
+                        help="documents read and written per batch (default 20); each holds a whole image")
+    parser.add_argument("--workers", type=int, default=server.IMAGE_PROCESS_WORKERS,
+                        help=f"images decoded and rendered at once (default {server.IMAGE_PROCESS_WORKERS})")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and start from the beginning")
+    parser.add_argument("--dry-run", action="store_true", help="only report how many documents are left")
+    return parser.parse_args()
+
+async def load_checkpoint(restart: bool) -> dict:
+    """Per-collection progress {last_id, migrated, failed} from an earlier run"""
+    if restart:
+        await server.db.migrations.delete_one({"_id": CHECKPOINT_ID})
+    checkpoint = await server.db.migrations.find_one({"_id": CHECKPOINT_ID}) or {}
+    if not checkpoint:
+        await server.db.migrations.insert_one({
+            "_id": CHECKPOINT_ID,
+            "collections": {},
+            "started_at": datetime.now(timezone.utc)
+        })
+    return checkpoint.get("collections", {})
+
+async def save_checkpoint(collection_name: str, progress: dict) -> None:
+    await server.db.migrations.update_one(
+        {"_id": CHECKPOINT_ID},
+        {
+            "$set": {f"collections.{collection_name}": progress, "updated_at": datetime.now(timezone.utc)},
+            "$unset": {"pending": ""}
+        }
+    )
+
+async def save_pending(collection_name: str, done: list) -> None:
+    """Record the stored images of a batch before they are swapped into its documents"""
+    await server.db.migrations.update_one(
+        {"_id": CHECKPOINT_ID},
+        {"$set": {"pending": {
+            "collection": collection_name,
+            "images": [{"_id": doc["_id"], "image": image_fields} for doc, image_fields in done]
+        }}}
+    )
+
+async def release_pending() -> None:
+    """Give back the references of a batch an interrupted run stored but did not swap in
+    
+    Documents still holding image_data are migrated again and take new
+    references. Deleted ones are left alone: whether they were swapped (and
+    the delete released the reference) can no longer be told, and a leaked
+    blob is better than a missing one.
+    """
+    checkpoint = await server.db.migrations.find_one({"_id": CHECKPOINT_ID}, {"pending": 1}) or {}
+    pending = checkpoint.get("pending")
+    if not pending:
+        return
+    images = {item["_id"]: item["image"] for item in pending["images"]}
+    unswapped = [
+        found["_id"] async for found in server.db[pending["collection"]].find(
+            {"_id": {"$in": list(images)}, "image_data": {"$exists": True}},
+            {"_id": 1}
+        )
+    ]
+    await server.release_blobs(*(images[doc_id] for doc_id in unswapped))
+    await server.db.migrations.update_one({"_id": CHECKPOINT_ID}, {"$unset": {"pending": ""}})
+    print(f"{pending['collection']}: released {len(unswapped)} reference(s) left by the interrupted run")
+
+async def store_inline_image(image_data: str) -> dict:
+    """Decode image_data in the process pool and store it; returns the image document fields"""
+    loop = asyncio.get_running_loop()
+    data, content_type = await loop.run_in_executor(server.get_image_pool(), decode_data_url, image_data)
+    return await server.store_image_bytes(data, content_type)
+
+def migration_update(image_fields: dict) -> dict:
+    """Update replacing image_data with the stored image, queueing it for metadata extraction if needed"""
+    unset = {"image_data": ""}
+    fields = dict(image_fields)
+    if "metadata" not in fields:
+        # Placeholder metadata the worker wrote while the bytes were inline
+        unset["metadata"] = ""
+        fields["metadata_pending"] = True
+    return {"$set": fields, "$unset": unset}
+
+async def migrate_batch(collection_name: str, docs: list, workers: asyncio.Semaphore) -> tuple:
+    """Store one batch of inline images and swap the references in; returns (migrated, failed, bytes)"""
+
+    async def store(doc: dict):
+        async with workers:
+            try:
+                return await store_inline_image(doc["image_data"])
+            except (binascii.Error, ValueError, HTTPException) as e:
+                print(f"  {collection_name} {doc.get('photo_id', doc['_id'])}: left inline ({getattr(e, 'detail', e)})")
+                return None
+
+    stored = await asyncio.gather(*(store(doc) for doc in docs))
+    done = [(doc, image_fields) for doc, image_fields in zip(docs, stored) if image_fields is not None]
+    if done:
+        await save_pending(collection_name, done)
+        result = await server.db[collection_name].bulk_write([
+            UpdateOne({"_id": doc["_id"], "image_data": {"$exists": True}}, migration_update(image_fields))
+            for doc, image_fields in done
+        ], ordered=False)
+        if result.matched_count < len(done):
+            # Deleted (or migrated by another run) while we were storing them: give the references back
+            swapped = {
+                found["_id"] async for found in server.db[collection_name].find(
+                    {"_id": {"$in": [doc["_id"] for doc, _ in done]}, "blob_id": {"$exists": True}},
+                    {"_id": 1}
+                )
+            }
+            await server.release_blobs(*(image_fields for doc, image_fields in done if doc["_id"] not in swapped))
+        await server.collection_versions.bump(collection_name)
+    size = sum(image_fields["size"] for _, image_fields in done)
+    return len(done), len(docs) - len(done), size
+
+def format_duration(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m" if hours else f"{minutes}m{seconds:02d}s"
+
+async def migrate_collection(collection_name: str, progress: dict, args) -> None:
+    collection = server.db[collection_name]
+    query = {"image_data": {"$exists": True}}
+    if progress.get("last_id") is not None:
+        query["_id"] = {"$gt": progress["last_id"]}
+    remaining = await collection.count_documents(query)
+    print(f"{collection_name}: {remaining} document(s) to migrate"
+          + (f", resuming after {progress['migrated']} migrated" if progress.get("last_id") is not None else ""))
+    if args.dry_run or not remaining:
+        return
+
+    workers = asyncio.Semaphore(args.workers)
+    start = time.perf_counter()
+    seen = migrated = failed = size = 0
+    while True:
+        docs = await collection.find(query, {"_id": 1, "photo_id": 1, "image_data": 1}).sort(
+            "_id", 1
+        ).limit(args.batch_size).to_list(args.batch_size)
+        if not docs:
+            break
+        batch_migrated, batch_failed, batch_size = await migrate_batch(collection_name, docs, workers)
+        seen += len(docs)
+        migrated += batch_migrated
+        failed += batch_failed
+        size += batch_size
+
+        progress = {
+            "last_id": docs[-1]["_id"],
+            "migrated": progress.get("migrated", 0) + batch_migrated,
+            "failed": progress.get("failed", 0) + batch_failed,
+        }
+        await save_checkpoint(collection_name, progress)
+        query["_id"] = {"$gt": docs[-1]["_id"]}
+
+        elapsed = time.perf_counter() - start
+        rate = seen / elapsed
+        left = max(remaining - seen, 0)
+        print(f"  {collection_name}: {seen}/{remaining} done ({migrated} migrated, {failed} failed), "
+              f"{rate:.1f} docs/s, {size / elapsed / 2 ** 20:.1f} MiB/s, "
+              f"{left} left, ~{format_duration(left / rate) if rate else '?'} to go")
+
+    print(f"{collection_name}: {migrated} migrated, {failed} left inline "
+          f"in {format_duration(time.perf_counter() - start)}")
+
+async def run(args) -> None:
+    try:
+        if not args.dry_run:
+            await release_pending()
+        checkpoint = await load_checkpoint(args.restart)
+        for collection_name in args.collection or server.IMAGE_COLLECTIONS:
+            await migrate_collection(collection_name, checkpoint.get(collection_name, {}), args)
+        if not args.dry_run:
+            await server.db.migrations.update_one(
+                {"_id": CHECKPOINT_ID},
+                {"$set": {"finished_at": datetime.now(timezone.utc)}}
+            )
+    finally:
+        if server._image_pool is not None:
+            server._image_pool.shutdown(wait=True, cancel_futures=True)
+            server._image_pool = None
+        server.client.close()
+
+def main():
+    args = parse_args()
+    if args.batch_size < 1 or args.workers < 1:
+        sys.exit("--batch-size and --workers must be at least 1")
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -49,7 +49,7 @@ class WeddingPhotographyAPITester:
             success = response.status_code == 200
             details = f"Status: {response.status_code}"
             if success:
-                photos = response.json()
+                photos = response.json()["items"]
                 details += f", Photos count: {len(photos)}"
             self.log_test("Guest Photos Endpoint", success, details)
             return success, response.json() if success else []
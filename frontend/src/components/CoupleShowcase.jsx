@@ -4,12 +4,16 @@ import { motion } from 'framer-motion';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 
-const CoupleShowcase = () => {
+const CoupleShowcase = ({ site }) => {
   const [settings, setSettings] = useState(null);
 
   useEffect(() => {
-    fetchSettings();
-  }, []);
+    if (site) {
+      setSettings(site.settings);
+    } else if (site === undefined) {
+      fetchSettings();
+    }
+  }, [site]);
 
   const fetchSettings = async () => {
     try {
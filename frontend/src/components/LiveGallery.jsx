@@ -1,18 +1,24 @@
 import React, { useEffect, useState, useRef } from 'react';
 import axios from 'axios';
+import { blurhashDataURL, imageSrc } from '../lib/utils';
 import { motion, AnimatePresence } from 'framer-motion';
 import { FiX, FiDownload } from 'react-icons/fi';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const CACHE_KEY = 'wedding_gallery_photos';
 
-const LiveGallery = () => {
+const LiveGallery = ({ site }) => {
   const [photos, setPhotos] = useState([]);
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [lightboxOpen, setLightboxOpen] = useState(false);
   const [currentImageIndex, setCurrentImageIndex] = useState(0);
   const [direction, setDirection] = useState(0);
   
+  // Position in the changes feed, taken from the last full fetch
+  const cursorRef = useRef(null);
+  
   // Touch/swipe handling
   const touchStartX = useRef(0);
   const touchEndX = useRef(0);
@@ -31,25 +37,52 @@ const LiveGallery = () => {
         console.error('Failed to parse cached gallery photos:', e);
       }
     }
-    fetchPhotos();
-    
-    // Refresh every 15 seconds
-    const interval = setInterval(fetchPhotos, 15000);
-    return () => clearInterval(interval);
   }, []);
 
+  useEffect(() => {
+    // Wait for the page's /api/site bootstrap; fetch directly only if it failed
+    if (site === null) return undefined;
+    let source = null;
+    let cancelled = false;
+    const loaded = site ? Promise.resolve(showPage(site.gallery, site.gallery_cursor)) : fetchPhotos();
+    loaded.then(() => {
+      // Prefer server push; polling below only runs while the stream is down
+      if (!cancelled && window.EventSource && cursorRef.current) {
+        source = openStream();
+      }
+    });
+    
+    // Check for new and deleted photos every 15 seconds
+    const interval = setInterval(() => {
+      if (!source || source.readyState !== EventSource.OPEN) {
+        fetchChanges();
+      }
+    }, 15000);
+    return () => {
+      cancelled = true;
+      clearInterval(interval);
+      if (source) source.close();
+    };
+  }, [site]);
+
+  const showPage = ({ items, next_cursor }, cursor) => {
+    cursorRef.current = cursor || null;
+    setNextCursor(next_cursor);
+    if (items.length > 0) {
+      setPhotos(items);
+      // Cache the photos in localStorage
+      localStorage.setItem(CACHE_KEY, JSON.stringify(items));
+    }
+    setLoading(false);
+  };
+
   const fetchPhotos = async () => {
     try {
       const response = await axios.get(`${BACKEND_URL}/api/photos/guest`, {
         timeout: 30000 // 30 second timeout for slow server wake-up
       });
       
-      if (response.data && response.data.length > 0) {
-        setPhotos(response.data);
-        // Cache the photos in localStorage
-        localStorage.setItem(CACHE_KEY, JSON.stringify(response.data));
-      }
-      setLoading(false);
+      showPage(response.data, response.headers['x-gallery-cursor']);
     } catch (error) {
       console.error('Failed to fetch photos:', error);
       // Keep showing cached photos, just stop loading
@@ -57,6 +90,89 @@ const LiveGallery = () => {
     }
   };
 
+  const loadMore = async () => {
+    if (!nextCursor || loadingMore) return;
+    setLoadingMore(true);
+    try {
+      const response = await axios.get(`${BACKEND_URL}/api/photos/guest`, {
+        params: { cursor: nextCursor },
+        timeout: 30000
+      });
+      const { items, next_cursor } = response.data;
+      setNextCursor(next_cursor);
+      setPhotos((prev) => {
+        const known = new Set(prev.map((photo) => photo.photo_id));
+        return [...prev, ...items.filter((photo) => !known.has(photo.photo_id))];
+      });
+    } catch (error) {
+      console.error('Failed to load more photos:', error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
+  const applyChanges = (added, deleted) => {
+    if (added.length === 0 && deleted.length === 0) return;
+    setPhotos((prev) => {
+      const removed = new Set([...deleted, ...added.map((photo) => photo.photo_id)]);
+      // Changes arrive oldest first, the gallery shows newest first
+      const next = [...added.slice().reverse(), ...prev.filter((photo) => !removed.has(photo.photo_id))];
+      localStorage.setItem(CACHE_KEY, JSON.stringify(next));
+      return next;
+    });
+  };
+
+  const openStream = () => {
+    // The browser resends the last event id on reconnect, so missed events are replayed
+    const source = new EventSource(
+      `${BACKEND_URL}/api/photos/stream?since=${encodeURIComponent(cursorRef.current)}`
+    );
+    const trackCursor = (event) => {
+      if (event.lastEventId) cursorRef.current = event.lastEventId;
+    };
+    source.addEventListener('photo_added', (event) => {
+      trackCursor(event);
+      applyChanges([JSON.parse(event.data)], []);
+    });
+    source.addEventListener('photo_deleted', (event) => {
+      trackCursor(event);
+      applyChanges([], [JSON.parse(event.data).photo_id]);
+    });
+    source.addEventListener('sync', trackCursor);
+    source.addEventListener('reset', () => {
+      cursorRef.current = null;
+      fetchPhotos();
+    });
+    return source;
+  };
+
+  const fetchChanges = async () => {
+    if (!cursorRef.current) {
+      return fetchPhotos();
+    }
+    
+    try {
+      const response = await axios.get(`${BACKEND_URL}/api/photos/guest/changes`, {
+        params: { since: cursorRef.current },
+        timeout: 30000
+      });
+      const { added, deleted, cursor, has_more, reset } = response.data;
+      
+      if (reset) {
+        cursorRef.current = null;
+        return fetchPhotos();
+      }
+      
+      cursorRef.current = cursor;
+      applyChanges(added, deleted);
+      if (has_more) {
+        fetchChanges();
+      }
+    } catch (error) {
+      console.error('Failed to fetch gallery changes:', error);
+    }
+  };
+
   const openLightbox = (index) => {
     setCurrentImageIndex(index);
     setDirection(0);
@@ -114,7 +230,9 @@ const LiveGallery = () => {
   const downloadImage = () => {
     const currentPhoto = photos[currentImageIndex];
     const link = document.createElement('a');
-    link.href = currentPhoto.image_data;
+    link.href = currentPhoto.image_url
+      ? `${imageSrc(currentPhoto)}?download=true`
+      : currentPhoto.image_data;
     link.download = currentPhoto.filename;
     document.body.appendChild(link);
     link.click();
@@ -173,38 +291,69 @@ const LiveGallery = () => {
       <h3 className="text-4xl font-heading text-center mb-4 text-foreground">
         Live Gallery
       </h3>
-      <p className="text-center text-foreground/60 font-body mb-12">
+      <p className="text-center text-foreground/60 font-body mb-4">
         Real-time Photo Stream
       </p>
+      <div className="text-center mb-12">
+        {/* The server streams the whole event as one ZIP while it builds it */}
+        <a
+          href={`${BACKEND_URL}/api/photos/archive`}
+          download
+          className="inline-flex items-center gap-2 text-gold hover:text-gold/80 font-body text-sm"
+          data-testid="gallery-download-all"
+        >
+          <FiDownload size={16} />
+          Download all photos
+        </a>
+      </div>
 
       {/* Grid Layout */}
       <div
         className="grid grid-cols-2 sm:grid-cols-3 md:grid-cols-4 lg:grid-cols-5 gap-3 md:gap-4"
         data-testid="live-gallery-grid"
       >
-        {photos.map((photo, index) => (
-          <motion.div
-            key={photo.photo_id}
-            className="relative cursor-pointer group overflow-hidden rounded-xl aspect-square bg-gray-100"
-            initial={{ opacity: 0, y: 20 }}
-            animate={{ opacity: 1, y: 0 }}
-            transition={{ delay: Math.min(index * 0.05, 0.4), duration: 0.5 }}
-            whileHover={{ scale: 1.02 }}
-            whileTap={{ scale: 0.98 }}
-            onClick={() => openLightbox(index)}
-          >
-            <img
-              src={photo.image_data}
-              alt={photo.filename}
-              loading="lazy"
-              decoding="async"
-              className="w-full h-full object-cover transition-transform duration-500 group-hover:scale-110"
-            />
-            <div className="absolute inset-0 bg-gradient-to-t from-black/50 via-transparent to-transparent opacity-0 group-hover:opacity-100 transition-opacity duration-300" />
-          </motion.div>
-        ))}
+        {photos.map((photo, index) => {
+          const placeholder = blurhashDataURL(photo.metadata?.blurhash);
+          return (
+            <motion.div
+              key={photo.photo_id}
+              className="relative cursor-pointer group overflow-hidden rounded-xl aspect-square bg-gray-100 bg-cover bg-center"
+              style={placeholder ? { backgroundImage: `url(${placeholder})` } : undefined}
+              initial={{ opacity: 0, y: 20 }}
+              animate={{ opacity: 1, y: 0 }}
+              transition={{ delay: Math.min(index * 0.05, 0.4), duration: 0.5 }}
+              whileHover={{ scale: 1.02 }}
+              whileTap={{ scale: 0.98 }}
+              onClick={() => openLightbox(index)}
+            >
+              <img
+                src={imageSrc(photo, 'thumb')}
+                alt={photo.filename}
+                width={photo.images?.thumb?.width}
+                height={photo.images?.thumb?.height}
+                loading="lazy"
+                decoding="async"
+                className="w-full h-full object-cover transition-transform duration-500 group-hover:scale-110"
+              />
+              <div className="absolute inset-0 bg-gradient-to-t from-black/50 via-transparent to-transparent opacity-0 group-hover:opacity-100 transition-opacity duration-300" />
+            </motion.div>
+          );
+        })}
       </div>
 
+      {nextCursor && (
+        <div className="text-center mt-10">
+          <button
+            onClick={loadMore}
+            disabled={loadingMore}
+            className="px-8 py-3 rounded-full border border-gold text-foreground font-body hover:bg-gold hover:text-white transition-colors disabled:opacity-50"
+            data-testid="live-gallery-load-more"
+          >
+            {loadingMore ? 'Loading...' : 'Load more photos'}
+          </button>
+        </div>
+      )}
+
       {/* Instagram-style Lightbox Modal */}
       <AnimatePresence>
         {lightboxOpen && photos.length > 0 && (
@@ -267,7 +416,7 @@ const LiveGallery = () => {
                   className="absolute w-full h-full flex items-center justify-center px-4 cursor-grab active:cursor-grabbing"
                 >
                   <img
-                    src={photos[currentImageIndex].image_data}
+                    src={imageSrc(photos[currentImageIndex], 'display')}
                     alt={photos[currentImageIndex].filename}
                     className="max-h-[80vh] max-w-full w-auto h-auto object-contain rounded-lg select-none"
                     draggable="false"
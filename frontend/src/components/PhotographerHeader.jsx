@@ -1,11 +1,21 @@
 import React, { useEffect, useState } from 'react';
 import axios from 'axios';
+import { imageSrc } from '../lib/utils';
 import { motion, AnimatePresence } from 'framer-motion';
 import { FaWhatsapp, FaInstagram, FaYoutube, FaEnvelope, FaMapMarkerAlt } from 'react-icons/fa';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 
-const PhotographerHeader = () => {
+// Default sample backgrounds if none uploaded
+const SAMPLE_BACKGROUNDS = [
+  { photo_id: '1', image_data: 'https://images.pexels.com/photos/2253870/pexels-photo-2253870.jpeg?auto=compress&cs=tinysrgb&w=1920' },
+  { photo_id: '2', image_data: 'https://images.pexels.com/photos/3014856/pexels-photo-3014856.jpeg?auto=compress&cs=tinysrgb&w=1920' },
+  { photo_id: '3', image_data: 'https://images.pexels.com/photos/1616403/pexels-photo-1616403.jpeg?auto=compress&cs=tinysrgb&w=1920' },
+  { photo_id: '4', image_data: 'https://images.pexels.com/photos/15841148/pexels-photo-15841148.jpeg?auto=compress&cs=tinysrgb&w=1920' },
+  { photo_id: '5', image_data: 'https://images.pexels.com/photos/7165802/pexels-photo-7165802.jpeg?auto=compress&cs=tinysrgb&w=1920' }
+];
+
+const PhotographerHeader = ({ site }) => {
   const [animate, setAnimate] = useState(false);
   const [settings, setSettings] = useState(null);
   const [backgroundImages, setBackgroundImages] = useState([]);
@@ -13,10 +23,18 @@ const PhotographerHeader = () => {
 
   useEffect(() => {
     setAnimate(true);
-    fetchSettings();
-    fetchBackgroundImages();
   }, []);
 
+  useEffect(() => {
+    if (site) {
+      setSettings(site.settings);
+      showBackgroundImages(site.background_images.items);
+    } else if (site === undefined) {
+      fetchSettings();
+      fetchBackgroundImages();
+    }
+  }, [site]);
+
   useEffect(() => {
     if (backgroundImages.length === 0) return;
 
@@ -27,6 +45,10 @@ const PhotographerHeader = () => {
     return () => clearInterval(interval);
   }, [backgroundImages]);
 
+  const showBackgroundImages = (items) => {
+    setBackgroundImages(items.length > 0 ? items : SAMPLE_BACKGROUNDS);
+  };
+
   const fetchSettings = async () => {
     try {
       const response = await axios.get(`${BACKEND_URL}/api/settings`);
@@ -39,28 +61,11 @@ const PhotographerHeader = () => {
   const fetchBackgroundImages = async () => {
     try {
       const response = await axios.get(`${BACKEND_URL}/api/background-images`);
-      if (response.data.length > 0) {
-        setBackgroundImages(response.data);
-      } else {
-        // Default sample backgrounds if none uploaded
-        setBackgroundImages([
-          { photo_id: '1', image_data: 'https://images.pexels.com/photos/2253870/pexels-photo-2253870.jpeg?auto=compress&cs=tinysrgb&w=1920' },
-          { photo_id: '2', image_data: 'https://images.pexels.com/photos/3014856/pexels-photo-3014856.jpeg?auto=compress&cs=tinysrgb&w=1920' },
-          { photo_id: '3', image_data: 'https://images.pexels.com/photos/1616403/pexels-photo-1616403.jpeg?auto=compress&cs=tinysrgb&w=1920' },
-          { photo_id: '4', image_data: 'https://images.pexels.com/photos/15841148/pexels-photo-15841148.jpeg?auto=compress&cs=tinysrgb&w=1920' },
-          { photo_id: '5', image_data: 'https://images.pexels.com/photos/7165802/pexels-photo-7165802.jpeg?auto=compress&cs=tinysrgb&w=1920' }
-        ]);
-      }
+      showBackgroundImages(response.data.items);
     } catch (error) {
       console.error('Failed to fetch background images:', error);
       // Fallback to sample images
-      setBackgroundImages([
-        { photo_id: '1', image_data: 'https://images.pexels.com/photos/2253870/pexels-photo-2253870.jpeg?auto=compress&cs=tinysrgb&w=1920' },
-        { photo_id: '2', image_data: 'https://images.pexels.com/photos/3014856/pexels-photo-3014856.jpeg?auto=compress&cs=tinysrgb&w=1920' },
-        { photo_id: '3', image_data: 'https://images.pexels.com/photos/1616403/pexels-photo-1616403.jpeg?auto=compress&cs=tinysrgb&w=1920' },
-        { photo_id: '4', image_data: 'https://images.pexels.com/photos/15841148/pexels-photo-15841148.jpeg?auto=compress&cs=tinysrgb&w=1920' },
-        { photo_id: '5', image_data: 'https://images.pexels.com/photos/7165802/pexels-photo-7165802.jpeg?auto=compress&cs=tinysrgb&w=1920' }
-      ]);
+      showBackgroundImages([]);
     }
   };
 
@@ -86,7 +91,7 @@ const PhotographerHeader = () => {
               transition={{ duration: 1 }}
             >
               <img
-                src={backgroundImages[currentImageIndex].image_data}
+                src={imageSrc(backgroundImages[currentImageIndex], 'display')}
                 alt="Background"
                 className="w-full h-full object-cover"
               />
@@ -1,11 +1,12 @@
 import React, { useRef, useState, useEffect } from 'react';
 import axios from 'axios';
+import { imageSrc } from '../lib/utils';
 import { motion } from 'framer-motion';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const CACHE_KEY = 'wedding_wall_photos';
 
-const PortfolioMarquee = () => {
+const PortfolioMarquee = ({ site }) => {
   const scrollContainerRef = useRef(null);
   const [wallPhotos, setWallPhotos] = useState([]);
   const [loading, setLoading] = useState(true);
@@ -24,22 +25,33 @@ const PortfolioMarquee = () => {
         console.error('Failed to parse cached wall photos:', e);
       }
     }
-    fetchWallPhotos();
   }, []);
 
+  useEffect(() => {
+    if (site) {
+      showWallPhotos(site.wall_photos.items);
+    } else if (site === undefined) {
+      fetchWallPhotos();
+    }
+  }, [site]);
+
+  const showWallPhotos = (items) => {
+    if (items.length > 0) {
+      setWallPhotos(items);
+      // Cache the photos in localStorage
+      localStorage.setItem(CACHE_KEY, JSON.stringify(items));
+    }
+    // Only set loading to false if we don't have cached data
+    setLoading(false);
+  };
+
   const fetchWallPhotos = async () => {
     try {
       const response = await axios.get(`${BACKEND_URL}/api/wall-photos`, {
         timeout: 30000 // 30 second timeout for slow server wake-up
       });
       
-      if (response.data && response.data.length > 0) {
-        setWallPhotos(response.data);
-        // Cache the photos in localStorage
-        localStorage.setItem(CACHE_KEY, JSON.stringify(response.data));
-      }
-      // Only set loading to false if we don't have cached data
-      setLoading(false);
+      showWallPhotos(response.data?.items || []);
     } catch (error) {
       console.error('Failed to fetch wall photos:', error);
       // If we have cached photos, keep showing them
@@ -118,7 +130,7 @@ const PortfolioMarquee = () => {
               whileHover={{ scale: 1.05, y: -5 }}
             >
               <img
-                src={photo.image_data}
+                src={imageSrc(photo, 'display')}
                 alt={photo.filename}
                 loading="lazy"
                 decoding="async"
@@ -20,20 +20,92 @@ const Settings = () => {
     groom_name: ''
   });
   const [loading, setLoading] = useState(false);
+  const [events, setEvents] = useState([]);
+  const [newEvent, setNewEvent] = useState({ name: '', wedding_date: '' });
 
   useEffect(() => {
     fetchSettings();
+    fetchEvents();
   }, []);
 
+  const authHeaders = () => ({
+    Authorization: `Bearer ${localStorage.getItem('session_token')}`
+  });
+
   const fetchSettings = async () => {
     try {
-      const response = await axios.get(`${BACKEND_URL}/api/settings`);
+      // Public settings responses are cached for minutes; the editor needs the stored copy
+      const response = await axios.get(`${BACKEND_URL}/api/settings`, {
+        params: { fresh: Date.now() }
+      });
       setSettings(response.data);
     } catch (error) {
       console.error('Failed to fetch settings:', error);
     }
   };
 
+  const fetchEvents = async () => {
+    try {
+      const response = await axios.get(`${BACKEND_URL}/api/events`, {
+        headers: authHeaders()
+      });
+      setEvents(response.data.events);
+      setSettings(prev => ({ ...prev, current_event_id: response.data.current_event_id }));
+    } catch (error) {
+      console.error('Failed to fetch events:', error);
+    }
+  };
+
+  const handleCreateEvent = async () => {
+    if (!newEvent.name.trim()) {
+      toast.error('Please enter an event name');
+      return;
+    }
+    try {
+      await axios.post(
+        `${BACKEND_URL}/api/events`,
+        { name: newEvent.name.trim(), wedding_date: newEvent.wedding_date || null },
+        { headers: authHeaders() }
+      );
+      toast.success('Event created; guests now see its gallery');
+      setNewEvent({ name: '', wedding_date: '' });
+      fetchEvents();
+    } catch (error) {
+      console.error('Create event failed:', error);
+      toast.error('Failed to create event');
+    }
+  };
+
+  const handleShowEvent = async (eventId) => {
+    try {
+      await axios.post(
+        `${BACKEND_URL}/api/settings`,
+        { current_event_id: eventId },
+        { headers: authHeaders() }
+      );
+      toast.success('Guests now see this event');
+      fetchEvents();
+    } catch (error) {
+      console.error('Switch event failed:', error);
+      toast.error('Failed to switch event');
+    }
+  };
+
+  const handleArchiveEvent = async (eventId, archived) => {
+    try {
+      await axios.post(
+        `${BACKEND_URL}/api/events/${eventId}/${archived ? 'restore' : 'archive'}`,
+        {},
+        { headers: authHeaders() }
+      );
+      toast.success(archived ? 'Event restored' : 'Event archived');
+      fetchEvents();
+    } catch (error) {
+      console.error('Archive failed:', error);
+      toast.error('Failed to update event');
+    }
+  };
+
   const handleSave = async () => {
     setLoading(true);
     try {
@@ -146,6 +218,73 @@ const Settings = () => {
           </div>
         </div>
 
+        <div className="space-y-4">
+          <h3 className="text-xl font-heading text-foreground">Wedding Events</h3>
+          <p className="text-sm text-muted-foreground font-body">
+            Guests see the photos of the current event. Archive past weddings to keep their galleries private.
+          </p>
+
+          <div className="space-y-2">
+            {events.map((event) => (
+              <div
+                key={event.event_id}
+                className="flex items-center justify-between gap-4 p-3 border rounded-md"
+              >
+                <div className="font-body">
+                  <span className="font-medium">{event.name}</span>
+                  {event.wedding_date && (
+                    <span className="text-sm text-muted-foreground ml-2">{event.wedding_date}</span>
+                  )}
+                  {event.event_id === settings.current_event_id && (
+                    <span className="text-sm text-gold ml-2">Current</span>
+                  )}
+                  {event.archived && (
+                    <span className="text-sm text-muted-foreground ml-2">Archived</span>
+                  )}
+                </div>
+                <div className="flex gap-2">
+                  {!event.archived && event.event_id !== settings.current_event_id && (
+                    <Button variant="outline" size="sm" onClick={() => handleShowEvent(event.event_id)}>
+                      Show to guests
+                    </Button>
+                  )}
+                  <Button
+                    variant="outline"
+                    size="sm"
+                    onClick={() => handleArchiveEvent(event.event_id, event.archived)}
+                  >
+                    {event.archived ? 'Restore' : 'Archive'}
+                  </Button>
+                </div>
+              </div>
+            ))}
+          </div>
+
+          <div className="grid grid-cols-1 md:grid-cols-3 gap-4 items-end">
+            <div>
+              <Label htmlFor="event_name" className="font-body">New Event Name</Label>
+              <Input
+                id="event_name"
+                value={newEvent.name}
+                onChange={(e) => setNewEvent(prev => ({ ...prev, name: e.target.value }))}
+                placeholder="Prarthana & Santosh"
+              />
+            </div>
+            <div>
+              <Label htmlFor="event_date" className="font-body">Wedding Date</Label>
+              <Input
+                id="event_date"
+                type="date"
+                value={newEvent.wedding_date}
+                onChange={(e) => setNewEvent(prev => ({ ...prev, wedding_date: e.target.value }))}
+              />
+            </div>
+            <Button onClick={handleCreateEvent} variant="outline" className="font-body">
+              Create Event
+            </Button>
+          </div>
+        </div>
+
         <Button
           onClick={handleSave}
           disabled={loading}
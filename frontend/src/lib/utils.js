@@ -4,3 +4,99 @@ import { twMerge } from "tailwind-merge"
 export function cn(...inputs) {
   return twMerge(clsx(inputs));
 }
+
+// Resolve the <img> source for an image document: stored images expose a
+// backend route per variant ("thumb", "display" or "original"), while older
+// documents and static fallbacks carry the data inline.
+export function imageSrc(image, variant = 'original') {
+  const url = image.images?.[variant]?.url || image.image_url;
+  if (url) {
+    return `${process.env.REACT_APP_BACKEND_URL}${url}`;
+  }
+  return image.image_data;
+}
+
+// Hex SHA-256 of a file, matching the backend's blob ids. Returns null where
+// Web Crypto is unavailable (non-HTTPS origins).
+export async function sha256Hex(file) {
+  if (!window.crypto?.subtle) {
+    return null;
+  }
+  const digest = await window.crypto.subtle.digest('SHA-256', await file.arrayBuffer());
+  return Array.from(new Uint8Array(digest))
+    .map((byte) => byte.toString(16).padStart(2, '0'))
+    .join('');
+}
+
+const BASE83 = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~';
+const placeholderCache = new Map();
+
+const decode83 = (text) => [...text].reduce((value, char) => value * 83 + BASE83.indexOf(char), 0);
+
+const srgbToLinear = (value) => {
+  const v = value / 255;
+  return v <= 0.04045 ? v / 12.92 : Math.pow((v + 0.055) / 1.055, 2.4);
+};
+
+const linearToSrgb = (value) => {
+  const v = Math.max(0, Math.min(1, value));
+  return v <= 0.0031308 ? Math.round(v * 12.92 * 255) : Math.round((1.055 * Math.pow(v, 1 / 2.4) - 0.055) * 255);
+};
+
+// Decode an image's blurhash (metadata.blurhash) into a tiny data: URL to show
+// while the real image loads. Returns null when there is no usable hash.
+export function blurhashDataURL(hash, width = 32, height = 32) {
+  if (!hash || hash.length < 6) {
+    return null;
+  }
+  if (placeholderCache.has(hash)) {
+    return placeholderCache.get(hash);
+  }
+
+  const sizeFlag = decode83(hash[0]);
+  const numX = (sizeFlag % 9) + 1;
+  const numY = Math.floor(sizeFlag / 9) + 1;
+  if (hash.length !== 4 + 2 * numX * numY) {
+    return null;
+  }
+  const maximum = (decode83(hash[1]) + 1) / 166;
+  const dc = decode83(hash.substring(2, 6));
+  const colors = [[srgbToLinear(dc >> 16), srgbToLinear((dc >> 8) & 255), srgbToLinear(dc & 255)]];
+  for (let i = 1; i < numX * numY; i++) {
+    const value = decode83(hash.substring(4 + i * 2, 6 + i * 2));
+    colors.push(
+      [Math.floor(value / 361), Math.floor(value / 19) % 19, value % 19].map((quantised) => {
+        const v = (quantised - 9) / 9;
+        return Math.sign(v) * v * v * maximum;
+      })
+    );
+  }
+
+  const canvas = document.createElement('canvas');
+  canvas.width = width;
+  canvas.height = height;
+  const context = canvas.getContext('2d');
+  const pixels = context.createImageData(width, height);
+  for (let y = 0; y < height; y++) {
+    for (let x = 0; x < width; x++) {
+      let r = 0;
+      let g = 0;
+      let b = 0;
+      for (let j = 0; j < numY; j++) {
+        for (let i = 0; i < numX; i++) {
+          const basis = Math.cos((Math.PI * x * i) / width) * Math.cos((Math.PI * y * j) / height);
+          const color = colors[i + j * numX];
+          r += color[0] * basis;
+          g += color[1] * basis;
+          b += color[2] * basis;
+        }
+      }
+      pixels.data.set([linearToSrgb(r), linearToSrgb(g), linearToSrgb(b), 255], 4 * (x + y * width));
+    }
+  }
+  context.putImageData(pixels, 0, 0);
+
+  const url = canvas.toDataURL();
+  placeholderCache.set(hash, url);
+  return url;
+}
@@ -8,6 +8,7 @@ import { Card } from '../components/ui/card';
 import { Input } from '../components/ui/input';
 import { Label } from '../components/ui/label';
 import { toast } from 'sonner';
+import { imageSrc, sha256Hex } from '../lib/utils';
 import Settings from '../components/Settings';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
@@ -20,7 +21,7 @@ const Dashboard = ({ user: initialUser }) => {
   const [wallPhotos, setWallPhotos] = useState([]);
   const [backgroundImages, setBackgroundImages] = useState([]);
   const [uploading, setUploading] = useState(false);
-  const [selectedFile, setSelectedFile] = useState(null);
+  const [selectedFiles, setSelectedFiles] = useState([]);
   const [previewUrl, setPreviewUrl] = useState(null);
   const [notes, setNotes] = useState('');
   const [wallSelectedFile, setWallSelectedFile] = useState(null);
@@ -47,10 +48,18 @@ const Dashboard = ({ user: initialUser }) => {
   const fetchPhotos = async () => {
     try {
       const token = localStorage.getItem('session_token');
-      const response = await axios.get(`${BACKEND_URL}/api/photos/list`, {
-        headers: { Authorization: `Bearer ${token}` }
-      });
-      setPhotos(response.data);
+      // The dashboard manages every photo, so walk all pages
+      const allPhotos = [];
+      let cursor = null;
+      do {
+        const response = await axios.get(`${BACKEND_URL}/api/photos/list`, {
+          headers: { Authorization: `Bearer ${token}` },
+          params: { limit: 500, ...(cursor && { cursor }) }
+        });
+        allPhotos.push(...response.data.items);
+        cursor = response.data.next_cursor;
+      } while (cursor);
+      setPhotos(allPhotos);
     } catch (error) {
       console.error('Failed to fetch photos:', error);
     }
@@ -58,9 +67,8 @@ const Dashboard = ({ user: initialUser }) => {
 
   const fetchWallPhotos = async () => {
     try {
-      const token = localStorage.getItem('session_token');
       const response = await axios.get(`${BACKEND_URL}/api/wall-photos`);
-      setWallPhotos(response.data);
+      setWallPhotos(response.data.items);
     } catch (error) {
       console.error('Failed to fetch wall photos:', error);
     }
@@ -69,35 +77,39 @@ const Dashboard = ({ user: initialUser }) => {
   const fetchBackgroundImages = async () => {
     try {
       const response = await axios.get(`${BACKEND_URL}/api/background-images`);
-      setBackgroundImages(response.data);
+      setBackgroundImages(response.data.items);
     } catch (error) {
       console.error('Failed to fetch background images:', error);
     }
   };
 
   const handleFileChange = (e) => {
-    const file = e.target.files?.[0];
-    if (file) {
+    const files = Array.from(e.target.files || []);
+    const validFiles = files.filter((file) => {
       if (file.size > 10 * 1024 * 1024) {
-        toast.error('File size must be less than 10MB');
-        return;
+        toast.error(`${file.name}: file size must be less than 10MB`);
+        return false;
       }
       if (!['image/jpeg', 'image/png', 'image/webp'].includes(file.type)) {
-        toast.error('File must be JPEG, PNG, or WebP');
-        return;
+        toast.error(`${file.name}: file must be JPEG, PNG, or WebP`);
+        return false;
       }
+      return true;
+    });
 
-      setSelectedFile(file);
+    setSelectedFiles(validFiles);
+    setPreviewUrl(null);
+    if (validFiles.length > 0) {
       const reader = new FileReader();
       reader.onloadend = () => {
         setPreviewUrl(reader.result);
       };
-      reader.readAsDataURL(file);
+      reader.readAsDataURL(validFiles[0]);
     }
   };
 
   const handleUpload = async () => {
-    if (!selectedFile) {
+    if (selectedFiles.length === 0) {
       toast.error('Please select a photo');
       return;
     }
@@ -105,31 +117,30 @@ const Dashboard = ({ user: initialUser }) => {
     setUploading(true);
 
     try {
-      const reader = new FileReader();
-      reader.onloadend = async () => {
-        const base64Data = reader.result;
+      // One request for the whole selection; the server processes it in parallel
+      const formData = new FormData();
+      selectedFiles.forEach((file) => formData.append('file', file));
+      formData.append('wedding_date', new Date().toISOString().split('T')[0]);
+      formData.append('photographer_notes', notes);
 
-        const token = localStorage.getItem('session_token');
-        await axios.post(
-          `${BACKEND_URL}/api/photos/upload`,
-          {
-            filename: selectedFile.name,
-            image_data: base64Data,
-            wedding_date: new Date().toISOString().split('T')[0],
-            photographer_notes: notes
-          },
-          {
-            headers: { Authorization: `Bearer ${token}` }
-          }
-        );
+      const token = localStorage.getItem('session_token');
+      const response = await axios.post(`${BACKEND_URL}/api/photos/upload-batch`, formData, {
+        headers: { Authorization: `Bearer ${token}` }
+      });
 
-        toast.success('Photo uploaded successfully!');
-        setSelectedFile(null);
-        setPreviewUrl(null);
-        setNotes('');
-        fetchPhotos();
-      };
-      reader.readAsDataURL(selectedFile);
+      const { uploaded, failed, results } = response.data;
+      if (failed > 0) {
+        results
+          .filter((result) => !result.success)
+          .forEach((result) => toast.error(`${result.filename}: ${result.detail}`));
+      }
+      if (uploaded > 0) {
+        toast.success(uploaded === 1 ? 'Photo uploaded successfully!' : `${uploaded} photos uploaded successfully!`);
+      }
+      setSelectedFiles([]);
+      setPreviewUrl(null);
+      setNotes('');
+      fetchPhotos();
     } catch (error) {
       console.error('Upload failed:', error);
       toast.error('Upload failed. Please try again.');
@@ -159,6 +170,64 @@ const Dashboard = ({ user: initialUser }) => {
     }
   };
 
+  // Images already stored on the server (e.g. a gallery photo reused on the
+  // wall) are added by hash; only unknown content is sent as a file.
+  const uploadImage = async (path, file) => {
+    const token = localStorage.getItem('session_token');
+    const headers = { Authorization: `Bearer ${token}` };
+    const blobId = await sha256Hex(file);
+    if (blobId) {
+      try {
+        await axios.post(
+          `${BACKEND_URL}/api/${path}/upload-existing`,
+          { blob_id: blobId, filename: file.name },
+          { headers }
+        );
+        return;
+      } catch (error) {
+        if (error.response?.status !== 404) {
+          throw error;
+        }
+      }
+    }
+
+    await resumableUpload(path, file, headers, blobId);
+  };
+
+  // Send a file in chunks so a dropped venue connection only costs the chunk
+  // in flight: after a failure the upload resumes from the server's offset.
+  const resumableUpload = async (path, file, headers, sha256) => {
+    const { data } = await axios.post(
+      `${BACKEND_URL}/api/uploads`,
+      { collection: path, filename: file.name, size: file.size, content_type: file.type, sha256 },
+      { headers }
+    );
+    const uploadUrl = `${BACKEND_URL}/api/uploads/${data.upload_id}`;
+    let offset = 0;
+    let failures = 0;
+    while (offset < file.size) {
+      try {
+        const response = await axios.patch(uploadUrl, file.slice(offset, offset + data.chunk_size), {
+          headers: { ...headers, 'Upload-Offset': offset, 'Content-Type': 'application/offset+octet-stream' }
+        });
+        offset = Number(response.headers['upload-offset']);
+        failures = 0;
+      } catch (error) {
+        const status = error.response?.status;
+        if ((status && status !== 409) || ++failures > 5) {
+          throw error;
+        }
+        await new Promise((resolve) => setTimeout(resolve, 1000 * failures));
+        try {
+          offset = (await axios.get(uploadUrl, { headers })).data.offset;
+        } catch (statusError) {
+          console.error('Failed to fetch upload offset:', statusError);
+        }
+      }
+    }
+    await axios.post(`${uploadUrl}/complete`, {}, { headers });
+  };
+
   const handleWallUpload = async () => {
     if (!wallSelectedFile) {
       toast.error('Please select a photo');
@@ -168,28 +237,12 @@ const Dashboard = ({ user: initialUser }) => {
     setUploadingWall(true);
 
     try {
-      const reader = new FileReader();
-      reader.onloadend = async () => {
-        const base64Data = reader.result;
-
-        const token = localStorage.getItem('session_token');
-        await axios.post(
-          `${BACKEND_URL}/api/wall-photos/upload`,
-          {
-            filename: wallSelectedFile.name,
-            image_data: base64Data
-          },
-          {
-            headers: { Authorization: `Bearer ${token}` }
-          }
-        );
+      await uploadImage('wall-photos', wallSelectedFile);
 
-        toast.success('Wall photo uploaded successfully!');
-        setWallSelectedFile(null);
-        setWallPreviewUrl(null);
-        fetchWallPhotos();
-      };
-      reader.readAsDataURL(wallSelectedFile);
+      toast.success('Wall photo uploaded successfully!');
+      setWallSelectedFile(null);
+      setWallPreviewUrl(null);
+      fetchWallPhotos();
     } catch (error) {
       console.error('Upload failed:', error);
       toast.error('Upload failed. Please try again.');
@@ -228,28 +281,12 @@ const Dashboard = ({ user: initialUser }) => {
     setUploadingBg(true);
 
     try {
-      const reader = new FileReader();
-      reader.onloadend = async () => {
-        const base64Data = reader.result;
+      await uploadImage('background-images', bgSelectedFile);
 
-        const token = localStorage.getItem('session_token');
-        await axios.post(
-          `${BACKEND_URL}/api/background-images/upload`,
-          {
-            filename: bgSelectedFile.name,
-            image_data: base64Data
-          },
-          {
-            headers: { Authorization: `Bearer ${token}` }
-          }
-        );
-
-        toast.success('Background image uploaded successfully!');
-        setBgSelectedFile(null);
-        setBgPreviewUrl(null);
-        fetchBackgroundImages();
-      };
-      reader.readAsDataURL(bgSelectedFile);
+      toast.success('Background image uploaded successfully!');
+      setBgSelectedFile(null);
+      setBgPreviewUrl(null);
+      fetchBackgroundImages();
     } catch (error) {
       console.error('Upload failed:', error);
       toast.error('Upload failed. Please try again.');
@@ -292,14 +329,18 @@ const Dashboard = ({ user: initialUser }) => {
 
     try {
       const token = localStorage.getItem('session_token');
-      await Promise.all(
-        selectedPhotos.map(photoId =>
-          axios.delete(`${BACKEND_URL}/api/photos/${photoId}`, {
-            headers: { Authorization: `Bearer ${token}` }
-          })
-        )
+      const response = await axios.post(
+        `${BACKEND_URL}/api/photos/bulk-delete`,
+        { photo_ids: selectedPhotos },
+        {
+          headers: { Authorization: `Bearer ${token}` }
+        }
       );
-      toast.success(`${selectedPhotos.length} photos deleted successfully`);
+      const { deleted, rejected } = response.data;
+      if (rejected.length > 0) {
+        toast.error(`${rejected.length} photos could not be deleted`);
+      }
+      toast.success(`${deleted.length} photos deleted successfully`);
       setSelectedPhotos([]);
       setSelectionMode(false);
       fetchPhotos();
@@ -436,11 +477,12 @@ const Dashboard = ({ user: initialUser }) => {
             <div className="space-y-6">
               <div>
                 <Label htmlFor="photo" className="font-body text-foreground mb-2 block">
-                  Select Photo
+                  Select Photos
                 </Label>
                 <Input
                   id="photo"
                   type="file"
+                  multiple
                   accept="image/jpeg,image/png,image/webp"
                   onChange={handleFileChange}
                   disabled={uploading}
@@ -448,7 +490,7 @@ const Dashboard = ({ user: initialUser }) => {
                   data-testid="file-input"
                 />
                 <p className="text-sm text-foreground/60 font-body mt-1">
-                  JPEG, PNG, or WebP format. Max 10MB.
+                  JPEG, PNG, or WebP format. Max 10MB each. Select several to upload them together.
                 </p>
               </div>
 
@@ -459,6 +501,11 @@ const Dashboard = ({ user: initialUser }) => {
                     alt="Preview"
                     className="w-full h-64 object-cover"
                   />
+                  {selectedFiles.length > 1 && (
+                    <p className="text-sm text-foreground/60 font-body p-2">
+                      +{selectedFiles.length - 1} more
+                    </p>
+                  )}
                 </div>
               )}
 
@@ -478,7 +525,7 @@ const Dashboard = ({ user: initialUser }) => {
 
               <Button
                 onClick={handleUpload}
-                disabled={uploading || !selectedFile}
+                disabled={uploading || selectedFiles.length === 0}
                 className="w-full bg-gold hover:bg-gold/90 text-white font-body font-medium py-6 text-lg"
                 data-testid="upload-button"
               >
@@ -489,7 +536,8 @@ const Dashboard = ({ user: initialUser }) => {
                   </>
                 ) : (
                   <>
-                    <FiUpload className="mr-2" /> Upload Photo
+                    <FiUpload className="mr-2" />
+                    {selectedFiles.length > 1 ? `Upload ${selectedFiles.length} Photos` : 'Upload Photo'}
                   </>
                 )}
               </Button>
@@ -545,7 +593,7 @@ const Dashboard = ({ user: initialUser }) => {
                     }`}>
                       <div className="relative">
                         <img
-                          src={photo.image_data}
+                          src={imageSrc(photo, 'thumb')}
                           alt={photo.filename}
                           className="w-full h-64 object-cover group-hover:scale-105 transition-transform duration-500"
                         />
@@ -665,7 +713,7 @@ const Dashboard = ({ user: initialUser }) => {
                       <Card className="overflow-hidden shadow-gold-soft hover:shadow-xl transition-all group">
                         <div className="relative">
                           <img
-                            src={photo.image_data}
+                            src={imageSrc(photo, 'thumb')}
                             alt={photo.filename}
                             className="w-full h-64 object-cover group-hover:scale-105 transition-transform duration-500"
                           />
@@ -764,7 +812,7 @@ const Dashboard = ({ user: initialUser }) => {
                       <Card className="overflow-hidden shadow-gold-soft hover:shadow-xl transition-all group">
                         <div className="relative">
                           <img
-                            src={image.image_data}
+                            src={imageSrc(image, 'thumb')}
                             alt={image.filename}
                             className="w-full h-64 object-cover group-hover:scale-105 transition-transform duration-500"
                           />
@@ -1,9 +1,12 @@
-import React from 'react';
+import React, { useEffect, useState } from 'react';
+import axios from 'axios';
 import PhotographerHeader from '../components/PhotographerHeader';
 import PortfolioMarquee from '../components/PortfolioMarquee';
 import CoupleShowcase from '../components/CoupleShowcase';
 import LiveGallery from '../components/LiveGallery';
 
+const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
+
 const ElegantDivider = () => (
   <div className="elegant-divider my-12">
     <svg 
@@ -19,24 +22,39 @@ const ElegantDivider = () => (
 );
 
 const GuestView = () => {
+  // One /api/site request feeds every section: null while it is in flight,
+  // undefined if it failed so the sections fetch their own data
+  const [site, setSite] = useState(null);
+
+  useEffect(() => {
+    axios
+      .get(`${BACKEND_URL}/api/site`, { timeout: 30000 })
+      // The gallery cursor is minted per request, so it travels in a header
+      .then((response) => setSite({ ...response.data, gallery_cursor: response.headers['x-gallery-cursor'] }))
+      .catch((error) => {
+        console.error('Failed to fetch site:', error);
+        setSite(undefined);
+      });
+  }, []);
+
   return (
     <div className="min-h-screen">
-      <PhotographerHeader />
+      <PhotographerHeader site={site} />
       
       <ElegantDivider />
       
       <div className="mx-4 md:mx-8 my-8 p-4">
-        <PortfolioMarquee />
+        <PortfolioMarquee site={site} />
       </div>
       
       <ElegantDivider />
       
-      <CoupleShowcase />
+      <CoupleShowcase site={site} />
       
       <ElegantDivider />
       
       <div className="mx-4 md:mx-8 my-8 p-6">
-        <LiveGallery />
+        <LiveGallery site={site} />
       </div>
       
       <footer className="py-12 text-center border-t border-warmgrey/30 mt-20 bg-white">
@@ -0,0 +1,13 @@
+"""
+Shared setup for tests that import the backend directly instead of calling BASE_URL.
+The MongoDB client connects lazily, so importing server needs no running database.
+"""
+import os
+import sys
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test_database")
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
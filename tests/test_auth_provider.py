@@ -0,0 +1,106 @@
+"""
+OAuth session-data client tests: timeouts, the session-data cache and shared in-flight lookups.
+The provider is an httpx.MockTransport, so no network is needed.
+"""
+import asyncio
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+import server
+
+SESSION_DATA = {"id": "user-1", "email": "guest@example.com", "name": "Guest", "session_token": "token-1"}
+
+
+class FakeProvider:
+    """Session-data endpoint counting its calls; answers slowly so lookups overlap"""
+    
+    def __init__(self, status_code=200, error=None):
+        self.status_code = status_code
+        self.error = error
+        self.calls = 0
+    
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.calls += 1
+        assert request.headers["X-Session-ID"]
+        await asyncio.sleep(0.05)
+        if self.error is not None:
+            raise self.error
+        return httpx.Response(self.status_code, json=SESSION_DATA)
+
+
+def make_client(provider: FakeProvider) -> server.AuthProviderClient:
+    return server.AuthProviderClient("https://auth.test/session-data", 300, transport=httpx.MockTransport(provider))
+
+
+class TestAuthProviderClient:
+    """Test the shared client for the OAuth session-data exchange"""
+    
+    def test_client_uses_configured_timeouts(self):
+        """Test provider calls are bounded by the connect and read timeouts"""
+        timeout = make_client(FakeProvider()).client().timeout
+        assert timeout.connect == server.AUTH_CONNECT_TIMEOUT
+        assert timeout.read == server.AUTH_READ_TIMEOUT
+    
+    def test_concurrent_lookups_of_one_session_share_one_request(self):
+        """Test identical session ids looked up at once reach the provider once"""
+        provider = FakeProvider()
+        client = make_client(provider)
+        
+        async def run():
+            results = await asyncio.gather(*(client.session_data("session-1") for _ in range(10)))
+            await client.aclose()
+            return results
+        
+        results = asyncio.run(run())
+        assert provider.calls == 1, f"Expected one upstream call, got {provider.calls}"
+        assert all(result == SESSION_DATA for result in results)
+    
+    def test_session_data_is_cached(self):
+        """Test a repeated lookup within the TTL is answered from the cache"""
+        provider = FakeProvider()
+        client = make_client(provider)
+        
+        async def run():
+            first = await client.session_data("session-1")
+            second = await client.session_data("session-1")
+            await client.aclose()
+            return first, second
+        
+        first, second = asyncio.run(run())
+        assert first == second == SESSION_DATA
+        assert provider.calls == 1
+    
+    def test_timeout_maps_to_500_and_is_not_cached(self):
+        """Test a provider timeout fails the login with 500 and the retry asks again"""
+        provider = FakeProvider(error=httpx.ReadTimeout("timed out"))
+        client = make_client(provider)
+        
+        async def lookup():
+            with pytest.raises(HTTPException) as failed:
+                await client.session_data("session-1")
+            return failed.value
+        
+        async def run():
+            errors = [await lookup(), await lookup()]
+            await client.aclose()
+            return errors
+        
+        errors = asyncio.run(run())
+        assert [error.status_code for error in errors] == [500, 500]
+        assert errors[0].detail.startswith("Failed to verify session")
+        assert provider.calls == 2
+    
+    def test_rejected_session_maps_to_401(self):
+        """Test a session id the provider rejects fails with 401"""
+        provider = FakeProvider(status_code=404)
+        client = make_client(provider)
+        
+        async def run():
+            with pytest.raises(HTTPException) as failed:
+                await client.session_data("unknown")
+            await client.aclose()
+            return failed.value
+        
+        assert asyncio.run(run()).status_code == 401
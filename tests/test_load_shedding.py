@@ -0,0 +1,75 @@
+"""
+Load shedding tests for public reads: per-client token buckets and the admission gate.
+Runs in-process against small apps using the backend's dependencies, no server needed.
+"""
+import asyncio
+
+import pytest
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+import server
+
+
+def make_client(*dependencies) -> TestClient:
+    app = FastAPI()
+    
+    @app.get("/limited", dependencies=list(dependencies))
+    async def limited():
+        return {"ok": True}
+    
+    return TestClient(app)
+
+
+class TestRateLimit:
+    """Test the per-client token bucket of public_read_limit"""
+    
+    def test_requests_past_the_burst_get_429_with_retry_after(self):
+        """Test a client past its burst is shed with 429 and told when to retry"""
+        client = make_client(Depends(server.public_read_limit(rate=0.5, burst=2, gated=False)))
+        assert client.get("/limited").status_code == 200
+        assert client.get("/limited").status_code == 200
+        
+        response = client.get("/limited")
+        assert response.status_code == 429, f"Expected 429, got {response.status_code}"
+        # One token refills in 1 / rate seconds
+        assert response.headers.get("Retry-After") == "2"
+
+
+class TestPublicReadGate:
+    """Test admission control of gated public reads"""
+    
+    def test_queued_read_past_timeout_gets_429_with_retry_after(self):
+        """Test a read waiting longer than the queue timeout for a slot is shed"""
+        gate = server.PublicReadGate(limit=1, timeout=0.05)
+        
+        async def run():
+            async with gate.slot("/gated"):
+                with pytest.raises(HTTPException) as shed:
+                    async with gate.slot("/gated"):
+                        pass
+            return shed.value
+        
+        error = asyncio.run(run())
+        assert error.status_code == 429
+        assert error.headers["Retry-After"] == "1"
+        assert gate.stats() == {"limit": 1, "in_flight": 0, "queued": 0, "shed": 1}
+    
+    def test_streamed_response_holds_its_slot_until_the_body_is_sent(self):
+        """Test a gated route's slot outlives the handler while its body streams"""
+        app = FastAPI()
+        app.add_middleware(server.PublicReadGateMiddleware)
+        in_flight = []
+        
+        @app.get("/streamed", dependencies=[Depends(server.public_read_limit(rate=None))])
+        async def streamed():
+            async def body():
+                in_flight.append(server.public_read_gate.in_flight)
+                yield b"chunk"
+            return StreamingResponse(body())
+        
+        response = TestClient(app).get("/streamed")
+        assert response.content == b"chunk"
+        assert in_flight == [1], f"Expected the slot held while streaming, got {in_flight}"
+        assert server.public_read_gate.in_flight == 0
@@ -34,32 +34,193 @@ class TestPublicAPIs:
         assert isinstance(data["photography_name"], str)
         assert isinstance(data["email"], str)
     
+    def test_settings_endpoint_supports_conditional_get(self):
+        """Test /api/settings answers 304 when the ETag still matches"""
+        response = requests.get(f"{BASE_URL}/api/settings")
+        assert response.status_code == 200
+        etag = response.headers.get("ETag")
+        assert etag, "Missing ETag header"
+        
+        cached = requests.get(f"{BASE_URL}/api/settings", headers={"If-None-Match": etag})
+        assert cached.status_code == 304, f"Expected 304, got {cached.status_code}"
+    
+    def test_settings_endpoint_is_publicly_cacheable(self):
+        """Test /api/settings allows shared caches to keep the response"""
+        response = requests.get(f"{BASE_URL}/api/settings")
+        assert response.status_code == 200
+        assert "max-age=" in response.headers.get("Cache-Control", ""), "Missing max-age"
+    
     def test_guest_photos_endpoint_returns_200(self):
         """Test /api/photos/guest returns 200 OK"""
         response = requests.get(f"{BASE_URL}/api/photos/guest")
         assert response.status_code == 200, f"Expected 200, got {response.status_code}"
     
     def test_guest_photos_endpoint_returns_list(self):
-        """Test /api/photos/guest returns a list"""
+        """Test /api/photos/guest returns a page of photos"""
         response = requests.get(f"{BASE_URL}/api/photos/guest")
         assert response.status_code == 200
         
         data = response.json()
-        assert isinstance(data, list), "Expected list response"
+        assert isinstance(data["items"], list), "Expected items list"
+        assert "next_cursor" in data, "Missing next_cursor field"
     
     def test_guest_photos_structure_if_photos_exist(self):
         """Test photo structure if photos exist in database"""
         response = requests.get(f"{BASE_URL}/api/photos/guest")
         assert response.status_code == 200
         
-        data = response.json()
+        data = response.json()["items"]
         if len(data) > 0:
             photo = data[0]
             assert "photo_id" in photo, "Missing photo_id field"
             assert "filename" in photo, "Missing filename field"
-            assert "image_data" in photo, "Missing image_data field"
-            # Verify image_data is base64 encoded
-            assert photo["image_data"].startswith("data:image/"), "image_data should be base64 data URL"
+            assert "image_url" in photo, "Missing image_url field"
+            assert "image_data" not in photo, "Listing should not inline image bytes"
+            assert "thumb" in photo["images"], "Missing thumb derivative"
+            assert "display" in photo["images"], "Missing display derivative"
+            
+            # Verify the image bytes are served by the raw route
+            raw = requests.get(f"{BASE_URL}{photo['image_url']}")
+            assert raw.status_code == 200
+            assert raw.headers["Content-Type"].startswith("image/")
+    
+    def test_guest_photos_metadata_if_extracted(self):
+        """Test extracted image metadata carries a placeholder and no internal flags"""
+        response = requests.get(f"{BASE_URL}/api/photos/guest")
+        assert response.status_code == 200
+        
+        for photo in response.json()["items"]:
+            assert "metadata_pending" not in photo
+            if photo.get("metadata"):
+                assert isinstance(photo["metadata"]["blurhash"], str)
+                assert "captured_at" in photo["metadata"]
+    
+    def test_guest_photo_raw_supports_range_if_photos_exist(self):
+        """Test /api/photos/{photo_id}/raw honours byte ranges"""
+        response = requests.get(f"{BASE_URL}/api/photos/guest")
+        assert response.status_code == 200
+        
+        data = response.json()["items"]
+        if len(data) > 0:
+            raw = requests.get(f"{BASE_URL}{data[0]['image_url']}", headers={"Range": "bytes=0-9"})
+            assert raw.status_code == 206, f"Expected 206, got {raw.status_code}"
+            assert len(raw.content) == 10
+            assert raw.headers["Content-Range"].startswith("bytes 0-9/")
+    
+    def test_guest_photos_pagination_has_no_duplicates(self):
+        """Test /api/photos/guest pages do not overlap"""
+        first = requests.get(f"{BASE_URL}/api/photos/guest", params={"limit": 2}).json()
+        assert len(first["items"]) <= 2
+        if first["next_cursor"]:
+            second = requests.get(
+                f"{BASE_URL}/api/photos/guest",
+                params={"limit": 2, "cursor": first["next_cursor"]}
+            ).json()
+            first_ids = {photo["photo_id"] for photo in first["items"]}
+            assert not first_ids & {photo["photo_id"] for photo in second["items"]}
+    
+    def test_guest_photos_negotiates_compression(self):
+        """Test /api/photos/guest varies on Accept-Encoding and never sends an unrequested encoding"""
+        response = requests.get(f"{BASE_URL}/api/photos/guest", headers={"Accept-Encoding": "gzip"})
+        assert response.status_code == 200
+        assert "Accept-Encoding" in response.headers.get("Vary", ""), "Missing Vary: Accept-Encoding"
+        assert response.headers.get("Content-Encoding") in (None, "gzip")
+        assert isinstance(response.json()["items"], list)
+    
+    def test_guest_photos_same_page_in_every_encoding(self):
+        """Test /api/photos/guest serves the same first page compressed and uncompressed"""
+        plain = requests.get(f"{BASE_URL}/api/photos/guest", headers={"Accept-Encoding": "identity"})
+        compressed = requests.get(f"{BASE_URL}/api/photos/guest", headers={"Accept-Encoding": "gzip"})
+        assert plain.status_code == 200 and compressed.status_code == 200
+        assert plain.headers.get("Content-Encoding") is None
+        if plain.headers.get("ETag") == compressed.headers.get("ETag"):
+            assert plain.json() == compressed.json()
+    
+    def test_guest_photos_compressed_etag_is_weak(self):
+        """Test a compressed /api/photos/guest response does not claim a strong ETag"""
+        response = requests.get(f"{BASE_URL}/api/photos/guest", headers={"Accept-Encoding": "gzip"})
+        assert response.status_code == 200
+        if response.headers.get("Content-Encoding") == "gzip":
+            assert response.headers.get("ETag", "").startswith("W/"), "Compressed body sent with a strong ETag"
+    
+    def test_guest_photos_invalid_cursor_returns_400(self):
+        """Test /api/photos/guest rejects a malformed cursor"""
+        response = requests.get(f"{BASE_URL}/api/photos/guest", params={"cursor": "not-a-cursor"})
+        assert response.status_code == 400, f"Expected 400, got {response.status_code}"
+    
+    def test_guest_photos_returns_gallery_cursor(self):
+        """Test /api/photos/guest exposes a cursor for the changes feed"""
+        response = requests.get(f"{BASE_URL}/api/photos/guest")
+        assert response.status_code == 200
+        assert response.headers.get("X-Gallery-Cursor"), "Missing X-Gallery-Cursor header"
+    
+    def test_guest_photo_changes_since_current_cursor_is_empty(self):
+        """Test /api/photos/guest/changes returns nothing new for an up-to-date cursor"""
+        cursor = requests.get(f"{BASE_URL}/api/photos/guest").headers["X-Gallery-Cursor"]
+        response = requests.get(f"{BASE_URL}/api/photos/guest/changes", params={"since": cursor})
+        assert response.status_code == 200
+        
+        data = response.json()
+        assert data["reset"] is False
+        assert isinstance(data["added"], list)
+        assert isinstance(data["deleted"], list)
+        assert data["cursor"], "Missing cursor"
+    
+    def test_guest_photo_changes_without_cursor_requests_reset(self):
+        """Test /api/photos/guest/changes without a cursor asks for a full reload"""
+        response = requests.get(f"{BASE_URL}/api/photos/guest/changes")
+        assert response.status_code == 200
+        assert response.json()["reset"] is True
+    
+    def test_guest_photos_unknown_event_returns_404(self):
+        """Test /api/photos/guest rejects an event that does not exist"""
+        response = requests.get(f"{BASE_URL}/api/photos/guest", params={"event_id": "no-such-event"})
+        assert response.status_code == 404, f"Expected 404, got {response.status_code}"
+    
+    def test_guest_photo_stream_is_event_stream(self):
+        """Test /api/photos/stream answers with a Server-Sent Events stream"""
+        with requests.get(f"{BASE_URL}/api/photos/stream", stream=True, timeout=10) as response:
+            assert response.status_code == 200
+            assert response.headers["Content-Type"].startswith("text/event-stream")
+            first_line = next(response.iter_lines())
+            assert first_line.startswith(b"retry:"), f"Unexpected first line {first_line!r}"
+    
+    def test_photo_archive_streams_zip(self):
+        """Test /api/photos/archive streams the gallery as a ZIP download"""
+        with requests.get(f"{BASE_URL}/api/photos/archive", stream=True, timeout=30) as response:
+            assert response.status_code == 200, f"Expected 200, got {response.status_code}"
+            assert response.headers["Content-Type"] == "application/zip"
+            assert response.headers["Content-Disposition"].startswith("attachment;")
+            assert next(response.iter_content(4)).startswith(b"PK")
+    
+    def test_photo_archive_invalid_date_returns_400(self):
+        """Test /api/photos/archive rejects a malformed wedding_date"""
+        response = requests.get(f"{BASE_URL}/api/photos/archive", params={"wedding_date": "yesterday"})
+        assert response.status_code == 400, f"Expected 400, got {response.status_code}"
+    
+    def test_site_bootstrap_returns_every_section(self):
+        """Test /api/site bundles settings, images and the first gallery page"""
+        response = requests.get(f"{BASE_URL}/api/site")
+        assert response.status_code == 200, f"Expected 200, got {response.status_code}"
+        
+        data = response.json()
+        assert "photography_name" in data["settings"]
+        assert isinstance(data["background_images"]["items"], list)
+        assert isinstance(data["wall_photos"]["items"], list)
+        assert isinstance(data["gallery"]["items"], list)
+        assert response.headers.get("X-Gallery-Cursor"), "Missing X-Gallery-Cursor header"
+    
+    def test_site_bootstrap_supports_conditional_get(self):
+        """Test /api/site answers 304 when the ETag still matches"""
+        response = requests.get(f"{BASE_URL}/api/site")
+        assert response.status_code == 200
+        etag = response.headers.get("ETag")
+        assert etag, "Missing ETag header"
+        
+        cached = requests.get(f"{BASE_URL}/api/site", headers={"If-None-Match": etag})
+        assert cached.status_code == 304, f"Expected 304, got {cached.status_code}"
+        assert cached.content == b""
+        assert cached.headers.get("X-Gallery-Cursor"), "Missing X-Gallery-Cursor header"
     
     def test_wall_photos_endpoint_returns_200(self):
         """Test /api/wall-photos returns 200 OK"""
@@ -67,24 +228,25 @@ class TestPublicAPIs:
         assert response.status_code == 200, f"Expected 200, got {response.status_code}"
     
     def test_wall_photos_endpoint_returns_list(self):
-        """Test /api/wall-photos returns a list"""
+        """Test /api/wall-photos returns a page of photos"""
         response = requests.get(f"{BASE_URL}/api/wall-photos")
         assert response.status_code == 200
         
         data = response.json()
-        assert isinstance(data, list), "Expected list response"
+        assert isinstance(data["items"], list), "Expected items list"
+        assert "next_cursor" in data, "Missing next_cursor field"
     
     def test_wall_photos_structure_if_photos_exist(self):
         """Test wall photo structure if photos exist"""
         response = requests.get(f"{BASE_URL}/api/wall-photos")
         assert response.status_code == 200
         
-        data = response.json()
+        data = response.json()["items"]
         if len(data) > 0:
             photo = data[0]
             assert "photo_id" in photo, "Missing photo_id field"
             assert "filename" in photo, "Missing filename field"
-            assert "image_data" in photo, "Missing image_data field"
+            assert "image_url" in photo, "Missing image_url field"
     
     def test_background_images_endpoint_returns_200(self):
         """Test /api/background-images returns 200 OK"""
@@ -92,12 +254,13 @@ class TestPublicAPIs:
         assert response.status_code == 200, f"Expected 200, got {response.status_code}"
     
     def test_background_images_endpoint_returns_list(self):
-        """Test /api/background-images returns a list"""
+        """Test /api/background-images returns a page of images"""
         response = requests.get(f"{BASE_URL}/api/background-images")
         assert response.status_code == 200
         
         data = response.json()
-        assert isinstance(data, list), "Expected list response"
+        assert isinstance(data["items"], list), "Expected items list"
+        assert "next_cursor" in data, "Missing next_cursor field"
     
     def test_api_root_endpoint(self):
         """Test /api/ root endpoint returns 200"""
@@ -108,6 +271,25 @@ class TestPublicAPIs:
         assert "message" in data
 
 
+class TestMetrics:
+    """Test the Prometheus metrics endpoint"""
+    
+    def test_metrics_endpoint_exposes_request_latency(self):
+        """Test /metrics serves request latency histograms (or asks for its token)"""
+        requests.get(f"{BASE_URL}/api/settings")
+        response = requests.get(f"{BASE_URL}/metrics")
+        assert response.status_code in (200, 401), f"Unexpected status {response.status_code}"
+        if response.status_code == 200:
+            assert "http_request_duration_seconds_bucket" in response.text
+    
+    def test_metrics_endpoint_exposes_load_shedding(self):
+        """Test /metrics reports public read admission (or asks for its token)"""
+        requests.get(f"{BASE_URL}/api/wall-photos")
+        response = requests.get(f"{BASE_URL}/metrics")
+        assert response.status_code in (200, 401), f"Unexpected status {response.status_code}"
+        if response.status_code == 200:
+            assert "public_reads_in_flight" in response.text
+
 class TestProtectedAPIs:
     """Test protected API endpoints (require auth)"""
     
@@ -145,6 +327,58 @@ class TestProtectedAPIs:
             "image_data": "data:image/jpeg;base64,test"
         })
         assert response.status_code == 401, f"Expected 401, got {response.status_code}"
+
+    def test_photos_upload_file_without_token_returns_401(self):
+        """Test multipart /api/photos/upload-file without token returns 401"""
+        response = requests.post(
+            f"{BASE_URL}/api/photos/upload-file",
+            files={"file": ("test.jpg", b"test", "image/jpeg")}
+        )
+        assert response.status_code == 401, f"Expected 401, got {response.status_code}"
+
+    def test_photos_upload_batch_without_token_returns_401(self):
+        """Test multipart /api/photos/upload-batch without token returns 401"""
+        response = requests.post(
+            f"{BASE_URL}/api/photos/upload-batch",
+            files=[("file", ("a.jpg", b"test", "image/jpeg")), ("file", ("b.jpg", b"test", "image/jpeg"))]
+        )
+        assert response.status_code == 401, f"Expected 401, got {response.status_code}"
+
+    def test_photos_bulk_delete_without_token_returns_401(self):
+        """Test /api/photos/bulk-delete without token returns 401"""
+        response = requests.post(f"{BASE_URL}/api/photos/bulk-delete", json={"photo_ids": ["nonexistent"]})
+        assert response.status_code == 401, f"Expected 401, got {response.status_code}"
+
+    def test_upload_existing_without_token_returns_401(self):
+        """Test /api/wall-photos/upload-existing without token returns 401"""
+        response = requests.post(f"{BASE_URL}/api/wall-photos/upload-existing", json={
+            "blob_id": "0" * 64,
+            "filename": "test.jpg"
+        })
+        assert response.status_code == 401, f"Expected 401, got {response.status_code}"
+
+    def test_events_without_token_returns_401(self):
+        """Test /api/events list and create without token return 401"""
+        assert requests.get(f"{BASE_URL}/api/events").status_code == 401
+        response = requests.post(f"{BASE_URL}/api/events", json={"name": "Test Wedding"})
+        assert response.status_code == 401, f"Expected 401, got {response.status_code}"
+    
+    def test_resumable_upload_without_token_returns_401(self):
+        """Test creating, resuming and completing a resumable upload without token return 401"""
+        response = requests.post(f"{BASE_URL}/api/uploads", json={
+            "collection": "photos",
+            "filename": "test.jpg",
+            "size": 1024
+        })
+        assert response.status_code == 401, f"Expected 401, got {response.status_code}"
+        response = requests.patch(
+            f"{BASE_URL}/api/uploads/nonexistent-upload",
+            data=b"test",
+            headers={"Upload-Offset": "0"}
+        )
+        assert response.status_code == 401, f"Expected 401, got {response.status_code}"
+        assert requests.head(f"{BASE_URL}/api/uploads/nonexistent-upload").status_code == 401
+        assert requests.post(f"{BASE_URL}/api/uploads/nonexistent-upload/complete").status_code == 401
     
     def test_settings_update_without_token_returns_401(self):
         """Test POST /api/settings without token returns 401"""
@@ -162,6 +396,11 @@ class TestPhotoEndpoints:
         response = requests.get(f"{BASE_URL}/api/photos/nonexistent-photo-id")
         assert response.status_code == 404, f"Expected 404, got {response.status_code}"
     
+    def test_get_nonexistent_photo_raw_returns_404(self):
+        """Test /api/photos/{photo_id}/raw with invalid ID returns 404"""
+        response = requests.get(f"{BASE_URL}/api/photos/nonexistent-photo-id/raw")
+        assert response.status_code == 404, f"Expected 404, got {response.status_code}"
+    
     def test_delete_photo_without_token_returns_401(self):
         """Test DELETE /api/photos/{photo_id} without token returns 401"""
         response = requests.delete(f"{BASE_URL}/api/photos/some-photo-id")